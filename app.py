@@ -1,148 +1,961 @@
+import time
+# Taken before the other imports so the startup report (see startup.py)
+# includes them
+IMPORT_STARTED = time.perf_counter()
+
 import os
-from flask import Flask, request, jsonify
+import atexit
+import functools
+import hashlib
+import hmac
+import logging
+import queue
+import threading
+from flask import Flask, Response, current_app, request, jsonify
 from flask_cors import CORS
-from datetime import datetime
 from dotenv import load_dotenv
-from pymongo import MongoClient
 from bson.objectid import ObjectId
-import certifi
+import pymongo
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 
-# Load environment variables
-load_dotenv()
+from bulk import AFTERPARTY_COLUMNS, WEDDING_RSVP_COLUMNS, export_rows, iter_upload_rows, upload_format
+from cache import create_cache
+from changes import WATCHED_COLLECTIONS, ResumeError, create_feed
+from database import get_client, get_db, mongodb_uri, pool_stats
+from events import create_registry, event_collection_name, format_event
+from fallback import UNREACHABLE_ERRORS, create_fallback
+import json_provider
+import metrics
+import ratelimit
+import stats
+import tracing
+from rsvp import (
+    AFTERPARTY_FIELDS, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, PRIVATE_FIELDS, RESPONSE_TYPES, WEDDING_RSVP_FIELDS,
+    build_afterparty_rsvp, build_wedding_rsvp, encode_cursor, format_rsvp, format_summary, parse_idempotency_key,
+    parse_page_args, parse_summary_hours, response_type_query, reused_idempotency_key, stored_document,
+    upsert_operation
+)
+from search import SEARCH_MAX_RESULTS, parse_search_args, rank_results
+from startup import StartupTimer
+from storage import MemoryStorage, create_storage
+from tracing import span
+from write_behind import create_writer
 
-app = Flask(__name__)
-CORS(app)
+logger = logging.getLogger(__name__)
 
+startup_timer = StartupTimer(IMPORT_STARTED)
 
+# Nothing below connects to MongoDB: clients are created per worker process
+# on first use (see database.py), and the services are built by create_app()
+# once .env has been loaded.
 
-# MongoDB configuration
-MONGODB_URI = os.environ['MONGODB_URI']
-client = MongoClient(MONGODB_URI, tlsCAFile=certifi.where())
-db = client.get_default_database()  # Uses the database from the URI
+# Where RSVPs, events and the summary are kept (see storage.py)
+storage = None
+# Response cache for the list endpoints (see cache.py)
+rsvp_cache = None
+# Optional write-behind upsert pipeline (see write_behind.py)
+write_behind = None
+# Optional local log for submissions while MongoDB is down (see fallback.py)
+fallback_log = None
+# Materialised summary for GET /api/summary (see stats.py)
+use_stats = False
+# Real-time change feed for GET /api/changes (see changes.py)
+change_feed = None
+# Registered events for the /api/events/<event_id>/... routes (see events.py)
+event_registry = None
 
-afterparty_collection = db['afterparty']
-wedding_rsvp_collection = db['wedding_rsvp']
+# Seconds to wait before retrying index creation after a failure
+INDEX_RETRY_INTERVAL = 60
 
-@app.route('/api/rsvp', methods=['POST'])
-def submit_rsvp():
+_indexes_lock = threading.Lock()
+_indexes_ready = False
+_indexes_retry_at = 0.0
+
+_warmup_lock = threading.Lock()
+_warmed_up = False
+
+
+def ensure_indexes_once():
+    # Indexes are created on the first request of each worker rather than at
+    # import time, so the client is never connected before gunicorn forks.
+    # Health checks skip it so they answer promptly while the database is down.
+    global _indexes_ready, _indexes_retry_at
+    if _indexes_ready or request.path.startswith('/health') or time.monotonic() < _indexes_retry_at:
+        return
+    with _indexes_lock:
+        if _indexes_ready or time.monotonic() < _indexes_retry_at:
+            return
+        try:
+            if fallback_log is not None:
+                # Fail fast while MongoDB is down, so submissions reach the log
+                with pymongo.timeout(fallback_log.write_timeout):
+                    storage.ping()
+            storage.create_indexes()
+            _indexes_ready = True
+        except Exception as e:
+            _indexes_retry_at = time.monotonic() + INDEX_RETRY_INTERVAL
+            logger.error(f'Error creating indexes: {str(e)}')
+
+
+def invalidate_cache(namespace):
+    if rsvp_cache is None:
+        return
     try:
-        data = request.get_json()
+        rsvp_cache.invalidate(namespace)
+    except Exception as e:
+        logger.error(f'Error invalidating {namespace} cache: {str(e)}')
+
+
+def cached_response(namespace):
+    """Serve a GET view through rsvp_cache, keyed by namespace and query args.
+
+    namespace may also be a function of the view's arguments, for views whose
+    collection depends on the URL.
+
+    The ETag is derived from the namespace generation and the query. A poll
+    with a matching If-None-Match gets a 304 without a database query, but only
+    while the cache entry is live: generations never expire, so once the entry
+    is evicted or older than the TTL the view is run again. Successful
+    responses are stored as they are streamed.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if rsvp_cache is None:
+                return view(*args, **kwargs)
+            name = namespace(*args, **kwargs) if callable(namespace) else namespace
+            try:
+                generation = rsvp_cache.generation(name)
+            except Exception as e:
+                logger.error(f'Error reading {name} cache: {str(e)}')
+                return view(*args, **kwargs)
+            query = '&'.join(f'{k}={v}' for k, v in sorted(request.args.items(multi=True)))
+            key = f'{name}:{generation}:{query}'
+            etag = hashlib.sha1(key.encode()).hexdigest()
+            try:
+                with span('cache'):
+                    body = rsvp_cache.get(key)
+            except Exception as e:
+                logger.error(f'Error reading {name} cache: {str(e)}')
+                body = None
+            if body is not None and etag in request.if_none_match:
+                response = Response(status=304)
+                response.set_etag(etag)
+                return response
+            if body is not None:
+                response = Response(body, status=200, mimetype='application/json')
+                response.set_etag(etag)
+                return response
+
+            response = current_app.make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            response.set_etag(etag)
+            if response.is_streamed:
+                response.response = tee_into_cache(response.response, key)
+            else:
+                store_in_cache(key, response.get_data())
+            return response
+        return wrapper
+    return decorator
+
+
+def tee_into_cache(chunks, key):
+    """Pass streamed chunks through, caching the body once it completed."""
+    parts = []
+    for chunk in chunks:
+        parts.append(chunk if isinstance(chunk, bytes) else chunk.encode())
+        yield chunk
+    store_in_cache(key, b''.join(parts))
+
+
+def store_in_cache(key, body):
+    try:
+        rsvp_cache.set(key, body)
+    except Exception as e:
+        logger.error(f'Error writing RSVP cache: {str(e)}')
+
+
+def publish_change(collection_name, operation, doc):
+    try:
+        change_feed.publish(collection_name, operation, doc)
+    except Exception as e:
+        logger.error(f'Error publishing {collection_name} change: {str(e)}')
+
+
+def save_rsvp(store, doc, all_fields, idempotency_key=None):
+    """Upsert an RSVP into a store (see storage.py) by its guest_key and return (rsvp_id, status_code).
+
+    A new guest gets 201; a resubmission updates the existing RSVP in the same
+    round trip and gets 200 with the original id. An Idempotency-Key that was
+    already used for a different guest gets (None, 422). In write-behind mode
+    the upsert is queued and acknowledged with 202; if the queue is full it
+    falls back to a synchronous upsert. With RSVP_FALLBACK, an upsert MongoDB
+    can't take in time is logged locally and also acknowledged with 202.
+
+    Only the default collections feed the materialised summary and the
+    change feed; an event's collections (see events.py) have neither.
+    """
+    doc['_id'] = ObjectId()
+    filter, update = upsert_operation(doc, all_fields, idempotency_key)
+    shared = store.name in WATCHED_COLLECTIONS
+    if write_behind is not None:
+        try:
+            write_behind.submit(store.collection, filter, update)
+            # The stored RSVP is not known yet, so the event carries the
+            # submission itself
+            if shared:
+                publish_change(store.name, 'upsert', {
+                    k: v for k, v in doc.items() if k not in PRIVATE_FIELDS})
+            return doc['_id'], 202
+        except queue.Full:
+            logger.warning(f'Write-behind queue full, saving {store.name} RSVP synchronously')
+    if fallback_log is not None:
+        if fallback_log.degraded:
+            return log_rsvp(store, doc, filter, update)
+        try:
+            with pymongo.timeout(fallback_log.write_timeout):
+                before = upsert_rsvp(store, filter, update)
+        except UNREACHABLE_ERRORS as e:
+            logger.error(f'Error saving {store.name} RSVP, logging it locally: {str(e)}')
+            return log_rsvp(store, doc, filter, update)
+    else:
+        before = upsert_rsvp(store, filter, update)
+    if before is ALREADY_USED:
+        return None, 422
+    stored = stored_document(before, update)
+    if use_stats and shared:
+        update_stats(store.name, before, stored)
+    invalidate_cache(store.name)
+    if shared:
+        publish_change(store.name, 'insert' if before is None else 'update', stored)
+    return stored['_id'], 201 if before is None else 200
+
+
+# upsert_rsvp's result for an Idempotency-Key used for a different guest
+ALREADY_USED = object()
+
+
+def upsert_rsvp(store, filter, update):
+    """Apply an upsert_operation and return the RSVP it replaced (None if inserted, or ALREADY_USED)."""
+    for attempt in range(2):
+        try:
+            return store.upsert(filter, update)
+        except DuplicateKeyError as e:
+            if reused_idempotency_key(e.details):
+                return ALREADY_USED
+            # Two first submissions from the same guest raced; the retry
+            # matches the RSVP the other one inserted.
+            if attempt:
+                raise
+
+
+def log_rsvp(store, doc, filter, update):
+    """Log an upsert to fallback_log and return (rsvp_id, 202), as write-behind does."""
+    fallback_log.append(store.name, filter, update)
+    if store.name in WATCHED_COLLECTIONS:
+        publish_change(store.name, 'upsert', {k: v for k, v in doc.items() if k not in PRIVATE_FIELDS})
+    return doc['_id'], 202
+
+
+def replayed_rsvps(collection_name):
+    # Logged upserts don't report what they replaced, so the summary is recounted
+    invalidate_cache(collection_name)
+    if use_stats and collection_name in WATCHED_COLLECTIONS:
+        try:
+            storage.rebuild_summary()
+        except Exception as e:
+            logger.error(f'Error rebuilding RSVP stats: {str(e)}')
+
+
+def update_stats(collection_name, before, after):
+    increment = stats.summary_increment(collection_name, before, after)
+    if increment is None:
+        return
+    try:
+        if not storage.increment_summary(increment):
+            # No summary yet: count everything, including this RSVP
+            storage.rebuild_summary()
+    except Exception as e:
+        # The RSVP itself is saved; rebuild_stats.py brings the summary back in line
+        logger.error(f'Error updating RSVP stats: {str(e)}')
+
+
+def serialize_rsvp(doc, dumps):
+    """Encode a single RSVP document as JSON text for the list endpoints."""
+    return dumps(format_rsvp(doc))
+
+
+def stream_rsvp_page(cursor, limit, group_by_type=None):
+    """Stream a page of RSVPs as a JSON object straight from a storage cursor.
+
+    Rows are encoded and yielded one at a time, so a page is never held in
+    memory. When group_by_type is given it is called with the (created_at, _id)
+    bounds of the page and must return a cursor over the same rows sorted by
+    response_type; those rows are streamed into "rsvps_by_type".
+    """
+    # Run the query before the response starts so connection errors still
+    # surface as a 500 from the view instead of a truncated body.
+    with span('query'):
+        first_doc = next(cursor, None)
+    # The body is generated after the app context has gone
+    dumps = current_app.json.dumps
+    trace = tracing.current_trace()
+
+    def generate():
+        count = 0
+        newest = oldest = None
+        next_cursor = None
+        started = time.perf_counter()
+        try:
+            yield '{"rsvps":['
+            doc = first_doc
+            while doc is not None:
+                if count == limit:
+                    next_cursor = encode_cursor(oldest)
+                    break
+                oldest = {'created_at': doc['created_at'], '_id': doc['_id']}
+                if newest is None:
+                    newest = oldest
+                yield (',' if count else '') + serialize_rsvp(doc, dumps)
+                count += 1
+                doc = next(cursor, None)
+            yield ']'
+            if group_by_type is not None:
+                yield ',"rsvps_by_type":{'
+                seen = []
+                if count:
+                    for doc in group_by_type(newest, oldest):
+                        if not seen or doc['response_type'] != seen[-1]:
+                            yield ('],' if seen else '') + dumps(doc['response_type']) + ':['
+                            seen.append(doc['response_type'])
+                            separator = ''
+                        yield separator + serialize_rsvp(doc, dumps)
+                        separator = ','
+                    if seen:
+                        yield ']'
+                for response_type in RESPONSE_TYPES:
+                    if response_type not in seen:
+                        yield (',' if seen else '') + dumps(response_type) + ':[]'
+                        seen.append(response_type)
+                yield '}'
+            yield ',"count":' + str(count) + ',"next_cursor":' + dumps(next_cursor) + '}'
+        except Exception as e:
+            logger.error(f'Error streaming RSVPs: {str(e)}')
+            raise
+        finally:
+            cursor.close()
+            if trace is not None:
+                # Includes the getMore and group_by_type round trips
+                trace.add_span('stream', time.perf_counter() - started)
+
+    return Response(generate(), status=200, mimetype='application/json')
+
+
+def event_rsvps(event_id, collection_name):
+    return storage.rsvps(event_collection_name(event_id, collection_name))
+
+
+def event_scoped(view):
+    """Serve <event_id> routes only for registered, unarchived events, creating the event's indexes on first use."""
+    @functools.wraps(view)
+    def wrapper(event_id):
+        try:
+            event = event_registry.get(event_id)
+            if event is None:
+                return jsonify({'error': 'Event not found'}), 404
+            # Its collections were dropped by archive_rsvps.py (see archive.py)
+            if event.get('archived_at'):
+                return jsonify({'error': 'Event has been archived'}), 410
+        except Exception as e:
+            logger.error(f'Error looking up event {event_id}: {str(e)}')
+            return jsonify({'error': 'Internal server error'}), 500
+        try:
+            event_registry.ensure_indexes(event_id)
+        except Exception as e:
+            # Retried on the next request for the event, as in ensure_indexes_once
+            logger.error(f'Error creating indexes for event {event_id}: {str(e)}')
+        return view(event_id)
+    return wrapper
+
+
+def submit_afterparty(store):
+    try:
+        with span('parse'):
+            data = request.get_json()
         if not data:
             return jsonify({'error': 'No data provided'}), 400
-        required_fields = ['name', 'telegram', 'phone_number']
-        missing_fields = [field for field in required_fields if field not in data or not data[field]]
-        if missing_fields:
-            return jsonify({'error': f'Missing required fields: {", ".join(missing_fields)}'}), 400
-        if not isinstance(data['name'], str) or len(data['name'].strip()) == 0:
-            return jsonify({'error': 'Name must be a non-empty string'}), 400
-        if not isinstance(data['telegram'], str) or len(data['telegram'].strip()) == 0:
-            return jsonify({'error': 'Telegram must be a non-empty string'}), 400
-        if not isinstance(data['phone_number'], str) or len(data['phone_number'].strip()) == 0:
-            return jsonify({'error': 'Phone number must be a non-empty string'}), 400
-        new_rsvp = {
-            'name': data['name'].strip(),
-            'telegram': data['telegram'].strip(),
-            'phone_number': data['phone_number'].strip(),
-            'created_at': datetime.utcnow()
-        }
-        result = afterparty_collection.insert_one(new_rsvp)
-        return jsonify({'message': 'RSVP received', 'rsvp_id': str(result.inserted_id)}), 201
-    except Exception as e:
-        app.logger.error(f'Error submitting RSVP: {str(e)}')
+        try:
+            idempotency_key = parse_idempotency_key(request.headers)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        with span('validate'):
+            new_rsvp, error = build_afterparty_rsvp(data)
+        if error:
+            return jsonify({'error': error}), 400
+        with span('save'):
+            rsvp_id, status = save_rsvp(store, new_rsvp, AFTERPARTY_FIELDS, idempotency_key)
+        if status == 422:
+            return jsonify({'error': 'Idempotency-Key was already used for a different RSVP'}), 422
+        message = 'RSVP updated' if status == 200 else 'RSVP received'
+        return jsonify({'message': message, 'rsvp_id': str(rsvp_id)}), status
+    except Exception as e:
+        logger.error(f'Error submitting RSVP: {str(e)}')
         return jsonify({'error': 'Internal server error'}), 500
 
-@app.route('/api/rsvp', methods=['GET'])
-def get_rsvps():
+
+def page_sizes():
+    """parse_page_args' page size settings, from the app config."""
+    return {'page_size': current_app.config['RSVP_PAGE_SIZE'],
+            'max_page_size': current_app.config['RSVP_MAX_PAGE_SIZE']}
+
+
+def afterparty_page(store):
     try:
-        rsvps = list(afterparty_collection.find().sort('created_at', -1))
-        for rsvp in rsvps:
-            rsvp['id'] = str(rsvp['_id'])
-            rsvp['created_at'] = rsvp['created_at'].isoformat() if 'created_at' in rsvp else None
-            del rsvp['_id']
-        return jsonify({'rsvps': rsvps, 'count': len(rsvps)}), 200
+        try:
+            limit, keyset, projection = parse_page_args(request.args, AFTERPARTY_FIELDS, **page_sizes())
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        cursor = store.find_page({}, limit, keyset, projection)
+        return stream_rsvp_page(cursor, limit)
     except Exception as e:
-        app.logger.error(f'Error retrieving RSVPs: {str(e)}')
+        logger.error(f'Error retrieving RSVPs: {str(e)}')
         return jsonify({'error': 'Internal server error'}), 500
 
-@app.route('/api/wedding-rsvp', methods=['POST'])
-def submit_wedding_rsvp():
+
+def submit_wedding(store):
     try:
-        data = request.get_json()
+        with span('parse'):
+            data = request.get_json()
         if not data:
             return jsonify({'error': 'No data provided'}), 400
-        if 'response_type' not in data or data['response_type'] not in ['yes', 'no', 'maybe']:
-            return jsonify({'error': 'response_type must be one of: yes, no, maybe'}), 400
-        if 'full_name' not in data or not isinstance(data['full_name'], str) or len(data['full_name'].strip()) == 0:
-            return jsonify({'error': 'Full name must be a non-empty string'}), 400
-        response_type = data['response_type']
-        full_name = data['full_name'].strip()
-        new_rsvp = {
-            'response_type': response_type,
-            'full_name': full_name,
-            'created_at': datetime.utcnow()
-        }
-        if response_type == 'yes':
-            if 'telegram_username' not in data or not isinstance(data['telegram_username'], str) or len(data['telegram_username'].strip()) == 0:
-                return jsonify({'error': 'Telegram username is required for yes responses'}), 400
-            if 'phone_number' not in data or not isinstance(data['phone_number'], str) or len(data['phone_number'].strip()) == 0:
-                return jsonify({'error': 'Phone number is required for yes responses'}), 400
-            new_rsvp['telegram_username'] = data['telegram_username'].strip()
-            new_rsvp['phone_number'] = data['phone_number'].strip()
-            new_rsvp['dietary_restrictions'] = data.get('dietary_restrictions', '').strip() if data.get('dietary_restrictions') else None
-        elif response_type == 'no':
-            new_rsvp['message'] = data.get('message', '').strip() if data.get('message') else None
-        elif response_type == 'maybe':
-            new_rsvp['note'] = data.get('note', '').strip() if data.get('note') else None
-        result = wedding_rsvp_collection.insert_one(new_rsvp)
-        return jsonify({'message': f'Wedding RSVP ({response_type}) received', 'rsvp_id': str(result.inserted_id)}), 201
-    except Exception as e:
-        app.logger.error(f'Error submitting Wedding RSVP: {str(e)}')
+        try:
+            idempotency_key = parse_idempotency_key(request.headers)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        with span('validate'):
+            new_rsvp, error = build_wedding_rsvp(data)
+        if error:
+            return jsonify({'error': error}), 400
+        response_type = new_rsvp['response_type']
+        with span('save'):
+            rsvp_id, status = save_rsvp(store, new_rsvp, WEDDING_RSVP_FIELDS, idempotency_key)
+        if status == 422:
+            return jsonify({'error': 'Idempotency-Key was already used for a different RSVP'}), 422
+        outcome = 'updated' if status == 200 else 'received'
+        return jsonify({'message': f'Wedding RSVP ({response_type}) {outcome}', 'rsvp_id': str(rsvp_id)}), status
+    except Exception as e:
+        logger.error(f'Error submitting Wedding RSVP: {str(e)}')
         return jsonify({'error': 'Internal server error'}), 500
 
-@app.route('/api/wedding-rsvp', methods=['GET'])
+
+def wedding_page(store):
+    try:
+        try:
+            query = response_type_query(request.args)
+            # response_type is needed to group the page by type
+            limit, keyset, projection = parse_page_args(
+                request.args, WEDDING_RSVP_FIELDS, always_fields={'response_type'}, **page_sizes())
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        cursor = store.find_page(query, limit, keyset, projection)
+
+        def group_by_type(newest, oldest):
+            # Second pass over the same page, served by the
+            # (response_type, created_at, _id) index.
+            return store.find_range_by_type(query, newest, oldest, projection)
+
+        return stream_rsvp_page(cursor, limit, group_by_type)
+    except Exception as e:
+        logger.error(f'Error retrieving Wedding RSVPs: {str(e)}')
+        return jsonify({'error': 'Internal server error'}), 500
+
+
+def search_rsvps(store_for):
+    """Search the RSVP collections; store_for maps 'wedding_rsvp' or 'afterparty' to its store."""
+    try:
+        try:
+            max_results = current_app.config['RSVP_SEARCH_MAX_RESULTS']
+            terms, limit, offset, collections = parse_search_args(request.args, max_results)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        matches = []
+        with span('query'):
+            for collection_name in collections:
+                cursor = store_for(collection_name).search(terms, max_results)
+                matches.extend((collection_name, doc) for doc in cursor)
+        with span('rank'):
+            ranked = rank_results(matches, terms, max_results)
+        results = [
+            {'collection': collection_name, 'rank': rank, 'rsvp': format_rsvp(doc)}
+            for rank, collection_name, doc in ranked[offset:offset + limit]
+        ]
+        next_offset = offset + limit if len(ranked) > offset + limit else None
+        return jsonify({'results': results, 'count': len(results), 'next_offset': next_offset}), 200
+    except Exception as e:
+        logger.error(f'Error searching RSVPs: {str(e)}')
+        return jsonify({'error': 'Internal server error'}), 500
+
+
+def submit_rsvp():
+    return submit_afterparty(storage.rsvps('afterparty'))
+
+@cached_response('afterparty')
+def get_rsvps():
+    return afterparty_page(storage.rsvps('afterparty'))
+
+def submit_wedding_rsvp():
+    return submit_wedding(storage.rsvps('wedding_rsvp'))
+
+@cached_response('wedding_rsvp')
 def get_wedding_rsvps():
+    return wedding_page(storage.rsvps('wedding_rsvp'))
+
+def search_guests():
+    return search_rsvps(storage.rsvps)
+
+def get_event(event_id):
+    # Not event_scoped: an archived event is still described, with its summary
+    try:
+        event = event_registry.get(event_id)
+        if event is None:
+            return jsonify({'error': 'Event not found'}), 404
+        return jsonify(format_event(event)), 200
+    except Exception as e:
+        logger.error(f'Error looking up event {event_id}: {str(e)}')
+        return jsonify({'error': 'Internal server error'}), 500
+
+@event_scoped
+def submit_event_rsvp(event_id):
+    return submit_afterparty(event_rsvps(event_id, 'afterparty'))
+
+@event_scoped
+@cached_response(lambda event_id: event_collection_name(event_id, 'afterparty'))
+def get_event_rsvps(event_id):
+    return afterparty_page(event_rsvps(event_id, 'afterparty'))
+
+@event_scoped
+def search_event_guests(event_id):
+    return search_rsvps(lambda collection_name: event_rsvps(event_id, collection_name))
+
+@event_scoped
+def submit_event_wedding_rsvp(event_id):
+    return submit_wedding(event_rsvps(event_id, 'wedding_rsvp'))
+
+@event_scoped
+@cached_response(lambda event_id: event_collection_name(event_id, 'wedding_rsvp'))
+def get_event_wedding_rsvps(event_id):
+    return wedding_page(event_rsvps(event_id, 'wedding_rsvp'))
+
+def upsert_chunk(store, operations, row_numbers, errors):
+    """Upsert one import chunk, recording per-row failures.
+
+    Returns (inserted, updated).
+    """
+    try:
+        return store.bulk_upsert(operations)
+    except BulkWriteError as e:
+        for err in e.details.get('writeErrors', []):
+            errors.append({'row': row_numbers[err['index']], 'error': err.get('errmsg', 'Write failed')})
+        return e.details.get('nUpserted', 0), e.details.get('nMatched', 0)
+
+
+def import_rsvps(store, build, all_fields):
+    """Validate and upsert an NDJSON or CSV upload in chunks, reading it as a stream.
+
+    Rows are deduplicated by guest_key like single submissions: a row for a
+    guest that already has an RSVP, or that appears again later in the upload,
+    updates it.
+    """
+    fmt = upload_format(request.mimetype)
+    if fmt is None:
+        return jsonify({'error': 'Content-Type must be application/x-ndjson or text/csv'}), 415
+    inserted = updated = 0
+    errors = []
+    # guest_key -> (row number, upsert); a later row for the same guest
+    # replaces an earlier one within the chunk
+    chunk = {}
+    for row_number, payload, error in iter_upload_rows(request.stream, fmt):
+        if error is None:
+            doc, error = build(payload)
+        if error:
+            errors.append({'row': row_number, 'error': error})
+            continue
+        if doc['guest_key'] in chunk:
+            updated += 1
+        chunk[doc['guest_key']] = (row_number, upsert_operation(doc, all_fields))
+        if len(chunk) >= current_app.config['RSVP_BULK_CHUNK_SIZE']:
+            counts = upsert_chunk(store, *unzip_chunk(chunk), errors)
+            inserted, updated = inserted + counts[0], updated + counts[1]
+            chunk = {}
+    if chunk:
+        counts = upsert_chunk(store, *unzip_chunk(chunk), errors)
+        inserted, updated = inserted + counts[0], updated + counts[1]
+    if inserted or updated:
+        invalidate_cache(store.name)
+        if use_stats:
+            # bulk_write does not say what each upsert replaced, so recount
+            try:
+                storage.rebuild_summary()
+            except Exception as e:
+                logger.error(f'Error rebuilding RSVP stats: {str(e)}')
+        # Imported RSVPs are not published one by one; feed clients reload
+        publish_change(store.name, 'reload', None)
+    errors.sort(key=lambda e: e['row'])
+    return jsonify({'inserted': inserted, 'updated': updated, 'failed': len(errors), 'errors': errors}), 200
+
+
+def unzip_chunk(chunk):
+    """Split a chunk into (operations, row_numbers) lists."""
+    row_numbers = [row_number for row_number, _ in chunk.values()]
+    operations = [operation for _, operation in chunk.values()]
+    return operations, row_numbers
+
+
+def export_rsvps(store, query, columns):
+    """Stream every matching RSVP, newest first, as NDJSON or CSV."""
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in ('ndjson', 'csv'):
+        return jsonify({'error': 'format must be one of: ndjson, csv'}), 400
+    cursor = store.export(query)
+    # Run the query before the response starts, as in stream_rsvp_page
+    first_doc = next(cursor, None)
+
+    def docs():
+        try:
+            doc = first_doc
+            while doc is not None:
+                yield doc
+                doc = next(cursor, None)
+        except Exception as e:
+            logger.error(f'Error exporting {store.name}: {str(e)}')
+            raise
+        finally:
+            cursor.close()
+
+    mimetype = 'application/x-ndjson' if fmt == 'ndjson' else 'text/csv'
+    response = Response(export_rows(docs(), fmt, columns, format_rsvp), status=200, mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename={store.name}.{fmt}'
+    return response
+
+def bulk_import_rsvps():
+    try:
+        return import_rsvps(storage.rsvps('afterparty'), build_afterparty_rsvp, AFTERPARTY_FIELDS)
+    except Exception as e:
+        logger.error(f'Error importing RSVPs: {str(e)}')
+        return jsonify({'error': 'Internal server error'}), 500
+
+def export_afterparty_rsvps():
+    try:
+        return export_rsvps(storage.rsvps('afterparty'), {}, AFTERPARTY_COLUMNS)
+    except Exception as e:
+        logger.error(f'Error exporting RSVPs: {str(e)}')
+        return jsonify({'error': 'Internal server error'}), 500
+
+def bulk_import_wedding_rsvps():
+    try:
+        return import_rsvps(storage.rsvps('wedding_rsvp'), build_wedding_rsvp, WEDDING_RSVP_FIELDS)
+    except Exception as e:
+        logger.error(f'Error importing Wedding RSVPs: {str(e)}')
+        return jsonify({'error': 'Internal server error'}), 500
+
+def export_wedding_rsvps():
+    try:
+        try:
+            query = response_type_query(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return export_rsvps(storage.rsvps('wedding_rsvp'), query, WEDDING_RSVP_COLUMNS)
+    except Exception as e:
+        logger.error(f'Error exporting Wedding RSVPs: {str(e)}')
+        return jsonify({'error': 'Internal server error'}), 500
+
+def format_change_event(event, dumps):
+    """Render a changes.ChangeEvent as a Server-Sent Events message."""
+    data = {'collection': event.collection, 'operation': event.operation}
+    if event.document is not None:
+        # The document is shared by every subscriber, so format a copy
+        data['rsvp'] = format_rsvp({k: v for k, v in event.document.items() if k not in PRIVATE_FIELDS})
+    return f'id: {event.id}\nevent: rsvp\ndata: {dumps(data)}\n\n'
+
+
+def stream_changes():
     try:
-        response_type = request.args.get('response_type')
-        query = {}
-        if response_type:
-            if response_type not in ['yes', 'no', 'maybe']:
-                return jsonify({'error': 'response_type must be one of: yes, no, maybe'}), 400
-            query['response_type'] = response_type
-        rsvps = list(wedding_rsvp_collection.find(query).sort('created_at', -1))
-        rsvps_by_type = {'yes': [], 'no': [], 'maybe': []}
-        for rsvp in rsvps:
-            rsvp['id'] = str(rsvp['_id'])
-            rsvp['created_at'] = rsvp['created_at'].isoformat() if 'created_at' in rsvp else None
-            rsvps_by_type[rsvp['response_type']].append(rsvp.copy())
-            del rsvp['_id']
-        return jsonify({
-            'rsvps': rsvps,
-            'rsvps_by_type': rsvps_by_type,
-            'count': len(rsvps),
-            'count_by_type': {k: len(v) for k, v in rsvps_by_type.items()}
-        }), 200
-    except Exception as e:
-        app.logger.error(f'Error retrieving Wedding RSVPs: {str(e)}')
+        # Browsers send Last-Event-ID when EventSource reconnects; the query
+        # arg lets a freshly opened page resume too
+        last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+        collections = request.args.get('collections')
+        if collections:
+            collections = {c.strip() for c in collections.split(',') if c.strip()}
+            unknown = collections - set(WATCHED_COLLECTIONS)
+            if unknown:
+                return jsonify({'error': f'Unknown collections: {", ".join(sorted(unknown))}'}), 400
+        dumps = current_app.json.dumps
+        reset = False
+        try:
+            events = change_feed.listen(last_event_id)
+        except ResumeError:
+            # Too old or from another worker/restart: start from now and tell
+            # the client to reload the lists
+            reset = True
+            events = change_feed.listen()
+
+        def generate():
+            yield 'retry: 3000\n\n'
+            if reset:
+                yield 'event: reset\ndata: {}\n\n'
+            try:
+                for event in events:
+                    if event is None:
+                        # Heartbeat: keeps proxies from timing out the
+                        # connection and notices clients that went away
+                        yield ': keep-alive\n\n'
+                    elif not collections or event.collection in collections:
+                        yield format_change_event(event, dumps)
+            except Exception as e:
+                logger.error(f'Error streaming changes: {str(e)}')
+                raise
+            finally:
+                events.close()
+
+        response = Response(generate(), status=200, mimetype='text/event-stream')
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Accel-Buffering'] = 'no'
+        return response
+    except Exception as e:
+        logger.error(f'Error opening change feed: {str(e)}')
+        return jsonify({'error': 'Internal server error'}), 500
+
+def aggregate_summary(wedding_store, afterparty_store, since):
+    facets = wedding_store.summary_facets(since)
+    return jsonify(format_summary(facets, afterparty_store.count())), 200
+
+
+def get_rsvp_summary():
+    try:
+        try:
+            since = parse_summary_hours(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if use_stats:
+            summary = storage.stats_summary()
+            if summary is None:
+                summary = storage.rebuild_summary()
+            return jsonify(stats.format_stats_summary(summary, since)), 200
+        return aggregate_summary(storage.rsvps('wedding_rsvp'), storage.rsvps('afterparty'), since)
+    except Exception as e:
+        logger.error(f'Error computing RSVP summary: {str(e)}')
+        return jsonify({'error': 'Internal server error'}), 500
+
+@event_scoped
+def get_event_summary(event_id):
+    try:
+        try:
+            since = parse_summary_hours(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return aggregate_summary(
+            event_rsvps(event_id, 'wedding_rsvp'), event_rsvps(event_id, 'afterparty'), since)
+    except Exception as e:
+        logger.error(f'Error computing RSVP summary for event {event_id}: {str(e)}')
         return jsonify({'error': 'Internal server error'}), 500
 
-@app.route('/health', methods=['GET'])
+def warm_up():
+    """Connect to the database, create the indexes and touch each collection once.
+
+    Run by the first readiness check with RSVP_WARMUP=true, so the worker's
+    first real request does not pay for it.
+    """
+    global _indexes_ready, _warmed_up
+    with _warmup_lock:
+        if _warmed_up:
+            return
+        started = time.perf_counter()
+        storage.ping()
+        with _indexes_lock:
+            if not _indexes_ready:
+                storage.create_indexes()
+                _indexes_ready = True
+        for collection_name in WATCHED_COLLECTIONS:
+            storage.rsvps(collection_name).touch()
+        _warmed_up = True
+        startup_timer.record('warmup', time.perf_counter() - started)
+
 def health_check():
     try:
         # Test MongoDB connection
-        client.admin.command('ping')
+        storage.ping()
         return jsonify({'status': 'healthy', 'database': 'connected'}), 200
     except Exception as e:
         return jsonify({'status': 'unhealthy', 'database': 'disconnected', 'error': str(e)}), 500
 
-@app.errorhandler(404)
+def liveness_check():
+    # The process is serving requests; MongoDB is deliberately not checked,
+    # so an outage doesn't get healthy workers restarted
+    return jsonify({'status': 'alive'}), 200
+
+def readiness_check():
+    try:
+        if current_app.config['RSVP_WARMUP']:
+            warm_up()
+        with pymongo.timeout(current_app.config['RSVP_READINESS_TIMEOUT']):
+            storage.ping()
+        startup_timer.record('ready', startup_timer.elapsed())
+        return jsonify({'status': 'ready', 'database': 'connected'}), 200
+    except Exception as e:
+        return jsonify({'status': 'not ready', 'database': 'disconnected', 'error': str(e)}), 503
+
+def startup_report():
+    return jsonify(startup_timer.snapshot()), 200
+
+_profile_lock = threading.Lock()
+
+def debug_profile():
+    token = current_app.config['RSVP_PROFILER_TOKEN']
+    # compare_digest only takes ASCII str, so compare bytes
+    if not hmac.compare_digest(request.headers.get('Authorization', '').encode(), f'Bearer {token}'.encode()):
+        return jsonify({'error': 'Unauthorized'}), 401
+    try:
+        seconds = float(request.args.get('seconds', 10))
+        interval = float(request.args.get('interval_ms', 10)) / 1000
+    except ValueError:
+        seconds = interval = 0
+    if not 0 < seconds <= 60 or not 0.001 <= interval <= 1:
+        return jsonify({'error': 'seconds must be between 0 and 60 and interval_ms between 1 and 1000'}), 400
+    if not _profile_lock.acquire(blocking=False):
+        return jsonify({'error': 'A profile is already running'}), 409
+    try:
+        samples = tracing.sample_stacks(seconds, interval)
+    finally:
+        _profile_lock.release()
+    return Response(tracing.format_folded(samples), status=200, mimetype='text/plain')
+
+def pool_health():
+    return jsonify(pool_stats.snapshot()), 200
+
+def prometheus_metrics():
+    return Response(metrics.render(pool_stats.snapshot()), status=200, content_type=metrics.CONTENT_TYPE)
+
 def not_found(error):
     return jsonify({'error': 'Endpoint not found'}), 404
 
-@app.errorhandler(405)
 def method_not_allowed(error):
     return jsonify({'error': 'Method not allowed'}), 405
 
+
+def register_routes(app):
+    app.add_url_rule('/api/rsvp', view_func=submit_rsvp, methods=['POST'])
+    app.add_url_rule('/api/rsvp', view_func=get_rsvps, methods=['GET'])
+    app.add_url_rule('/api/wedding-rsvp', view_func=submit_wedding_rsvp, methods=['POST'])
+    app.add_url_rule('/api/wedding-rsvp', view_func=get_wedding_rsvps, methods=['GET'])
+    app.add_url_rule('/api/search', view_func=search_guests, methods=['GET'])
+    app.add_url_rule('/api/events/<event_id>', view_func=get_event, methods=['GET'])
+    app.add_url_rule('/api/events/<event_id>/rsvp', view_func=submit_event_rsvp, methods=['POST'])
+    app.add_url_rule('/api/events/<event_id>/rsvp', view_func=get_event_rsvps, methods=['GET'])
+    app.add_url_rule('/api/events/<event_id>/search', view_func=search_event_guests, methods=['GET'])
+    app.add_url_rule('/api/events/<event_id>/wedding-rsvp', view_func=submit_event_wedding_rsvp, methods=['POST'])
+    app.add_url_rule('/api/events/<event_id>/wedding-rsvp', view_func=get_event_wedding_rsvps, methods=['GET'])
+    app.add_url_rule('/api/rsvp/bulk', view_func=bulk_import_rsvps, methods=['POST'])
+    app.add_url_rule('/api/rsvp/export', view_func=export_afterparty_rsvps, methods=['GET'])
+    app.add_url_rule('/api/wedding-rsvp/bulk', view_func=bulk_import_wedding_rsvps, methods=['POST'])
+    app.add_url_rule('/api/wedding-rsvp/export', view_func=export_wedding_rsvps, methods=['GET'])
+    app.add_url_rule('/api/changes', view_func=stream_changes, methods=['GET'])
+    app.add_url_rule('/api/summary', view_func=get_rsvp_summary, methods=['GET'])
+    app.add_url_rule('/api/events/<event_id>/summary', view_func=get_event_summary, methods=['GET'])
+    app.add_url_rule('/health', view_func=health_check, methods=['GET'])
+    app.add_url_rule('/health/pool', view_func=pool_health, methods=['GET'])
+    app.add_url_rule('/health/live', view_func=liveness_check, methods=['GET'])
+    app.add_url_rule('/health/ready', view_func=readiness_check, methods=['GET'])
+    app.add_url_rule('/health/startup', view_func=startup_report, methods=['GET'])
+    app.add_url_rule('/metrics', view_func=prometheus_metrics, methods=['GET'])
+    if app.config['RSVP_PROFILER_TOKEN']:
+        app.add_url_rule('/debug/profile', view_func=debug_profile, methods=['GET'])
+    app.register_error_handler(404, not_found)
+    app.register_error_handler(405, method_not_allowed)
+
+
+def create_app():
+    """Build the Flask app and its services from the environment (and .env).
+
+    No MongoDB connection is made here; each worker connects on its first
+    request or readiness check. The services are module globals shared by
+    the views, so build one app per process. Raises RuntimeError if
+    MONGODB_URI is unset and RSVP_STORAGE is mongodb.
+    """
+    global storage, rsvp_cache, write_behind, fallback_log, use_stats, change_feed, event_registry
+    started = time.perf_counter()
+    load_dotenv()
+
+    app = Flask(__name__)
+    app.config['RSVP_BULK_CHUNK_SIZE'] = int(os.getenv('RSVP_BULK_CHUNK_SIZE', 500))
+    app.config['RSVP_READINESS_TIMEOUT'] = float(os.getenv('RSVP_READINESS_TIMEOUT', 2))
+    app.config['RSVP_PAGE_SIZE'] = int(os.getenv('RSVP_PAGE_SIZE', DEFAULT_PAGE_SIZE))
+    app.config['RSVP_MAX_PAGE_SIZE'] = int(os.getenv('RSVP_MAX_PAGE_SIZE', MAX_PAGE_SIZE))
+    app.config['RSVP_SEARCH_MAX_RESULTS'] = int(os.getenv('RSVP_SEARCH_MAX_RESULTS', SEARCH_MAX_RESULTS))
+    app.config['RSVP_WARMUP'] = os.getenv('RSVP_WARMUP', 'False').lower() == 'true'
+    app.config['RSVP_PROFILER_TOKEN'] = os.getenv('RSVP_PROFILER_TOKEN', '')
+    CORS(app)
+    json_provider.init_app(app)
+    startup_timer.instrument(app)
+    # Registered early so request timings include the other before_request hooks
+    metrics.instrument(app)
+    tracing.instrument(app, get_client)
+    # Turns clients away before any other hook or view touches MongoDB
+    ratelimit.protect(app)
+    app.before_request(ensure_indexes_once)
+
+    storage = create_storage(get_client, get_db)
+    # The in-memory backend (tests, profiling) has no MongoDB to queue,
+    # log or watch writes for
+    in_memory = isinstance(storage, MemoryStorage)
+    if not in_memory:
+        # Fail at startup rather than on the first request
+        mongodb_uri()
+    rsvp_cache = create_cache()
+    write_behind = create_writer(get_db, on_flush=invalidate_cache)
+    if write_behind is not None and in_memory:
+        app.logger.warning('RSVP_WRITE_BEHIND is ignored with RSVP_STORAGE=memory')
+        write_behind = None
+    if write_behind is not None:
+        atexit.register(write_behind.drain)
+    # Write-behind upserts don't report what they replaced, so the
+    # materialised summary can't be kept with them
+    use_stats = stats.stats_enabled()
+    if use_stats and write_behind is not None:
+        app.logger.warning('RSVP_STATS is ignored in write-behind mode; /api/summary will aggregate')
+        use_stats = False
+    fallback_log = create_fallback(get_db, on_replay=replayed_rsvps)
+    if fallback_log is not None and in_memory:
+        app.logger.warning('RSVP_FALLBACK is ignored with RSVP_STORAGE=memory')
+        fallback_log = None
+    change_feed = create_feed(get_db, mode='hub' if in_memory else None)
+    event_registry = create_registry(storage)
+
+    register_routes(app)
+    elapsed = time.perf_counter() - started
+    startup_timer.record('create_app', elapsed)
+    app.logger.info(f'App created in {elapsed * 1000:.1f} ms')
+    return app
+
+
+_app = None
+
+
+def __getattr__(name):
+    # app is built on first access ('gunicorn app:app', 'from app import app'),
+    # so importing this module does no setup
+    global _app
+    if name == 'app':
+        if _app is None:
+            _app = create_app()
+        return _app
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+startup_timer.record('import', startup_timer.elapsed())
+
 if __name__ == '__main__':
+    app = create_app()
     app.run(
         host=os.getenv('FLASK_HOST', '0.0.0.0'),
         port=int(os.getenv('FLASK_PORT', 5000)),
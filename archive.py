@@ -0,0 +1,220 @@
+"""
+Retention for the RSVP collections.
+Old RSVPs, and whole past events, are exported to compressed NDJSON (or
+Parquet) files, rolled into a summary record in the rsvp_archives collection,
+and then deleted, so the hot collections and their indexes only hold what
+the API still serves. RSVPs from test or staging events can instead expire
+on their own through a TTL index on created_at. archive_rsvps.py runs all of
+it from the command line.
+"""
+
+import gzip
+import importlib.util
+import os
+from datetime import datetime
+
+from pymongo import ASCENDING
+
+from bulk import AFTERPARTY_COLUMNS, WEDDING_RSVP_COLUMNS, export_rows
+from events import EVENTS_COLLECTION, event_collection_name
+from rsvp import PRIVATE_FIELDS_PROJECTION, format_rsvp, format_summary, summary_pipeline
+
+ARCHIVES_COLLECTION = 'rsvp_archives'
+ARCHIVE_FORMATS = ('ndjson', 'parquet')
+
+TTL_INDEX_NAME = 'created_at_ttl'
+
+# Columns written to Parquet files; NDJSON keeps every field
+ARCHIVE_COLUMNS = {
+    'afterparty': AFTERPARTY_COLUMNS + ['updated_at'],
+    'wedding_rsvp': WEDDING_RSVP_COLUMNS + ['updated_at'],
+}
+
+
+def base_collection(collection_name):
+    """'wedding_rsvp' or 'afterparty' for a collection or an event's copy of it."""
+    return collection_name.split('.', 1)[0]
+
+
+def archive_path(out_dir, collection_name, fmt, archived_at):
+    suffix = 'ndjson.gz' if fmt == 'ndjson' else 'parquet'
+    return os.path.join(out_dir, f"{collection_name}.{archived_at.strftime('%Y%m%dT%H%M%S')}.{suffix}")
+
+
+def write_ndjson(path, docs):
+    """Write docs (API-shaped dicts) to a gzipped NDJSON file. Returns the number written."""
+    count = 0
+    with open(path, 'wb') as raw:
+        with gzip.open(raw, 'wt', encoding='utf-8') as f:
+            for line in export_rows(docs, 'ndjson', None, lambda doc: doc):
+                f.write(line)
+                count += 1
+        # On disk before anything is deleted
+        raw.flush()
+        os.fsync(raw.fileno())
+    return count
+
+
+def write_parquet(path, docs, columns, batch_size=10000):
+    """Write docs (API-shaped dicts) to a Parquet file, every column a string. Returns the number written."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError('Parquet archives require the pyarrow package (pip install pyarrow)')
+    schema = pa.schema([(column, pa.string()) for column in columns])
+    count = 0
+    with pq.ParquetWriter(path, schema, compression='zstd') as writer:
+        batch = []
+        for doc in docs:
+            batch.append({column: None if doc.get(column) is None else str(doc[column]) for column in columns})
+            if len(batch) >= batch_size:
+                writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                count += len(batch)
+                batch = []
+        if batch:
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+            count += len(batch)
+    return count
+
+
+def check_format(fmt):
+    """Raise ValueError for an unknown archive format, RuntimeError if its writer isn't installed."""
+    if fmt not in ARCHIVE_FORMATS:
+        raise ValueError(f'Archive format must be one of: {", ".join(ARCHIVE_FORMATS)}')
+    if fmt == 'parquet' and importlib.util.find_spec('pyarrow') is None:
+        raise RuntimeError('Parquet archives require the pyarrow package (pip install pyarrow)')
+
+
+def archive_summary(collection, query):
+    """The /api/summary shape (see rsvp.format_summary) of the RSVPs matching query."""
+    if base_collection(collection.name) == 'afterparty':
+        return format_summary({}, collection.count_documents(query))['afterparty']
+    pipeline = [{'$match': query}] + summary_pipeline(datetime(1970, 1, 1))
+    facets = next(collection.aggregate(pipeline), {})
+    return format_summary(facets, 0)['wedding']
+
+
+def archive_collection(db, collection_name, query, out_dir, fmt='ndjson', delete=True, batch_size=1000):
+    """Export the RSVPs in collection_name matching query to a file in out_dir, then delete them.
+
+    The file is written under a temporary name and renamed once complete, and
+    nothing is deleted before that; if the export fails the temporary file is
+    removed. RSVPs updated while the export ran are kept in the collection
+    (they are also in the file). A summary of what was archived is stored in
+    ARCHIVES_COLLECTION. Returns that record.
+    """
+    check_format(fmt)
+    collection = db[collection_name]
+    started = datetime.utcnow()
+    path = archive_path(out_dir, collection_name, fmt, started)
+    os.makedirs(out_dir, exist_ok=True)
+
+    summary = archive_summary(collection, query)
+    docs = (format_rsvp(doc) for doc in collection.find(query, dict(PRIVATE_FIELDS_PROJECTION)).sort('_id', ASCENDING))
+    try:
+        if fmt == 'ndjson':
+            exported = write_ndjson(path + '.partial', docs)
+        else:
+            exported = write_parquet(path + '.partial', docs, ARCHIVE_COLUMNS[base_collection(collection_name)])
+    except Exception:
+        if os.path.exists(path + '.partial'):
+            os.remove(path + '.partial')
+        raise
+    os.replace(path + '.partial', path)
+
+    deleted = 0
+    if delete and exported:
+        not_updated = {'$or': [{'updated_at': {'$lt': started}}, {'updated_at': {'$exists': False}}]}
+        batch = []
+        for doc in collection.find(query, {'_id': 1}).sort('_id', ASCENDING):
+            batch.append(doc['_id'])
+            if len(batch) >= batch_size:
+                deleted += collection.delete_many({'_id': {'$in': batch}, **not_updated}).deleted_count
+                batch = []
+        if batch:
+            deleted += collection.delete_many({'_id': {'$in': batch}, **not_updated}).deleted_count
+
+    record = {
+        'collection': collection_name,
+        'file': path,
+        'format': fmt,
+        'exported': exported,
+        'deleted': deleted,
+        'summary': summary,
+        'archived_at': started
+    }
+    db[ARCHIVES_COLLECTION].insert_one(record)
+    return record
+
+
+def archive_before(db, before, out_dir, fmt='ndjson', collections=('wedding_rsvp', 'afterparty'), delete=True):
+    """Archive RSVPs created before a datetime from the default collections. Returns the archive records."""
+    return [
+        archive_collection(db, collection_name, {'created_at': {'$lt': before}}, out_dir, fmt, delete)
+        for collection_name in collections
+    ]
+
+
+def add_summaries(a, b):
+    """Sum two archive summaries field by field."""
+    total = dict(a)
+    for key, value in b.items():
+        total[key] = add_summaries(total.get(key, {}), value) if isinstance(value, dict) else total.get(key, 0) + value
+    return total
+
+
+def archive_event(db, event_id, out_dir, fmt='ndjson'):
+    """Archive a registered event's RSVPs, drop its collections and mark it archived.
+
+    The API answers 410 for an archived event once a worker's cached lookup
+    expires (RSVP_EVENT_CACHE_TTL). A collection that received RSVPs in the
+    meantime is not dropped; running this again archives them and adds them
+    to the event's summary. Returns the archive records.
+
+    If archiving fails, the event is left open as it was (without
+    archived_at, unless an earlier run set it) and the summary keeps what
+    was archived before the failure, so running this again finishes the job.
+    Raises ValueError if the event is not registered or fmt is unknown.
+    """
+    check_format(fmt)
+    event = db[EVENTS_COLLECTION].find_one_and_update(
+        {'_id': event_id}, {'$set': {'archived_at': datetime.utcnow()}})
+    if event is None:
+        raise ValueError(f"Event '{event_id}' is not registered")
+    summary = event.get('summary') or {}
+    records = []
+    try:
+        for collection_name in ('wedding_rsvp', 'afterparty'):
+            name = event_collection_name(event_id, collection_name)
+            record = archive_collection(db, name, {}, out_dir, fmt)
+            # Dropping the collection frees its indexes too
+            if db[name].estimated_document_count() == 0:
+                db[name].drop()
+            summary[collection_name] = add_summaries(summary.get(collection_name, {}), record['summary'])
+            records.append(record)
+    except Exception:
+        restore = {'$set': {'archived_at': event['archived_at']}} if event.get('archived_at') else \
+            {'$unset': {'archived_at': ''}}
+        if records:
+            restore.setdefault('$set', {})['summary'] = summary
+        db[EVENTS_COLLECTION].update_one({'_id': event_id}, restore)
+        raise
+    db[EVENTS_COLLECTION].update_one({'_id': event_id}, {'$set': {'summary': summary}})
+    return records
+
+
+def set_ttl(db, collection_name, seconds, partial_filter=None):
+    """Expire RSVPs in collection_name seconds after created_at; seconds=None removes the TTL.
+
+    partial_filter limits expiry to matching RSVPs, e.g. test submissions.
+    """
+    collection = db[collection_name]
+    if TTL_INDEX_NAME in collection.index_information():
+        collection.drop_index(TTL_INDEX_NAME)
+    if seconds is None:
+        return
+    options = {'expireAfterSeconds': int(seconds)}
+    if partial_filter:
+        options['partialFilterExpression'] = partial_filter
+    collection.create_index([('created_at', ASCENDING)], name=TTL_INDEX_NAME, **options)
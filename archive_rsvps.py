@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Retention script for the RSVP collections (see archive.py).
+This script exports old RSVPs or a past event to compressed files, records
+a summary of them in 'rsvp_archives' and removes them from MongoDB, or
+manages the TTL index that expires test submissions.
+
+Usage:
+    python archive_rsvps.py before 2025-01-01 --out archives/
+    python archive_rsvps.py event smith-jones-2025 --format parquet
+    python archive_rsvps.py ttl wedding_rsvp.staging --days 7 --where '{"response_type": "no"}'
+    python archive_rsvps.py ttl wedding_rsvp.staging --off
+    python archive_rsvps.py list
+"""
+
+import argparse
+import sys
+from datetime import datetime
+
+from bson import json_util
+from dotenv import load_dotenv
+
+from archive import ARCHIVE_FORMATS, ARCHIVES_COLLECTION, archive_before, archive_event, set_ttl
+from database import get_client, get_db
+import stats
+
+# Load environment variables
+load_dotenv()
+
+client = get_client()
+db = get_db()
+
+def print_record(record):
+    print(f"{record['collection']}: {record['exported']} exported to {record['file']}, "
+          f"{record['deleted']} removed; summary {record['summary']}")
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    before = commands.add_parser('before', help='archive RSVPs created before a date (YYYY-MM-DD, UTC)')
+    before.add_argument('date', type=datetime.fromisoformat)
+    before.add_argument('--collections', default='wedding_rsvp,afterparty')
+    before.add_argument('--keep', action='store_true', help='export and summarise only, delete nothing')
+    event = commands.add_parser('event', help="archive a registered event and drop its collections")
+    event.add_argument('event_id')
+    for command in (before, event):
+        command.add_argument('--format', choices=ARCHIVE_FORMATS, default='ndjson')
+        command.add_argument('--out', default='archives')
+    ttl = commands.add_parser('ttl', help='expire RSVPs in a collection some days after created_at')
+    ttl.add_argument('collection')
+    group = ttl.add_mutually_exclusive_group(required=True)
+    group.add_argument('--days', type=float)
+    group.add_argument('--off', action='store_true')
+    ttl.add_argument('--where', type=json_util.loads, help='only expire RSVPs matching this filter (JSON)')
+    commands.add_parser('list', help='show the archive records')
+    return parser.parse_args(argv[1:])
+
+def main(argv):
+    args = parse_args(argv)
+    try:
+        client.admin.command('ping')
+        if args.command == 'before':
+            collections = [c.strip() for c in args.collections.split(',') if c.strip()]
+            print(f"Archiving RSVPs created before {args.date.isoformat()} from {', '.join(collections)}...")
+            for record in archive_before(db, args.date, args.out, args.format, collections, delete=not args.keep):
+                print_record(record)
+            if stats.stats_enabled() and not args.keep:
+                stats.rebuild(db)
+                print("RSVP summary rebuilt.")
+        elif args.command == 'event':
+            print(f"Archiving event '{args.event_id}'...")
+            for record in archive_event(db, args.event_id, args.out, args.format):
+                print_record(record)
+            print(f"Event '{args.event_id}' is archived; its routes now answer 410.")
+        elif args.command == 'ttl':
+            if args.off:
+                set_ttl(db, args.collection, None)
+                print(f"RSVPs in '{args.collection}' no longer expire.")
+            else:
+                set_ttl(db, args.collection, args.days * 86400, args.where)
+                scope = f" matching {json_util.dumps(args.where)}" if args.where else ''
+                print(f"RSVPs in '{args.collection}'{scope} now expire {args.days:g} days after created_at.")
+        else:
+            for record in db[ARCHIVES_COLLECTION].find().sort('archived_at', 1):
+                print(f"{record['archived_at'].isoformat()} ", end='')
+                print_record(record)
+        return 0
+    except Exception as e:
+        print(f"Archiving failed: {e}")
+        return 1
+
+if __name__ == '__main__':
+    exit(main(sys.argv))
@@ -0,0 +1,307 @@
+"""
+Async entry point for the RSVP API.
+Serves the core routes of app.py with the same validation and JSON
+contract, but with async views on Quart and the Motor driver, so a single
+worker can keep many requests waiting on MongoDB at once instead of one per
+thread. Only submitting and listing RSVPs (/api/rsvp, /api/wedding-rsvp),
+/api/summary and the /health checks are served; bulk import and export,
+search, events and the change feed are app.py only.
+
+Run with an ASGI server, e.g.:
+    uvicorn asgi_app:app --host 0.0.0.0 --port 5000 --workers 4
+"""
+
+import asyncio
+import os
+
+from bson.objectid import ObjectId
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from quart import Quart, Response, request, jsonify
+from quart_cors import cors
+
+from database import client_options, mongodb_uri, pool_stats
+import json_provider
+from rsvp import (
+    AFTERPARTY_FIELDS, BY_TYPE_SORT, DEFAULT_PAGE_SIZE, INDEXES, MAX_PAGE_SIZE, PAGE_SORT,
+    PRIVATE_FIELDS_PROJECTION, RESPONSE_TYPES, WEDDING_RSVP_FIELDS, build_afterparty_rsvp, build_wedding_rsvp,
+    encode_cursor, format_rsvp, format_summary, page_query, page_range_query, parse_idempotency_key, parse_page_args,
+    parse_summary_hours, response_type_query, reused_idempotency_key, stored_document, summary_pipeline,
+    upsert_operation
+)
+import stats
+
+# Load environment variables
+load_dotenv()
+
+app = cors(Quart(__name__))
+json_provider.init_app(app)
+
+# MongoDB configuration (see database.py). The Motor client is bound to the
+# event loop, so it is created when the server starts serving.
+client = None
+db = None
+afterparty_collection = None
+wedding_rsvp_collection = None
+
+# Seconds GET /health/ready waits for MongoDB before reporting not ready
+READINESS_TIMEOUT = float(os.getenv('RSVP_READINESS_TIMEOUT', 2))
+
+# parse_page_args' page size settings, read after .env is loaded
+PAGE_SIZES = {
+    'page_size': int(os.getenv('RSVP_PAGE_SIZE', DEFAULT_PAGE_SIZE)),
+    'max_page_size': int(os.getenv('RSVP_MAX_PAGE_SIZE', MAX_PAGE_SIZE)),
+}
+
+
+@app.before_serving
+async def connect_to_mongo():
+    global client, db, afterparty_collection, wedding_rsvp_collection
+    client = AsyncIOMotorClient(mongodb_uri(), **client_options())
+    db = client.get_default_database()
+    afterparty_collection = db['afterparty']
+    wedding_rsvp_collection = db['wedding_rsvp']
+    # Don't hold up startup on the database; build indexes in the background
+    app.add_background_task(ensure_indexes)
+
+
+async def ensure_indexes():
+    """Create the indexes listed in rsvp.INDEXES (idempotent)."""
+    try:
+        for collection_name, keys, name, options in INDEXES:
+            await db[collection_name].create_index(keys, name=name, **options)
+    except Exception as e:
+        app.logger.error(f'Error creating indexes: {str(e)}')
+
+
+async def save_rsvp(collection, doc, all_fields, idempotency_key=None):
+    """Async counterpart of app.save_rsvp (without write-behind or the change feed)."""
+    doc['_id'] = ObjectId()
+    filter, update = upsert_operation(doc, all_fields, idempotency_key)
+    for attempt in range(2):
+        try:
+            before = await collection.find_one_and_update(
+                filter, update, projection=dict(PRIVATE_FIELDS_PROJECTION), upsert=True,
+                return_document=ReturnDocument.BEFORE)
+            break
+        except DuplicateKeyError as e:
+            if reused_idempotency_key(e.details):
+                return None, 422
+            if attempt:
+                raise
+    stored = stored_document(before, update)
+    if stats.stats_enabled():
+        increment = stats.summary_increment(collection.name, before, stored)
+        if increment is not None:
+            try:
+                # Only once rebuild_stats.py or the sync app created the summary
+                await db[stats.STATS_COLLECTION].update_one({'_id': stats.SUMMARY_ID}, increment)
+            except Exception as e:
+                app.logger.error(f'Error updating RSVP stats: {str(e)}')
+    return stored['_id'], 201 if before is None else 200
+
+
+@app.after_serving
+async def close_mongo():
+    if client is not None:
+        client.close()
+
+
+async def next_doc(cursor):
+    try:
+        return await cursor.next()
+    except StopAsyncIteration:
+        return None
+
+
+def serialize_rsvp(doc):
+    """Encode a single RSVP document as JSON text for the list endpoints."""
+    return app.json.dumps(format_rsvp(doc))
+
+
+async def stream_rsvp_page(cursor, limit, group_by_type=None):
+    """Async counterpart of app.stream_rsvp_page; produces the identical body."""
+    # Run the query before the response starts so connection errors still
+    # surface as a 500 from the view instead of a truncated body.
+    first_doc = await next_doc(cursor)
+
+    async def generate():
+        count = 0
+        newest = oldest = None
+        next_cursor = None
+        grouped = None
+        try:
+            yield '{"rsvps":['
+            doc = first_doc
+            while doc is not None:
+                if count == limit:
+                    next_cursor = encode_cursor(oldest)
+                    break
+                oldest = {'created_at': doc['created_at'], '_id': doc['_id']}
+                if newest is None:
+                    newest = oldest
+                yield (',' if count else '') + serialize_rsvp(doc)
+                count += 1
+                doc = await next_doc(cursor)
+            yield ']'
+            if group_by_type is not None:
+                yield ',"rsvps_by_type":{'
+                seen = []
+                if count:
+                    grouped = group_by_type(newest, oldest)
+                    async for doc in grouped:
+                        if not seen or doc['response_type'] != seen[-1]:
+                            yield ('],' if seen else '') + app.json.dumps(doc['response_type']) + ':['
+                            seen.append(doc['response_type'])
+                            separator = ''
+                        yield separator + serialize_rsvp(doc)
+                        separator = ','
+                    if seen:
+                        yield ']'
+                for response_type in RESPONSE_TYPES:
+                    if response_type not in seen:
+                        yield (',' if seen else '') + app.json.dumps(response_type) + ':[]'
+                        seen.append(response_type)
+                yield '}'
+            yield ',"count":' + str(count) + ',"next_cursor":' + app.json.dumps(next_cursor) + '}'
+        except Exception as e:
+            app.logger.error(f'Error streaming RSVPs: {str(e)}')
+            raise
+        finally:
+            await cursor.close()
+            if grouped is not None:
+                await grouped.close()
+
+    return Response(generate(), status=200, mimetype='application/json')
+
+@app.route('/api/rsvp', methods=['POST'])
+async def submit_rsvp():
+    try:
+        data = await request.get_json()
+        if not data:
+            return jsonify({'error': 'No data provided'}), 400
+        try:
+            idempotency_key = parse_idempotency_key(request.headers)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        new_rsvp, error = build_afterparty_rsvp(data)
+        if error:
+            return jsonify({'error': error}), 400
+        rsvp_id, status = await save_rsvp(afterparty_collection, new_rsvp, AFTERPARTY_FIELDS, idempotency_key)
+        if status == 422:
+            return jsonify({'error': 'Idempotency-Key was already used for a different RSVP'}), 422
+        message = 'RSVP updated' if status == 200 else 'RSVP received'
+        return jsonify({'message': message, 'rsvp_id': str(rsvp_id)}), status
+    except Exception as e:
+        app.logger.error(f'Error submitting RSVP: {str(e)}')
+        return jsonify({'error': 'Internal server error'}), 500
+
+@app.route('/api/rsvp', methods=['GET'])
+async def get_rsvps():
+    try:
+        try:
+            limit, keyset, projection = parse_page_args(request.args, AFTERPARTY_FIELDS, **PAGE_SIZES)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        cursor = afterparty_collection.find(page_query({}, keyset), projection).sort(PAGE_SORT).limit(limit + 1)
+        return await stream_rsvp_page(cursor, limit)
+    except Exception as e:
+        app.logger.error(f'Error retrieving RSVPs: {str(e)}')
+        return jsonify({'error': 'Internal server error'}), 500
+
+@app.route('/api/wedding-rsvp', methods=['POST'])
+async def submit_wedding_rsvp():
+    try:
+        data = await request.get_json()
+        if not data:
+            return jsonify({'error': 'No data provided'}), 400
+        try:
+            idempotency_key = parse_idempotency_key(request.headers)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        new_rsvp, error = build_wedding_rsvp(data)
+        if error:
+            return jsonify({'error': error}), 400
+        response_type = new_rsvp['response_type']
+        rsvp_id, status = await save_rsvp(wedding_rsvp_collection, new_rsvp, WEDDING_RSVP_FIELDS, idempotency_key)
+        if status == 422:
+            return jsonify({'error': 'Idempotency-Key was already used for a different RSVP'}), 422
+        outcome = 'updated' if status == 200 else 'received'
+        return jsonify({'message': f'Wedding RSVP ({response_type}) {outcome}', 'rsvp_id': str(rsvp_id)}), status
+    except Exception as e:
+        app.logger.error(f'Error submitting Wedding RSVP: {str(e)}')
+        return jsonify({'error': 'Internal server error'}), 500
+
+@app.route('/api/wedding-rsvp', methods=['GET'])
+async def get_wedding_rsvps():
+    try:
+        try:
+            query = response_type_query(request.args)
+            # response_type is needed to group the page by type
+            limit, keyset, projection = parse_page_args(
+                request.args, WEDDING_RSVP_FIELDS, always_fields={'response_type'}, **PAGE_SIZES)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        cursor = wedding_rsvp_collection.find(page_query(query, keyset), projection).sort(PAGE_SORT).limit(limit + 1)
+
+        def group_by_type(newest, oldest):
+            return wedding_rsvp_collection.find(
+                page_range_query(query, newest, oldest), projection).sort(BY_TYPE_SORT)
+
+        return await stream_rsvp_page(cursor, limit, group_by_type)
+    except Exception as e:
+        app.logger.error(f'Error retrieving Wedding RSVPs: {str(e)}')
+        return jsonify({'error': 'Internal server error'}), 500
+
+@app.route('/api/summary', methods=['GET'])
+async def get_rsvp_summary():
+    try:
+        try:
+            since = parse_summary_hours(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if stats.stats_enabled():
+            summary = await db[stats.STATS_COLLECTION].find_one({'_id': stats.SUMMARY_ID})
+            if summary is not None:
+                return jsonify(stats.format_stats_summary(summary, since)), 200
+        facets = await wedding_rsvp_collection.aggregate(summary_pipeline(since)).to_list(1)
+        afterparty_count = await afterparty_collection.estimated_document_count()
+        return jsonify(format_summary(facets[0] if facets else {}, afterparty_count)), 200
+    except Exception as e:
+        app.logger.error(f'Error computing RSVP summary: {str(e)}')
+        return jsonify({'error': 'Internal server error'}), 500
+
+@app.route('/health', methods=['GET'])
+async def health_check():
+    try:
+        # Test MongoDB connection
+        await client.admin.command('ping')
+        return jsonify({'status': 'healthy', 'database': 'connected'}), 200
+    except Exception as e:
+        return jsonify({'status': 'unhealthy', 'database': 'disconnected', 'error': str(e)}), 500
+
+@app.route('/health/live', methods=['GET'])
+async def liveness_check():
+    return jsonify({'status': 'alive'}), 200
+
+@app.route('/health/ready', methods=['GET'])
+async def readiness_check():
+    try:
+        await asyncio.wait_for(client.admin.command('ping'), READINESS_TIMEOUT)
+        return jsonify({'status': 'ready', 'database': 'connected'}), 200
+    except Exception as e:
+        return jsonify({'status': 'not ready', 'database': 'disconnected', 'error': str(e) or type(e).__name__}), 503
+
+@app.route('/health/pool', methods=['GET'])
+async def pool_health():
+    return jsonify(pool_stats.snapshot()), 200
+
+@app.errorhandler(404)
+async def not_found(error):
+    return jsonify({'error': 'Endpoint not found'}), 404
+
+@app.errorhandler(405)
+async def method_not_allowed(error):
+    return jsonify({'error': 'Method not allowed'}), 405
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Compare the synchronous (gunicorn + app.py) and async (uvicorn + asgi_app.py)
+serving modes under high concurrency against a local mongod.
+
+Usage:
+    MONGODB_URI=mongodb://localhost:27017/wedding_bench python benchmarks/bench_async_vs_sync.py
+
+Both servers get the same number of worker processes; the sync server
+additionally gets --threads per worker. Use a throwaway database: the
+benchmark inserts RSVPs.
+"""
+
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+from loadgen import run_load
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_until_healthy(base_url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f'{base_url}/health', timeout=2) as response:
+                if response.status == 200:
+                    return True
+        except OSError:
+            pass
+        time.sleep(0.2)
+    return False
+
+
+def server_command(mode, port, workers, threads):
+    if mode == 'sync':
+        return [sys.executable, '-m', 'gunicorn', 'app:app', '--bind', f'127.0.0.1:{port}',
+                '--workers', str(workers), '--threads', str(threads), '--worker-class', 'gthread']
+    return [sys.executable, '-m', 'uvicorn', 'asgi_app:app', '--host', '127.0.0.1', '--port', str(port),
+            '--workers', str(workers), '--log-level', 'warning']
+
+
+def mixed_workload(write_ratio):
+    every = max(1, round(1 / write_ratio)) if write_ratio else 0
+
+    def next_request(i):
+        if every and i % every == 0:
+            return 'POST', '/api/wedding-rsvp', {
+                'response_type': 'no', 'full_name': f'Bench Guest {i}', 'message': 'benchmark'
+            }
+        return 'GET', '/api/wedding-rsvp?limit=20', None
+    return next_request
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=4, help='threads per sync worker')
+    parser.add_argument('--write-ratio', type=float, default=0.1)
+    args = parser.parse_args()
+
+    if 'MONGODB_URI' not in os.environ:
+        print("MONGODB_URI must point at a local mongod, e.g. mongodb://localhost:27017/wedding_bench")
+        return 1
+
+    # Every benchmark request comes from one address, so rate limiting is off
+    env = dict(os.environ, RSVP_CACHE_BACKEND='none', RSVP_RATE_LIMIT_BACKEND='none')
+    results = {}
+    for mode in ('sync', 'async'):
+        port = free_port()
+        base_url = f'http://127.0.0.1:{port}'
+        server = subprocess.Popen(server_command(mode, port, args.workers, args.threads), cwd=ROOT, env=env)
+        try:
+            if not wait_until_healthy(base_url):
+                print(f"{mode} server did not become healthy")
+                return 1
+            # Warm up connection pools before measuring
+            run_load(base_url, args.workers * 4, args.workers * 40, mixed_workload(args.write_ratio))
+            results[mode] = run_load(base_url, args.concurrency, args.requests, mixed_workload(args.write_ratio))
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+    print(f"\n{args.concurrency} concurrent clients, {args.requests} requests, "
+          f"{args.workers} workers ({args.threads} threads each for sync)")
+    print(f"{'mode':<6} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for mode, stats in results.items():
+        print(f"{mode:<6} {stats['rps']:>8} {stats['p50_ms']:>8} {stats['p95_ms']:>8} "
+              f"{stats['p99_ms']:>8} {stats['errors']:>7}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
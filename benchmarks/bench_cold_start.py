@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Measure how long a fresh server process takes to become useful: the time
+from starting it until /health/live first answers, the latency of the first
+API request (which connects to MongoDB and creates indexes), and the
+process's own /health/startup report.
+
+Usage:
+    python benchmarks/bench_cold_start.py --runs 5
+    MONGODB_URI=mongodb://localhost:27017/wedding_bench python benchmarks/bench_cold_start.py --backend mongod
+
+The mongomock backend (default) needs no MongoDB server; the mongod backend
+starts gunicorn with the app factory against MONGODB_URI.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+from bench_async_vs_sync import ROOT, free_port
+
+
+def server_command(backend, port):
+    if backend == 'mongomock':
+        return [sys.executable, os.path.join(ROOT, 'benchmarks', 'mongomock_server.py'), '--port', str(port)]
+    return [sys.executable, '-m', 'gunicorn', 'app:create_app()', '--bind', f'127.0.0.1:{port}', '--workers', '1']
+
+
+def get(url, timeout=2):
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        return response.status, response.read()
+
+
+def wait_until_live(base_url, timeout=30):
+    """Seconds until /health/live first returned 200, or None on timeout."""
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        try:
+            if get(f'{base_url}/health/live')[0] == 200:
+                return time.perf_counter() - started
+        except OSError:
+            pass
+        time.sleep(0.01)
+    return None
+
+
+def cold_start(backend, env):
+    port = free_port()
+    base_url = f'http://127.0.0.1:{port}'
+    server = subprocess.Popen(server_command(backend, port), cwd=ROOT, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        live = wait_until_live(base_url)
+        if live is None:
+            raise RuntimeError('server did not come up')
+        started = time.perf_counter()
+        get(f'{base_url}/api/wedding-rsvp?limit=20', timeout=30)
+        first_request = time.perf_counter() - started
+        report = json.loads(get(f'{base_url}/health/startup')[1])
+        return live, first_request, report['timings_ms']
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backend', choices=['mongomock', 'mongod'], default='mongomock')
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    if args.backend == 'mongod' and 'MONGODB_URI' not in os.environ:
+        print("MONGODB_URI must point at a local mongod, e.g. mongodb://localhost:27017/wedding_bench")
+        return 1
+
+    env = dict(os.environ, RSVP_CACHE_BACKEND='none', RSVP_RATE_LIMIT_BACKEND='none')
+    results = [cold_start(args.backend, env) for _ in range(args.runs)]
+
+    print(f"Cold start ({args.backend}, median of {args.runs} runs)")
+    print("=" * 44)
+    print(f"{'until /health/live':<30} {statistics.median(r[0] for r in results) * 1000:>9.1f} ms")
+    print(f"{'first API request':<30} {statistics.median(r[1] for r in results) * 1000:>9.1f} ms")
+    print("In-process (GET /health/startup):")
+    for name in results[0][2]:
+        values = [r[2][name] for r in results if name in r[2]]
+        print(f"  {name:<28} {statistics.median(values):>9.1f} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for the request handlers, in process. Each request goes
+through Flask's test client into app.py on the in-memory storage backend
+(RSVP_STORAGE=memory, see storage.py), preloaded with --rows wedding RSVPs,
+so the numbers are the app's own cost per request: routing, hooks,
+validation, the storage calls and serialization, without a network or
+MongoDB round trip. The response cache is off so every list is rebuilt.
+
+Usage:
+    python benchmarks/bench_handlers.py --rows 10000 --number 200
+"""
+
+import argparse
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta
+from itertools import count
+
+from bson.objectid import ObjectId
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import app as wedding_app  # noqa: E402
+from rsvp import WEDDING_RSVP_FIELDS, build_wedding_rsvp, upsert_operation  # noqa: E402
+
+RESPONSE_TYPES = ['yes', 'no', 'maybe']
+START = datetime(2024, 1, 15, 10, 30)
+
+
+def guest(i):
+    return {
+        'response_type': RESPONSE_TYPES[i % 3],
+        'full_name': f'Guest Number {i}',
+        'telegram_username': f'@guest{i}',
+        'phone_number': f'+65{i:08d}',
+        'dietary_restrictions': 'Vegetarian, no nuts' if i % 5 == 0 else None,
+    }
+
+
+def preload(rows):
+    operations = []
+    for i in range(rows):
+        doc, _ = build_wedding_rsvp({k: v for k, v in guest(i).items() if v is not None})
+        doc['created_at'] = START - timedelta(seconds=i)
+        doc['_id'] = ObjectId()
+        operations.append(upsert_operation(doc, WEDDING_RSVP_FIELDS))
+    wedding_app.storage.rsvps('wedding_rsvp').bulk_upsert(operations)
+
+
+def build_client(rows, use_stats):
+    os.environ['RSVP_STORAGE'] = 'memory'
+    os.environ['RSVP_CACHE_BACKEND'] = 'none'
+    os.environ['RSVP_RATE_LIMIT_BACKEND'] = 'none'
+    os.environ['RSVP_STATS'] = 'true' if use_stats else 'false'
+    client = wedding_app.create_app().test_client()
+    preload(rows)
+    return client
+
+
+def get(client, url):
+    response = client.get(url)
+    # Streamed bodies are generated as they are read
+    response.get_data()
+    response.close()
+    assert response.status_code == 200, (url, response.status_code)
+
+
+def cases(client, rows):
+    """(name, function) for each request measured."""
+    new_guests = count(rows)
+    page = client.get('/api/wedding-rsvp?limit=100').get_json()
+    return [
+        ('POST new guest', lambda: client.post('/api/wedding-rsvp', json={
+            k: v for k, v in guest(next(new_guests)).items() if v is not None})),
+        ('POST resubmission', lambda: client.post('/api/wedding-rsvp', json={
+            'response_type': 'no', 'full_name': 'Guest Number 1', 'phone_number': '+6500000001'})),
+        ('GET page (100)', lambda: get(client, '/api/wedding-rsvp?limit=100')),
+        ('GET next page', lambda: get(client, f"/api/wedding-rsvp?limit=100&after={page['next_cursor']}")),
+        ('GET type=maybe', lambda: get(client, '/api/wedding-rsvp?limit=100&response_type=maybe')),
+        ('GET search', lambda: get(client, '/api/search?q=guest+number+12')),
+        ('GET summary', lambda: get(client, '/api/summary')),
+    ]
+
+
+def per_call_ms(func, number):
+    return min(timeit.repeat(func, number=number, repeat=3)) / number * 1000
+
+
+def run(rows, number):
+    """Measure every case with and without RSVP_STATS. Returns {(name, use_stats): ms per request}."""
+    results = {}
+    for use_stats in (False, True):
+        client = build_client(rows, use_stats)
+        for name, func in cases(client, rows):
+            results[name, use_stats] = per_call_ms(func, number)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10000, help='wedding RSVPs preloaded')
+    parser.add_argument('--number', type=int, default=200, help='requests per measurement')
+    args = parser.parse_args()
+
+    results = run(args.rows, args.number)
+    print(f"Request handlers on the in-memory backend, {args.rows} RSVPs - milliseconds per request")
+    print("=" * 60)
+    print(f"{'request':<20} {'aggregate':>12} {'RSVP_STATS':>12}")
+    for name in dict.fromkeys(name for name, _ in results):
+        print(f"{name:<20} {results[name, False]:>12.3f} {results[name, True]:>12.3f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
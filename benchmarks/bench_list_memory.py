@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Memory benchmark for the wedding RSVP list serializer.
+Compares peak Python heap usage of the old list-and-copy approach against the
+streaming serializer in app.py, over synthetic cursors of increasing size.
+No database is needed.
+"""
+
+import os
+import sys
+import tracemalloc
+from datetime import datetime, timedelta
+
+from bson.objectid import ObjectId
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+os.environ.setdefault('MONGODB_URI', 'mongodb://localhost:27017/wedding')
+
+import app as wedding_app  # noqa: E402  (MongoClient connects lazily)
+
+SIZES = [1000, 10000, 50000]
+RESPONSE_TYPES = ['yes', 'no', 'maybe']
+START = datetime(2024, 1, 15, 10, 30)
+
+
+class FakeCursor:
+    """Lazily generates RSVP documents like a PyMongo cursor would."""
+
+    def __init__(self, size, sort_by_type=False):
+        self.size = size
+        self.sort_by_type = sort_by_type
+        self._docs = self._generate()
+
+    def _generate(self):
+        types = sorted(RESPONSE_TYPES) if self.sort_by_type else [None]
+        for response_type in types:
+            for i in range(self.size):
+                doc_type = RESPONSE_TYPES[i % 3]
+                if response_type is not None and doc_type != response_type:
+                    continue
+                yield {
+                    '_id': ObjectId(),
+                    'response_type': doc_type,
+                    'full_name': f'Guest Number {i}',
+                    'telegram_username': f'@guest{i}',
+                    'phone_number': f'+65{i:08d}',
+                    'dietary_restrictions': 'Vegetarian, no nuts' if i % 5 == 0 else None,
+                    'created_at': START - timedelta(seconds=i)
+                }
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._docs)
+
+    def close(self):
+        pass
+
+
+def legacy_serialize(size):
+    """The pre-streaming implementation: materialise, copy per type, jsonify."""
+    rsvps = list(FakeCursor(size))
+    rsvps_by_type = {'yes': [], 'no': [], 'maybe': []}
+    for rsvp in rsvps:
+        rsvp['id'] = str(rsvp['_id'])
+        rsvp['created_at'] = rsvp['created_at'].isoformat() if 'created_at' in rsvp else None
+        rsvps_by_type[rsvp['response_type']].append(rsvp.copy())
+        del rsvp['_id']
+    # The copies still carried the ObjectId, which jsonify could not encode
+    for group in rsvps_by_type.values():
+        for rsvp in group:
+            rsvp['_id'] = str(rsvp['_id'])
+    return wedding_app.app.json.dumps({
+        'rsvps': rsvps,
+        'rsvps_by_type': rsvps_by_type,
+        'count': len(rsvps)
+    })
+
+
+def streaming_serialize(size):
+    """Drain the streaming response chunk by chunk, as the WSGI server would."""
+    response = wedding_app.stream_rsvp_page(
+        FakeCursor(size), size, lambda newest, oldest: FakeCursor(size, sort_by_type=True))
+    written = 0
+    for chunk in response.response:
+        written += len(chunk)
+    return written
+
+
+def measure(func, size):
+    tracemalloc.start()
+    func(size)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    print("Wedding RSVP list serializer - peak memory")
+    print("=" * 52)
+    print(f"{'rows':>8} {'legacy (KiB)':>16} {'streaming (KiB)':>18}")
+    for size in SIZES:
+        # Both serializers use the app's JSON provider
+        with wedding_app.app.app_context():
+            legacy = measure(legacy_serialize, size)
+            streaming = measure(streaming_serialize, size)
+        print(f"{size:>8} {legacy / 1024:>16.0f} {streaming / 1024:>18.0f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Load benchmark for the RSVP API with JSON baselines.
+Starts the app, seeds it with RSVPs, then drives a mixed read/write workload
+over /api/rsvp, /api/wedding-rsvp (all and per response_type), /api/search
+and /health at one or more concurrency levels, reporting requests per second
+and p50/p95/p99 latency overall and per endpoint.
+
+Usage:
+    # No database needed: app.py on an in-memory mongomock database
+    python benchmarks/bench_load.py --save benchmarks/baselines/mongomock.json
+
+    # gunicorn (or uvicorn with --server async) against a local mongod
+    MONGODB_URI=mongodb://localhost:27017/wedding_bench \\
+        python benchmarks/bench_load.py --backend mongod --concurrency 10,50,200
+
+    # Fail (exit 1) if p95 or throughput regressed against a saved baseline
+    python benchmarks/bench_load.py --compare benchmarks/baselines/mongomock.json
+
+mongomock measures the application's own overhead (routing, validation,
+serialization) rather than MongoDB; compare baselines only with the same
+backend, server and machine. Use a throwaway database with mongod: the
+benchmark inserts RSVPs.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import urllib.request
+from datetime import datetime
+
+from bench_async_vs_sync import ROOT, free_port, server_command, wait_until_healthy
+from loadgen import run_load
+
+READS = [
+    ('GET', '/api/rsvp?limit=20', None, 'GET /api/rsvp'),
+    ('GET', '/api/wedding-rsvp?limit=20', None, 'GET /api/wedding-rsvp'),
+    ('GET', '/api/wedding-rsvp?limit=20&response_type=yes', None, 'GET /api/wedding-rsvp?response_type=yes'),
+    ('GET', '/api/wedding-rsvp?limit=20&response_type=no', None, 'GET /api/wedding-rsvp?response_type=no'),
+    ('GET', '/api/wedding-rsvp?limit=20&response_type=maybe', None, 'GET /api/wedding-rsvp?response_type=maybe'),
+    # Matches every seeded guest, so each search ranks the most candidates
+    ('GET', '/api/search?q=bench%20gu', None, 'GET /api/search'),
+    ('GET', '/health', None, 'GET /health'),
+]
+
+
+def afterparty_rsvp(guest):
+    return {'name': f'Bench Guest {guest}', 'telegram': f'@bench{guest}', 'phone_number': f'+{guest}'}
+
+
+def wedding_rsvp(guest, response_type):
+    rsvp = {'response_type': response_type, 'full_name': f'Bench Guest {guest}'}
+    if response_type == 'yes':
+        rsvp.update(telegram_username=f'@bench{guest}', phone_number=f'+{guest}', dietary_restrictions='none')
+    elif response_type == 'no':
+        rsvp['message'] = 'benchmark'
+    else:
+        rsvp['note'] = 'benchmark'
+    return rsvp
+
+
+def mixed_workload(write_ratio, prefix):
+    """Deterministic interleaving of READS with one write every 1/write_ratio requests.
+
+    Guests are numbered '<prefix><i>', with a numeric prefix per run and phase,
+    so every write is a new guest rather than a resubmission.
+    """
+    every = max(1, round(1 / write_ratio)) if write_ratio else 0
+
+    def next_request(i):
+        if every and i % every == 0:
+            n = i // every
+            kind = n % 4
+            if kind == 0:
+                return 'POST', '/api/rsvp', afterparty_rsvp(f'{prefix}{i:07d}'), 'POST /api/rsvp'
+            response_type = ('yes', 'no', 'maybe')[kind - 1]
+            return ('POST', '/api/wedding-rsvp', wedding_rsvp(f'{prefix}{i:07d}', response_type),
+                    f'POST /api/wedding-rsvp ({response_type})')
+        return READS[i % len(READS)]
+    return next_request
+
+
+def seed(base_url, count, prefix):
+    """Bulk import count RSVPs into each collection so list pages are full."""
+    uploads = [
+        ('/api/rsvp/bulk', [afterparty_rsvp(f'{prefix}{i:07d}') for i in range(count)]),
+        ('/api/wedding-rsvp/bulk',
+         [wedding_rsvp(f'{prefix}{i:07d}', ('yes', 'no', 'maybe')[i % 3]) for i in range(count)]),
+    ]
+    for path, rows in uploads:
+        body = '\n'.join(json.dumps(row) for row in rows).encode()
+        request = urllib.request.Request(f'{base_url}{path}', data=body, method='POST',
+                                         headers={'Content-Type': 'application/x-ndjson'})
+        with urllib.request.urlopen(request, timeout=120) as response:
+            response.read()
+
+
+def git_revision():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT,
+                                    capture_output=True, text=True, check=True).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def compare(baseline, results, tolerance):
+    """Print current vs baseline and return the list of regressions.
+
+    A regression is a p95 latency more than tolerance percent higher, or a
+    throughput more than tolerance percent lower, for the run as a whole or
+    any endpoint.
+    """
+    regressions = []
+    print(f"\nCompared with baseline from commit {baseline['meta'].get('commit')} "
+          f"(tolerance {tolerance}%)")
+    print(f"{'concurrency / endpoint':<52} {'rps':>16} {'p95 ms':>18}")
+    for level, stats in results.items():
+        base_stats = baseline['results'].get(level)
+        if base_stats is None:
+            print(f'{level:<52} (not in baseline)')
+            continue
+        rows = [(f'c={level} all', stats, base_stats)]
+        rows += [(f'c={level} {label}', endpoint, base_stats['endpoints'][label])
+                 for label, endpoint in stats['endpoints'].items() if label in base_stats.get('endpoints', {})]
+        for name, current, base in rows:
+            rps_change = (current['rps'] - base['rps']) / base['rps'] * 100 if base['rps'] else 0.0
+            p95_change = (current['p95_ms'] - base['p95_ms']) / base['p95_ms'] * 100 if base['p95_ms'] else 0.0
+            flag = ''
+            if rps_change < -tolerance or p95_change > tolerance:
+                regressions.append(name)
+                flag = '  REGRESSION'
+            print(f"{name:<52} {current['rps']:>8} ({rps_change:+5.1f}%) "
+                  f"{current['p95_ms']:>8} ({p95_change:+5.1f}%){flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backend', choices=['mongomock', 'mongod'], default='mongomock')
+    parser.add_argument('--server', choices=['sync', 'async'], default='sync',
+                        help='mongod backend only; mongomock always runs the threaded dev server')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=8, help='threads per sync worker')
+    parser.add_argument('--concurrency', default='1,10,50', help='comma-separated client counts to sweep')
+    parser.add_argument('--requests', type=int, default=2000, help='requests per concurrency level')
+    parser.add_argument('--write-ratio', type=float, default=0.1)
+    parser.add_argument('--seed', type=int, default=500, help='RSVPs imported per collection before measuring')
+    parser.add_argument('--save', help='write the results to this JSON baseline file')
+    parser.add_argument('--compare', help='compare with this JSON baseline and exit 1 on regressions')
+    parser.add_argument('--tolerance', type=float, default=20.0, help='allowed regression in percent')
+    args = parser.parse_args()
+
+    if args.backend == 'mongod' and 'MONGODB_URI' not in os.environ:
+        print("MONGODB_URI must point at a local mongod, e.g. mongodb://localhost:27017/wedding_bench")
+        return 1
+    levels = [int(level) for level in args.concurrency.split(',')]
+
+    port = free_port()
+    base_url = f'http://127.0.0.1:{port}'
+    if args.backend == 'mongomock':
+        command = [sys.executable, os.path.join(ROOT, 'benchmarks', 'mongomock_server.py'), '--port', str(port)]
+    else:
+        command = server_command(args.server, port, args.workers, args.threads)
+    run_id = random.randint(100, 999)
+    results = {}
+    # Every benchmark request comes from one address, so rate limiting is off
+    env = dict(os.environ)
+    env.setdefault('RSVP_RATE_LIMIT_BACKEND', 'none')
+    server = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL)
+    try:
+        if not wait_until_healthy(base_url):
+            print("Server did not become healthy")
+            return 1
+        seed(base_url, args.seed, f'{run_id}0')
+        # Warm up connection pools and caches before measuring
+        run_load(base_url, max(levels), max(levels) * 10, mixed_workload(args.write_ratio, f'{run_id}1'))
+        for phase, level in enumerate(levels, 2):
+            workload = mixed_workload(args.write_ratio, f'{run_id}{phase}')
+            results[str(level)] = run_load(base_url, level, args.requests, workload)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    print(f"\n{args.backend} backend, {args.requests} requests per level, write ratio {args.write_ratio}")
+    print(f"{'concurrency':>11} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for level, stats in results.items():
+        print(f"{level:>11} {stats['rps']:>8} {stats['p50_ms']:>8} {stats['p95_ms']:>8} "
+              f"{stats['p99_ms']:>8} {stats['errors']:>7}")
+
+    commit, dirty = git_revision()
+    report = {
+        'meta': {
+            'commit': commit,
+            'dirty': dirty,
+            'created_at': datetime.utcnow().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'config': {
+            'backend': args.backend,
+            'server': 'dev' if args.backend == 'mongomock' else args.server,
+            'workers': args.workers,
+            'threads': args.threads,
+            'requests': args.requests,
+            'write_ratio': args.write_ratio,
+            'seed': args.seed,
+        },
+        'results': results,
+    }
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f"\nSaved baseline to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline['config'] != report['config']:
+            print(f"Warning: baseline was recorded with a different configuration: {baseline['config']}")
+        regressions = compare(baseline, results, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.tolerance}%")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
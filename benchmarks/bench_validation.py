@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for the request hot path: parse the JSON body, validate it
+and serialize the response. Compares the hand-written validators with the
+stdlib JSON provider (as before schemas.py and json_provider.py) against the
+compiled schemas with the orjson provider, per payload kind and for a
+20-row list page. No database is needed.
+
+Usage:
+    python benchmarks/bench_validation.py --number 20000
+"""
+
+import argparse
+import json
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+from bson.objectid import ObjectId
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from flask import Flask  # noqa: E402
+from flask.json.provider import DefaultJSONProvider  # noqa: E402
+
+from json_provider import OrjsonProvider, orjson  # noqa: E402
+from rsvp import (  # noqa: E402
+    afterparty_guest_key, build_afterparty_rsvp, build_wedding_rsvp, format_rsvp, wedding_guest_key
+)
+
+PAYLOADS = {
+    'afterparty': {'name': ' Guest Number 1 ', 'telegram': '@guest1', 'phone_number': '+65 0000 0001'},
+    'wedding yes': {'response_type': 'yes', 'full_name': 'Guest Number 1', 'telegram_username': '@guest1',
+                    'phone_number': '+65 0000 0001', 'dietary_restrictions': 'Vegetarian, no nuts'},
+    'wedding no': {'response_type': 'no', 'full_name': 'Guest Number 2', 'message': 'Sorry, we cannot make it'},
+    'wedding maybe': {'response_type': 'maybe', 'full_name': 'Guest Number 3', 'note': 'Depends on flights'},
+    'invalid': {'response_type': 'yes', 'full_name': 'Guest Number 4', 'telegram_username': '@guest4'},
+}
+START = datetime(2024, 1, 15, 10, 30)
+
+
+def legacy_build_afterparty_rsvp(data):
+    """The hand-written afterparty validator that schemas.py replaced."""
+    if not isinstance(data, dict) or not data:
+        return None, 'No data provided'
+    required_fields = ['name', 'telegram', 'phone_number']
+    missing_fields = [field for field in required_fields if field not in data or not data[field]]
+    if missing_fields:
+        return None, f'Missing required fields: {", ".join(missing_fields)}'
+    if not isinstance(data['name'], str) or len(data['name'].strip()) == 0:
+        return None, 'Name must be a non-empty string'
+    if not isinstance(data['telegram'], str) or len(data['telegram'].strip()) == 0:
+        return None, 'Telegram must be a non-empty string'
+    if not isinstance(data['phone_number'], str) or len(data['phone_number'].strip()) == 0:
+        return None, 'Phone number must be a non-empty string'
+    new_rsvp = {
+        'name': data['name'].strip(),
+        'telegram': data['telegram'].strip(),
+        'phone_number': data['phone_number'].strip(),
+        'created_at': datetime.utcnow()
+    }
+    new_rsvp['guest_key'] = afterparty_guest_key(new_rsvp)
+    return new_rsvp, None
+
+
+def legacy_build_wedding_rsvp(data):
+    """The hand-written wedding validator that schemas.py replaced."""
+    if not isinstance(data, dict) or not data:
+        return None, 'No data provided'
+    if 'response_type' not in data or data['response_type'] not in ['yes', 'no', 'maybe']:
+        return None, 'response_type must be one of: yes, no, maybe'
+    if 'full_name' not in data or not isinstance(data['full_name'], str) or len(data['full_name'].strip()) == 0:
+        return None, 'Full name must be a non-empty string'
+    response_type = data['response_type']
+    new_rsvp = {
+        'response_type': response_type,
+        'full_name': data['full_name'].strip(),
+        'created_at': datetime.utcnow()
+    }
+    if response_type == 'yes':
+        if 'telegram_username' not in data or not isinstance(data['telegram_username'], str) or len(data['telegram_username'].strip()) == 0:
+            return None, 'Telegram username is required for yes responses'
+        if 'phone_number' not in data or not isinstance(data['phone_number'], str) or len(data['phone_number'].strip()) == 0:
+            return None, 'Phone number is required for yes responses'
+        new_rsvp['telegram_username'] = data['telegram_username'].strip()
+        new_rsvp['phone_number'] = data['phone_number'].strip()
+        new_rsvp['dietary_restrictions'] = data.get('dietary_restrictions', '').strip() if data.get('dietary_restrictions') else None
+    elif response_type == 'no':
+        new_rsvp['message'] = data.get('message', '').strip() if data.get('message') else None
+    elif response_type == 'maybe':
+        new_rsvp['note'] = data.get('note', '').strip() if data.get('note') else None
+    new_rsvp['guest_key'] = wedding_guest_key(new_rsvp)
+    return new_rsvp, None
+
+
+def handle(provider, build, body):
+    """What a POST view does besides the database write."""
+    doc, error = build(provider.loads(body))
+    if error:
+        return provider.response({'error': error}).get_data()
+    return provider.response({'message': 'RSVP received', 'rsvp_id': str(ObjectId())}).get_data()
+
+
+def list_page(provider, rows):
+    return provider.dumps({'rsvps': [format_rsvp(dict(row)) for row in rows], 'count': len(rows),
+                           'next_cursor': None})
+
+
+def page_rows(size):
+    return [{
+        '_id': ObjectId(),
+        'response_type': 'yes',
+        'full_name': f'Guest Number {i}',
+        'telegram_username': f'@guest{i}',
+        'phone_number': f'+65{i:08d}',
+        'dietary_restrictions': 'Vegetarian, no nuts' if i % 5 == 0 else None,
+        'created_at': START - timedelta(seconds=i),
+        'updated_at': START - timedelta(seconds=i)
+    } for i in range(size)]
+
+
+def per_call_us(func, number):
+    return min(timeit.repeat(func, number=number, repeat=3)) / number * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--number', type=int, default=20000, help='calls per measurement')
+    args = parser.parse_args()
+    if orjson is None:
+        print("orjson is not installed (pip install -r requirements.txt)")
+        return 1
+
+    app = Flask(__name__)
+    legacy, compiled = DefaultJSONProvider(app), OrjsonProvider(app)
+    rows = page_rows(20)
+
+    print("Request hot path - parse + validate + serialize, microseconds per call")
+    print("=" * 72)
+    print(f"{'payload':<16} {'legacy + json':>16} {'schemas + orjson':>18} {'speedup':>9}")
+    with app.app_context():
+        for name, payload in PAYLOADS.items():
+            body = json.dumps(payload).encode()
+            if name == 'afterparty':
+                builds = legacy_build_afterparty_rsvp, build_afterparty_rsvp
+            else:
+                builds = legacy_build_wedding_rsvp, build_wedding_rsvp
+            before = per_call_us(lambda: handle(legacy, builds[0], body), args.number)
+            after = per_call_us(lambda: handle(compiled, builds[1], body), args.number)
+            print(f"{name:<16} {before:>16.2f} {after:>18.2f} {before / after:>8.1f}x")
+        number = max(1, args.number // 20)
+        before = per_call_us(lambda: list_page(legacy, rows), number)
+        after = per_call_us(lambda: list_page(compiled, rows), number)
+        print(f"{'list page (20)':<16} {before:>16.2f} {after:>18.2f} {before / after:>8.1f}x")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
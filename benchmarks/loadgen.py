@@ -0,0 +1,94 @@
+"""
+Minimal closed-loop HTTP load generator used by the benchmarks.
+Each of `concurrency` threads keeps one keep-alive connection open and sends
+requests back to back until `total` requests have been issued.
+"""
+
+import http.client
+import itertools
+import json
+import threading
+import time
+from urllib.parse import urlsplit
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(latencies, errors, elapsed):
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'seconds': round(elapsed, 3),
+        'rps': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def run_load(base_url, concurrency, total, next_request):
+    """Drive the server and return a stats dict.
+
+    next_request(i) returns (method, path, json body or None) for request i,
+    optionally followed by a label. Stats are also broken down per label
+    (default "METHOD path") under 'endpoints'.
+    """
+    parts = urlsplit(base_url)
+    counter = itertools.count()
+    samples = []
+    lock = threading.Lock()
+
+    def worker():
+        conn = http.client.HTTPConnection(parts.hostname, parts.port, timeout=30)
+        local_samples = []
+        while True:
+            i = next(counter)
+            if i >= total:
+                break
+            method, path, body, *label = next_request(i)
+            label = label[0] if label else f'{method} {path}'
+            failed = False
+            headers = {}
+            payload = None
+            if body is not None:
+                payload = json.dumps(body)
+                headers['Content-Type'] = 'application/json'
+            start = time.perf_counter()
+            try:
+                conn.request(method, path, body=payload, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                failed = response.status >= 500
+            except (OSError, http.client.HTTPException):
+                failed = True
+                conn.close()
+                conn = http.client.HTTPConnection(parts.hostname, parts.port, timeout=30)
+            local_samples.append((label, time.perf_counter() - start, failed))
+        conn.close()
+        with lock:
+            samples.extend(local_samples)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    by_label = {}
+    for label, latency, failed in samples:
+        latencies, errors = by_label.setdefault(label, ([], [0]))
+        latencies.append(latency)
+        errors[0] += failed
+    stats = summarize([latency for _, latency, _ in samples], sum(failed for _, _, failed in samples), elapsed)
+    stats['endpoints'] = {
+        label: summarize(latencies, errors[0], elapsed) for label, (latencies, errors) in sorted(by_label.items())
+    }
+    return stats
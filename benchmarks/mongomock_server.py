@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Serve app.py on an in-memory mongomock database, so the load benchmarks can
+run without a MongoDB server. Started by bench_load.py --backend mongomock;
+not for anything but benchmarking.
+
+Usage:
+    python benchmarks/mongomock_server.py --port 5001
+"""
+
+import argparse
+import logging
+import os
+import sys
+
+import mongomock
+import pymongo
+from werkzeug.serving import run_simple
+
+# Must happen before database.py imports MongoClient
+pymongo.MongoClient = mongomock.MongoClient
+os.environ.setdefault('MONGODB_URI', 'mongodb://localhost:27017/wedding_bench')
+# mongomock has no hello command or change streams
+os.environ.setdefault('RSVP_CHANGE_FEED', 'hub')
+# Every benchmark request comes from one address
+os.environ.setdefault('RSVP_RATE_LIMIT_BACKEND', 'none')
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app import app  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5001)
+    args = parser.parse_args()
+    # Per-request access logs would dominate the measurement
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    run_simple(args.host, args.port, app, threaded=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+Streaming NDJSON/CSV readers and writers for bulk RSVP import and export.
+Readers consume a binary stream line by line and writers yield one encoded
+row at a time, so neither side ever holds a whole upload or export in memory.
+"""
+
+import csv
+import io
+import json
+
+NDJSON_MIMETYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+CSV_MIMETYPES = ('text/csv', 'application/csv')
+
+AFTERPARTY_COLUMNS = ['id', 'name', 'telegram', 'phone_number', 'created_at']
+WEDDING_RSVP_COLUMNS = [
+    'id', 'response_type', 'full_name', 'telegram_username', 'phone_number',
+    'dietary_restrictions', 'message', 'note', 'created_at'
+]
+
+
+def upload_format(mimetype):
+    """Map a request mimetype to 'ndjson' or 'csv', or None if unsupported."""
+    if mimetype in NDJSON_MIMETYPES:
+        return 'ndjson'
+    if mimetype in CSV_MIMETYPES:
+        return 'csv'
+    return None
+
+
+def iter_ndjson_rows(stream):
+    """Yield (row number, payload or None, error or None) for each non-blank line."""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig')
+    for row_number, line in enumerate(text, 1):
+        if not line.strip():
+            continue
+        try:
+            yield row_number, json.loads(line), None
+        except ValueError:
+            yield row_number, None, 'Invalid JSON'
+
+
+def iter_csv_rows(stream):
+    """Yield (row number, payload, None) for each CSV record; the first line is the header."""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    reader = csv.DictReader(text)
+    for row_number, row in enumerate(reader, 1):
+        # Ignore columns beyond the header and drop empty cells
+        yield row_number, {k: v for k, v in row.items() if k is not None and v != ''}, None
+
+
+def iter_upload_rows(stream, fmt):
+    if fmt == 'ndjson':
+        return iter_ndjson_rows(stream)
+    return iter_csv_rows(stream)
+
+
+def export_rows(docs, fmt, columns, serialize):
+    """Yield an export body for docs, one line per document.
+
+    serialize turns a raw Mongo document into a JSON-ready dict
+    (id instead of _id, ISO timestamps).
+    """
+    if fmt == 'ndjson':
+        for doc in docs:
+            yield json.dumps(serialize(doc)) + '\n'
+        return
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction='ignore')
+    writer.writeheader()
+    for doc in docs:
+        writer.writerow(serialize(doc))
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
@@ -0,0 +1,95 @@
+"""
+Response cache for the RSVP list endpoints.
+Entries are grouped into namespaces (one per collection). Each namespace has a
+generation token that is replaced on every write, so invalidation is a single
+operation and stale entries simply stop being addressed and age out.
+"""
+
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+
+class LRUCache:
+    """In-process LRU cache with a per-entry TTL. Safe to share between threads."""
+
+    def __init__(self, maxsize=256, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def generation(self, namespace):
+        with self._lock:
+            if namespace not in self._generations:
+                self._generations[namespace] = uuid.uuid4().hex
+            return self._generations[namespace]
+
+    def invalidate(self, namespace):
+        with self._lock:
+            self._generations[namespace] = uuid.uuid4().hex
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+
+class RedisCache:
+    """Cache shared between worker processes through a Redis-compatible server."""
+
+    def __init__(self, url, ttl=60, prefix='rsvp-cache'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('RSVP_CACHE_BACKEND=redis requires the redis package (pip install redis)')
+        self.ttl = ttl
+        self.prefix = prefix
+        self._redis = redis.Redis.from_url(url)
+
+    def generation(self, namespace):
+        key = f'{self.prefix}:gen:{namespace}'
+        value = self._redis.get(key)
+        if value is None:
+            self._redis.set(key, uuid.uuid4().hex, nx=True)
+            value = self._redis.get(key)
+        return value.decode()
+
+    def invalidate(self, namespace):
+        self._redis.set(f'{self.prefix}:gen:{namespace}', uuid.uuid4().hex)
+
+    def get(self, key):
+        return self._redis.get(f'{self.prefix}:{key}')
+
+    def set(self, key, value):
+        self._redis.set(f'{self.prefix}:{key}', value, ex=self.ttl)
+
+
+def create_cache():
+    """Build the cache configured by RSVP_CACHE_* environment variables, or None if disabled."""
+    backend = os.getenv('RSVP_CACHE_BACKEND', 'memory').lower()
+    ttl = int(os.getenv('RSVP_CACHE_TTL', 60))
+    if backend == 'none':
+        return None
+    if backend == 'memory':
+        return LRUCache(maxsize=int(os.getenv('RSVP_CACHE_SIZE', 256)), ttl=ttl)
+    if backend == 'redis':
+        return RedisCache(os.getenv('RSVP_CACHE_URL', 'redis://localhost:6379/0'), ttl=ttl)
+    raise ValueError(f'Unknown RSVP_CACHE_BACKEND: {backend}')
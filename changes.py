@@ -0,0 +1,208 @@
+"""
+Real-time change feed for the RSVP collections.
+When MongoDB supports change streams (any replica set, including a single-node
+one, or a sharded cluster) every feed connection watches the database
+directly. Otherwise the submit handlers publish to an in-process ChangeHub,
+which keeps the most recent events so a reconnecting client can catch up.
+Either way every event carries an id that can be sent back as Last-Event-ID.
+"""
+
+import collections
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+
+import pymongo
+from pymongo.errors import OperationFailure
+
+from rsvp import PRIVATE_FIELDS
+
+logger = logging.getLogger(__name__)
+
+WATCHED_COLLECTIONS = ('wedding_rsvp', 'afterparty')
+
+ChangeEvent = collections.namedtuple('ChangeEvent', ['id', 'collection', 'operation', 'document'])
+
+
+class ResumeError(Exception):
+    """The Last-Event-ID can no longer be resumed from; the client has to reload."""
+
+
+class Subscription:
+    def __init__(self, maxsize):
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.dropped = False
+
+
+class ChangeHub:
+    """In-process pub/sub for change events, used when change streams are unavailable.
+
+    Event ids are '<epoch>-<sequence>'; the epoch is random per process, so an
+    id from another worker or from before a restart is detected rather than
+    silently misread. Only submissions handled by this process are seen.
+    """
+
+    def __init__(self, buffer_size=1000, subscriber_queue=256):
+        self.epoch = uuid.uuid4().hex[:12]
+        self.subscriber_queue = subscriber_queue
+        self._sequence = 0
+        self._buffer = collections.deque(maxlen=buffer_size)
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def publish(self, collection, operation, document):
+        with self._lock:
+            self._sequence += 1
+            event = ChangeEvent(f'{self.epoch}-{self._sequence}', collection, operation, document)
+            self._buffer.append((self._sequence, event))
+            for subscription in list(self._subscribers):
+                try:
+                    subscription.queue.put_nowait(event)
+                except queue.Full:
+                    # A client that stopped reading is cut off; it reconnects
+                    # with its last id and catches up from the buffer.
+                    subscription.dropped = True
+                    self._subscribers.discard(subscription)
+
+    def subscribe(self, last_event_id=None):
+        """Register a subscription and return (subscription, missed events).
+
+        Raises ResumeError if last_event_id is not from this hub or has fallen
+        out of the buffer.
+        """
+        with self._lock:
+            backlog = []
+            if last_event_id:
+                epoch, _, sequence = last_event_id.partition('-')
+                if epoch != self.epoch or not sequence.isdigit() or int(sequence) > self._sequence:
+                    raise ResumeError(last_event_id)
+                sequence = int(sequence)
+                oldest = self._buffer[0][0] if self._buffer else self._sequence + 1
+                if sequence < oldest - 1:
+                    raise ResumeError(last_event_id)
+                backlog = [event for seq, event in self._buffer if seq > sequence]
+            subscription = Subscription(self.subscriber_queue)
+            self._subscribers.add(subscription)
+            return subscription, backlog
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def listen(self, last_event_id=None, heartbeat=15):
+        """Subscribe and return a generator of events, yielding None every heartbeat seconds of silence."""
+        subscription, backlog = self.subscribe(last_event_id)
+
+        def events():
+            try:
+                yield from backlog
+                while not subscription.dropped:
+                    try:
+                        yield subscription.queue.get(timeout=heartbeat)
+                    except queue.Empty:
+                        yield None
+            finally:
+                self.unsubscribe(subscription)
+        return events()
+
+
+def change_stream_pipeline():
+    return [
+        {'$match': {
+            'ns.coll': {'$in': list(WATCHED_COLLECTIONS)},
+            'operationType': {'$in': ['insert', 'update', 'replace']}
+        }},
+        {'$project': {f'fullDocument.{field}': 0 for field in PRIVATE_FIELDS}},
+    ]
+
+
+class ChangeFeed:
+    """Serves change events from MongoDB change streams, or from a ChangeHub.
+
+    mode is 'changestream', 'hub' or 'auto'; 'auto' asks the server, when a
+    client first listens, whether it is a replica set or mongos. The question
+    is given detect_timeout seconds; if it fails the hub is used and it is
+    asked again retry_interval seconds later.
+    """
+
+    def __init__(self, get_db, mode='auto', hub=None, heartbeat=15, detect_timeout=2.0, retry_interval=30.0):
+        self.get_db = get_db
+        self.mode = mode
+        self.hub = hub or ChangeHub()
+        self.heartbeat = heartbeat
+        self.detect_timeout = detect_timeout
+        self.retry_interval = retry_interval
+        self._supported = {'changestream': True, 'hub': False}.get(mode)
+        self._retry_at = 0.0
+
+    def uses_change_streams(self):
+        if self._supported is None:
+            if time.monotonic() < self._retry_at:
+                return False
+            try:
+                with pymongo.timeout(self.detect_timeout):
+                    hello = self.get_db().client.admin.command('hello')
+            except Exception as e:
+                self._retry_at = time.monotonic() + self.retry_interval
+                logger.error(f'Error detecting change stream support, '
+                             f'retrying in {self.retry_interval:g}s: {str(e)}')
+                return False
+            self._supported = 'setName' in hello or hello.get('msg') == 'isdbgrid'
+            logger.info(f"Change feed using {'change streams' if self._supported else 'in-process hub'}")
+        return self._supported
+
+    def publish(self, collection, operation, document):
+        """Called by the write paths; a no-op when change streams deliver the events.
+
+        Never asks the server, so a submission doesn't wait on a database that
+        may be down. Until support is known the event goes to the hub.
+        """
+        if not self._supported:
+            self.hub.publish(collection, operation, document)
+
+    def listen(self, last_event_id=None):
+        """Return a generator of ChangeEvents (None on idle heartbeats).
+
+        The change stream is opened before returning, so an unusable
+        last_event_id raises ResumeError here rather than mid-response.
+        """
+        if not self.uses_change_streams():
+            return self.hub.listen(last_event_id, self.heartbeat)
+        try:
+            stream = self.get_db().watch(
+                change_stream_pipeline(), full_document='updateLookup',
+                resume_after={'_data': last_event_id} if last_event_id else None,
+                max_await_time_ms=int(self.heartbeat * 1000))
+        except OperationFailure as e:
+            if last_event_id:
+                raise ResumeError(last_event_id) from e
+            raise
+
+        def events():
+            with stream:
+                while stream.alive:
+                    change = stream.try_next()
+                    if change is None:
+                        yield None
+                    elif change.get('fullDocument') is not None:
+                        # An update whose document has since been deleted has
+                        # no fullDocument; there is nothing to show for it.
+                        operation = 'insert' if change['operationType'] == 'insert' else 'update'
+                        yield ChangeEvent(change['_id']['_data'], change['ns']['coll'], operation,
+                                          change['fullDocument'])
+        return events()
+
+
+def create_feed(get_db, mode=None):
+    """Build the change feed configured by RSVP_CHANGE_FEED* environment variables.
+
+    mode, if given, overrides RSVP_CHANGE_FEED.
+    """
+    mode = (mode or os.getenv('RSVP_CHANGE_FEED', 'auto')).lower()
+    if mode not in ('auto', 'changestream', 'hub'):
+        raise ValueError(f'Unknown RSVP_CHANGE_FEED: {mode}')
+    hub = ChangeHub(buffer_size=int(os.getenv('RSVP_CHANGE_FEED_BUFFER', 1000)))
+    return ChangeFeed(get_db, mode=mode, hub=hub, heartbeat=float(os.getenv('RSVP_CHANGE_FEED_HEARTBEAT', 15)))
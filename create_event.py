@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Registration script for an event served under /api/events/<event_id>/...
+(see events.py). This script adds the event to the 'events' registry and
+creates the indexes of its RSVP collections.
+
+Usage:
+    python create_event.py smith-jones-2025 "Smith & Jones Wedding"
+"""
+
+import sys
+
+from dotenv import load_dotenv
+from pymongo.errors import DuplicateKeyError
+
+from database import get_client, get_db
+from events import EVENTS_COLLECTION, ensure_event_indexes, event_document
+
+# Load environment variables
+load_dotenv()
+
+client = get_client()
+db = get_db()
+
+def main(argv):
+    if len(argv) != 3:
+        print(f"Usage: {argv[0]} <event_id> <name>")
+        return 1
+    try:
+        event = event_document(argv[1], argv[2])
+    except ValueError as e:
+        print(e)
+        return 1
+    print(f"Registering event '{event['_id']}'...")
+    try:
+        client.admin.command('ping')
+        try:
+            db[EVENTS_COLLECTION].insert_one(event)
+        except DuplicateKeyError:
+            print(f"Event '{event['_id']}' is already registered; checking its indexes.")
+        ensure_event_indexes(db, event['_id'])
+        print(f"Event '{event['_id']}' is ready at /api/events/{event['_id']}/wedding-rsvp and /api/events/{event['_id']}/rsvp")
+        return 0
+    except Exception as e:
+        print(f"Registering the event failed: {e}")
+        return 1
+
+if __name__ == '__main__':
+    exit(main(sys.argv))
@@ -0,0 +1,179 @@
+"""
+MongoDB client lifecycle shared by app.py, asgi_app.py and the init scripts.
+The client is created on first use and rebuilt whenever the process id
+changes, so each gunicorn worker gets its own connection pool after fork.
+Pool sizing, wire compression and read preference come from environment
+variables, and pool activity is tracked through PyMongo's CMAP events.
+"""
+
+import os
+import threading
+
+import certifi
+from pymongo import MongoClient, monitoring
+
+from metrics import command_metrics
+from tracing import command_tracer
+
+class PoolStats(monitoring.ConnectionPoolListener):
+    """Counts connection pool activity from CMAP events for /health/pool and /metrics."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.pools = 0
+            self.pools_cleared = 0
+            self.connections_created = 0
+            self.connections_closed = 0
+            self.checked_out = 0
+            self.checkouts = 0
+            self.checkout_failures = 0
+            self.checkout_wait_total = 0.0
+            self.checkout_wait_max = 0.0
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'pools': self.pools,
+                'pools_cleared': self.pools_cleared,
+                'connections_open': self.connections_created - self.connections_closed,
+                'connections_created': self.connections_created,
+                'connections_closed': self.connections_closed,
+                'checked_out': self.checked_out,
+                'checkouts': self.checkouts,
+                'checkout_failures': self.checkout_failures,
+                'checkout_wait_ms': {
+                    'total': round(self.checkout_wait_total * 1000, 3),
+                    'max': round(self.checkout_wait_max * 1000, 3),
+                    'avg': round(self.checkout_wait_total * 1000 / self.checkouts, 3) if self.checkouts else 0.0
+                }
+            }
+
+    def pool_created(self, event):
+        with self._lock:
+            self.pools += 1
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pools_cleared += 1
+
+    def pool_closed(self, event):
+        with self._lock:
+            self.pools -= 1
+
+    def connection_created(self, event):
+        with self._lock:
+            self.connections_created += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.connections_closed += 1
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.checkout_failures += 1
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.checked_out += 1
+            self.checkouts += 1
+            self.checkout_wait_total += event.duration
+            self.checkout_wait_max = max(self.checkout_wait_max, event.duration)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out -= 1
+
+
+pool_stats = PoolStats()
+
+_lock = threading.Lock()
+_client = None
+_pid = None
+
+
+def mongodb_uri():
+    """MONGODB_URI. Raises RuntimeError if it is not set.
+
+    Nothing here reads .env; create_app(), asgi_app.py and the command-line
+    scripts load it.
+    """
+    uri = os.getenv('MONGODB_URI')
+    if not uri:
+        raise RuntimeError('MONGODB_URI is not set (see env.example)')
+    return uri
+
+
+def tls_options(uri):
+    """Client options for MongoDB URIs: the certifi CA bundle when TLS is in use.
+
+    Atlas (mongodb+srv://) and explicit tls=true URIs get the CA bundle; a plain
+    local mongod is left alone, since passing tlsCAFile would force TLS on.
+    """
+    lowered = uri.lower()
+    if lowered.startswith('mongodb+srv://') or 'tls=true' in lowered or 'ssl=true' in lowered:
+        return {'tlsCAFile': certifi.where()}
+    return {}
+
+
+def client_options():
+    """Keyword arguments for MongoClient/AsyncIOMotorClient built from MONGODB_* variables."""
+    options = {
+        'maxPoolSize': int(os.getenv('MONGODB_MAX_POOL_SIZE', 100)),
+        'minPoolSize': int(os.getenv('MONGODB_MIN_POOL_SIZE', 0)),
+        'compressors': os.getenv('MONGODB_COMPRESSORS', 'zstd,zlib'),
+        'readPreference': os.getenv('MONGODB_READ_PREFERENCE', 'primary'),
+        'event_listeners': [pool_stats, command_metrics, command_tracer]
+    }
+    wait_queue_timeout = os.getenv('MONGODB_WAIT_QUEUE_TIMEOUT_MS')
+    if wait_queue_timeout:
+        options['waitQueueTimeoutMS'] = int(wait_queue_timeout)
+    options.update(tls_options(mongodb_uri()))
+    return options
+
+
+def get_client():
+    """Return this process's MongoClient, creating it on first use or after a fork."""
+    global _client, _pid
+    pid = os.getpid()
+    if _client is not None and _pid == pid:
+        return _client
+    with _lock:
+        if _client is None or _pid != pid:
+            # A client inherited through fork must not be used or closed here;
+            # its sockets belong to the parent process.
+            pool_stats.reset()
+            _client = MongoClient(mongodb_uri(), **client_options())
+            _pid = pid
+    return _client
+
+
+def get_db():
+    """The database named in MONGODB_URI."""
+    return get_client().get_default_database()
+
+
+def get_collection(name):
+    return get_db()[name]
+
+
+def close():
+    """Close this process's client, e.g. from a gunicorn worker_exit hook."""
+    global _client, _pid
+    with _lock:
+        if _client is not None and _pid == os.getpid():
+            _client.close()
+        _client = None
+        _pid = None
@@ -0,0 +1,89 @@
+"""
+Guest keys for RSVPs stored before deduplication, or under an older rule.
+Submissions are upserted on guest_key (see rsvp.upsert_operation), but RSVPs
+saved before that have none, and wedding RSVPs saved while guest_key was the
+name alone have a key the current rule no longer produces. Either way a
+resubmission from that guest adds a second RSVP. This sets the current
+guest_key on every RSVP and merges each guest's RSVPs into one, as if they
+had all been submitted under the current rule. init_db.py and
+init_wedding_db.py run it.
+"""
+
+from pymongo import ASCENDING
+
+from rsvp import (
+    AFTERPARTY_FIELDS, WEDDING_RSVP_FIELDS, afterparty_guest_key, search_terms, upsert_operation, wedding_guest_key
+)
+
+GUEST_KEYS = {
+    'afterparty': (afterparty_guest_key, AFTERPARTY_FIELDS),
+    'wedding_rsvp': (wedding_guest_key, WEDDING_RSVP_FIELDS),
+}
+
+
+def answered_at(doc):
+    return doc.get('updated_at') or doc['created_at']
+
+
+def merge_update(survivor, latest, guest_key, created_at, all_fields):
+    """The update that gives survivor latest's answer, guest_key and created_at, keeping its _id."""
+    if survivor['_id'] == latest['_id']:
+        update = {'$set': {'guest_key': guest_key, 'search_terms': search_terms(survivor)}}
+    else:
+        doc = {k: v for k, v in latest.items() if k not in ('_id', 'updated_at', 'idempotency_key')}
+        doc['guest_key'] = guest_key
+        doc['search_terms'] = search_terms(latest)
+        _, update = upsert_operation(doc, all_fields)
+        del update['$setOnInsert']
+        update['$set']['updated_at'] = answered_at(latest)
+    if created_at < survivor['created_at']:
+        update['$set']['created_at'] = created_at
+    return update
+
+
+def prepare_guest_keys(db, collection_name):
+    """Set the current guest_key on every RSVP in collection_name, merging each guest's RSVPs.
+
+    Of a guest's RSVPs, the one already under the current key (else the
+    oldest) is kept with the earliest created_at and takes the latest
+    answer, the way a resubmission would have updated it; the others are
+    deleted. Returns (rekeyed, removed).
+    """
+    key_for, all_fields = GUEST_KEYS[collection_name.split('.', 1)[0]]
+    collection = db[collection_name]
+    # guest_key -> {'survivor', 'latest', 'created_at', 'duplicates'}
+    guests = {}
+    for doc in collection.find().sort([('created_at', ASCENDING), ('_id', ASCENDING)]):
+        try:
+            guest_key = key_for(doc)
+        except (KeyError, AttributeError, TypeError):
+            # Not an RSVP the API would have accepted; left alone
+            continue
+        guest = guests.get(guest_key)
+        if guest is None:
+            guests[guest_key] = {'survivor': doc, 'latest': doc, 'created_at': doc['created_at'], 'duplicates': []}
+            continue
+        if doc.get('guest_key') == guest_key:
+            # Already under the current key: resubmissions update this one
+            guest['duplicates'].append(guest['survivor']['_id'])
+            guest['survivor'] = doc
+        else:
+            guest['duplicates'].append(doc['_id'])
+        if answered_at(doc) >= answered_at(guest['latest']):
+            guest['latest'] = doc
+
+    changed = {key: guest for key, guest in guests.items()
+               if guest['duplicates'] or guest['survivor'].get('guest_key') != key}
+    removed = 0
+    duplicates = [_id for guest in changed.values() for _id in guest['duplicates']]
+    for start in range(0, len(duplicates), 1000):
+        removed += collection.delete_many({'_id': {'$in': duplicates[start:start + 1000]}}).deleted_count
+    # Old keys are cleared first, so a key moving from one RSVP to another
+    # never trips the unique index
+    stale = [guest['survivor']['_id'] for key, guest in changed.items() if guest['survivor'].get('guest_key') != key]
+    for start in range(0, len(stale), 1000):
+        collection.update_many({'_id': {'$in': stale[start:start + 1000]}}, {'$unset': {'guest_key': ''}})
+    for guest_key, guest in changed.items():
+        collection.update_one({'_id': guest['survivor']['_id']}, merge_update(
+            guest['survivor'], guest['latest'], guest_key, guest['created_at'], all_fields))
+    return len(changed), removed
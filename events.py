@@ -0,0 +1,103 @@
+"""
+Event registry for multi-event tenancy.
+Each registered event has a document in the events collection (_id is the
+event id) and its own RSVP collections, named '<collection>.<event_id>'
+(e.g. 'wedding_rsvp.smith-jones-2025'), so every query stays within one event
+without an event_id filter on each index. Lookups go through a small
+in-process cache, and an event's indexes are created the first time a worker
+uses it. Events are registered with create_event.py.
+"""
+
+import os
+import re
+import threading
+from datetime import datetime
+
+from cache import LRUCache
+from rsvp import INDEXES
+
+EVENTS_COLLECTION = 'events'
+
+# Lowercase letters, digits and dashes, as used in URLs and collection names
+EVENT_ID_PATTERN = re.compile(r'[a-z0-9][a-z0-9-]{0,63}')
+
+
+def valid_event_id(event_id):
+    return bool(EVENT_ID_PATTERN.fullmatch(event_id))
+
+
+def event_collection_name(event_id, collection_name):
+    """Name of an event's copy of 'wedding_rsvp' or 'afterparty'."""
+    return f'{collection_name}.{event_id}'
+
+
+def event_document(event_id, name):
+    """Registry document for a new event. Raises ValueError on a bad id or name."""
+    if not valid_event_id(event_id):
+        raise ValueError('event_id must be 1-64 lowercase letters, digits or dashes')
+    if not isinstance(name, str) or not name.strip():
+        raise ValueError('Event name must be a non-empty string')
+    return {'_id': event_id, 'name': name.strip(), 'created_at': datetime.utcnow()}
+
+
+def format_event(doc):
+    event = {
+        'event_id': doc['_id'],
+        'name': doc.get('name'),
+        'created_at': doc['created_at'].isoformat() if doc.get('created_at') else None
+    }
+    if doc.get('archived_at'):
+        event['archived_at'] = doc['archived_at'].isoformat()
+        event['summary'] = doc.get('summary')
+    return event
+
+
+def ensure_event_indexes(db, event_id):
+    """Create the rsvp.INDEXES of both RSVP collections for one event (idempotent)."""
+    for collection_name, keys, name, options in INDEXES:
+        db[event_collection_name(event_id, collection_name)].create_index(keys, name=name, **options)
+
+
+class EventRegistry:
+    """Cached event lookups, plus which events this worker has indexed.
+
+    get() serves registry documents from an LRU cache with a short TTL, so a
+    request for a known event costs no round trip; unknown ids are not cached,
+    so a newly registered event is found immediately.
+    """
+
+    def __init__(self, storage, maxsize=256, ttl=300):
+        self._storage = storage
+        self._cache = LRUCache(maxsize=maxsize, ttl=ttl)
+        self._indexed = set()
+        self._lock = threading.Lock()
+
+    def get(self, event_id):
+        """The event's registry document, or None if it is not registered."""
+        if not valid_event_id(event_id):
+            return None
+        doc = self._cache.get(event_id)
+        if doc is None:
+            doc = self._storage.find_event(event_id)
+            if doc is not None:
+                self._cache.set(event_id, doc)
+        return doc
+
+    def ensure_indexes(self, event_id):
+        """Create the event's indexes unless this worker already has."""
+        if event_id in self._indexed:
+            return
+        with self._lock:
+            if event_id in self._indexed:
+                return
+            self._storage.ensure_event_indexes(event_id)
+            self._indexed.add(event_id)
+
+
+def create_registry(storage):
+    """Build the EventRegistry over a storage (see storage.py), configured by RSVP_EVENT_CACHE_*."""
+    return EventRegistry(
+        storage,
+        maxsize=int(os.getenv('RSVP_EVENT_CACHE_SIZE', 256)),
+        ttl=float(os.getenv('RSVP_EVENT_CACHE_TTL', 300))
+    )
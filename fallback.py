@@ -0,0 +1,245 @@
+"""
+Local write-ahead log for RSVP submissions while MongoDB is unreachable.
+A submission whose upsert fails with a connection error or timeout is
+appended to a SQLite file and acknowledged with 202. A background thread
+pings MongoDB and, once it answers, replays the log oldest first in
+bulk_write batches, deleting entries only after they are written.
+
+Replay is idempotent: each entry only applies while the stored RSVP is older
+than it, so an entry replayed twice, or overtaken by a later submission from
+the same guest, is dropped instead of overwriting newer data. Every worker
+appends to the same file; a lock file makes sure only one of them replays.
+"""
+
+import fcntl
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from bson import json_util
+import pymongo
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, ConnectionFailure, ExecutionTimeout, WTimeoutError
+
+from rsvp import reused_idempotency_key
+
+DUPLICATE_KEY = 11000
+
+# Errors meaning MongoDB could not be reached in time, as opposed to a write it rejected
+UNREACHABLE_ERRORS = (ConnectionFailure, ExecutionTimeout, WTimeoutError)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pending (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    collection TEXT NOT NULL,
+    operation TEXT NOT NULL,
+    logged_at REAL NOT NULL
+)
+"""
+
+logger = logging.getLogger(__name__)
+
+
+def replay_operation(filter, update):
+    """The UpdateOne that applies a logged upsert unless the stored RSVP is as new or newer.
+
+    When the guard doesn't match, the upsert tries to insert a second RSVP
+    with the same guest_key, which the unique index rejects.
+    """
+    guarded = dict(filter)
+    guarded['$or'] = [
+        {'updated_at': {'$lt': update['$set']['updated_at']}},
+        {'updated_at': {'$exists': False}}
+    ]
+    return UpdateOne(guarded, update, upsert=True)
+
+
+def replay_in_order(db, entries):
+    """Apply logged (collection_name, filter, update) upserts in order. Returns how many are done with.
+
+    Entries that can never apply (already applied, overtaken by a newer
+    submission, or reusing an Idempotency-Key) count as done; the first one
+    MongoDB fails to take for any other reason stops the replay.
+    """
+    done = 0
+    while done < len(entries):
+        # Consecutive entries for the same collection go in one ordered bulk_write
+        collection_name = entries[done][0]
+        end = done
+        while end < len(entries) and entries[end][0] == collection_name:
+            end += 1
+        operations = [replay_operation(filter, update) for _, filter, update in entries[done:end]]
+        try:
+            db[collection_name].bulk_write(operations, ordered=True)
+            done = end
+        except BulkWriteError as e:
+            error = e.details['writeErrors'][0]
+            done += error['index']
+            if error.get('code') != DUPLICATE_KEY:
+                logger.error(f'Replaying logged {collection_name} upsert failed: {error.get("errmsg")}')
+                return done
+            # Already applied, overtaken by a newer submission, or a reused
+            # Idempotency-Key; none of them can ever succeed
+            if reused_idempotency_key(error):
+                logger.warning(f'Dropped logged {collection_name} upsert with a reused Idempotency-Key')
+            done += 1
+        except Exception as e:
+            logger.error(f'Replaying logged {collection_name} upserts failed: {str(e)}')
+            return done
+    return done
+
+
+class FallbackLog:
+    """Durable queue of upserts (see rsvp.upsert_operation) waiting for MongoDB.
+
+    Safe to share between threads. After this worker has logged a
+    submission, later ones go straight to the log until it has been
+    replayed, so guests aren't kept waiting on a database that is down and
+    a guest's submissions reach MongoDB in order.
+    """
+
+    def __init__(self, get_db, path='rsvp_fallback.sqlite3', batch_size=100, interval=1.0,
+                 write_timeout=2.0, on_replay=None):
+        self._get_db = get_db
+        self.path = path
+        self.batch_size = batch_size
+        self.interval = interval
+        self.write_timeout = write_timeout
+        self.on_replay = on_replay
+        self._lock = threading.Lock()
+        self._conn = None
+        self._thread = None
+        self._pid = None
+        self._checked_pid = None
+        self._degraded = threading.Event()
+
+    @property
+    def degraded(self):
+        """Whether this worker has logged submissions that may not have been replayed yet.
+
+        The first check in each process also picks up a log left over from
+        before a restart.
+        """
+        if self._checked_pid != os.getpid():
+            self._checked_pid = os.getpid()
+            if os.path.exists(self.path) and self.pending():
+                self._degraded.set()
+                self._ensure_started()
+        return self._degraded.is_set()
+
+    def append(self, collection_name, filter, update):
+        """Durably log an upsert for collection_name. Raises sqlite3.Error if the log can't be written."""
+        operation = json_util.dumps({'filter': filter, 'update': update})
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute('INSERT INTO pending (collection, operation, logged_at) VALUES (?, ?, ?)',
+                             (collection_name, operation, time.time()))
+        self._degraded.set()
+        self._ensure_started()
+
+    def pending(self):
+        """Number of logged upserts not yet replayed, across all workers."""
+        with self._lock:
+            return self._connection().execute('SELECT COUNT(*) FROM pending').fetchone()[0]
+
+    def replay(self):
+        """Replay the whole log into MongoDB. Returns the number of entries removed from it.
+
+        Stops at the first batch MongoDB can't take; the rest stays logged.
+        """
+        replayed = 0
+        touched = set()
+        try:
+            while True:
+                with self._lock:
+                    rows = self._connection().execute(
+                        'SELECT id, collection, operation FROM pending ORDER BY id LIMIT ?',
+                        (self.batch_size,)).fetchall()
+                if not rows:
+                    self._degraded.clear()
+                    break
+                done = self._write_batch(rows)
+                if done:
+                    with self._lock:
+                        conn = self._connection()
+                        with conn:
+                            conn.executemany('DELETE FROM pending WHERE id = ?', [(row[0],) for row in rows[:done]])
+                    replayed += done
+                    touched.update(row[1] for row in rows[:done])
+                if done < len(rows):
+                    break
+        finally:
+            if replayed:
+                logger.info(f'Replayed {replayed} logged RSVP submissions')
+            if self.on_replay is not None:
+                for collection_name in sorted(touched):
+                    self.on_replay(collection_name)
+        return replayed
+
+    def _write_batch(self, rows):
+        """Write rows to MongoDB in order. Returns how many of them are done with."""
+        entries = []
+        for _, collection_name, operation in rows:
+            logged = json_util.loads(operation)
+            entries.append((collection_name, logged['filter'], logged['update']))
+        return replay_in_order(self._get_db(), entries)
+
+    def _connection(self):
+        # Called with self._lock held. A connection is never used across a fork.
+        if self._conn is None or self._pid != os.getpid():
+            self._conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=FULL')
+            self._conn.execute(SCHEMA)
+            self._pid = os.getpid()
+            self._thread = None
+        return self._conn
+
+    def _ensure_started(self):
+        # Started on first use so the thread lives in the worker process
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='rsvp-fallback-replay', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        with open(self.path + '.lock', 'a') as lock_file:
+            while True:
+                try:
+                    if not self.pending():
+                        self._degraded.clear()
+                    elif self._hold_replay_lock(lock_file):
+                        with pymongo.timeout(self.write_timeout):
+                            self._get_db().client.admin.command('ping')
+                        self.replay()
+                except Exception as e:
+                    logger.warning(f'MongoDB still unreachable, RSVP submissions stay logged: {str(e)}')
+                time.sleep(self.interval)
+
+    @staticmethod
+    def _hold_replay_lock(lock_file):
+        # One worker replays; the others only watch for the log to empty, and
+        # take over if that worker exits
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            return False
+
+
+def create_fallback(get_db, on_replay=None):
+    """Build the FallbackLog configured by the RSVP_FALLBACK* environment variables, or None if disabled."""
+    if os.getenv('RSVP_FALLBACK', 'False').lower() != 'true':
+        return None
+    return FallbackLog(
+        get_db,
+        path=os.getenv('RSVP_FALLBACK_PATH', 'rsvp_fallback.sqlite3'),
+        batch_size=int(os.getenv('RSVP_FALLBACK_BATCH', 100)),
+        interval=float(os.getenv('RSVP_FALLBACK_INTERVAL', 1)),
+        write_timeout=float(os.getenv('RSVP_FALLBACK_TIMEOUT', 2)),
+        on_replay=on_replay
+    )
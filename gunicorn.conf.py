@@ -0,0 +1,22 @@
+"""
+Gunicorn settings.
+Each worker builds its own MongoDB client on first use (see database.py);
+these hooks make sure a client is never carried across fork or left open,
+and that a worker's write-behind queue is flushed before its client closes.
+"""
+
+import database
+
+
+def post_fork(server, worker):
+    # With --preload the master may have touched the database; drop that client
+    database.close()
+
+
+def worker_exit(server, worker):
+    # Flush queued write-behind upserts while the client is still open;
+    # closing it first would spill them all on every graceful restart
+    import app
+    if app.write_behind is not None:
+        app.write_behind.drain()
+    database.close()
@@ -1,19 +1,23 @@
 #!/usr/bin/env python3
 """
 Database initialization script for the Wedding RSVP application (MongoDB version).
-This script checks MongoDB connection and ensures the 'wedding_rsvp' collection exists.
+This script checks MongoDB connection, ensures the 'wedding_rsvp' collection exists
+and creates its indexes, filling in the guest search terms (see search.py) and
+the guest keys, merging duplicate RSVPs from before deduplication (see dedupe.py).
 """
 
-import os
 from dotenv import load_dotenv
-from pymongo import MongoClient
+
+from database import get_client, get_db
+from dedupe import prepare_guest_keys
+from search import prepare_search
+import stats
 
 # Load environment variables
 load_dotenv()
 
-MONGODB_URI = os.getenv('MONGODB_URI', 'mongodb+srv://<username>:<password>@<cluster-url>/wedding?retryWrites=true&w=majority')
-client = MongoClient(MONGODB_URI)
-db = client.get_default_database()
+client = get_client()
+db = get_db()
 
 def main():
     print("Checking MongoDB connection and 'wedding_rsvp' collection...")
@@ -23,6 +27,14 @@ def main():
         test_doc = {'test': True}
         result = db['wedding_rsvp'].insert_one(test_doc)
         db['wedding_rsvp'].delete_one({'_id': result.inserted_id})
+        # Before the unique guest_key index is created
+        rekeyed, removed = prepare_guest_keys(db, 'wedding_rsvp')
+        print(f"Guest keys set on {rekeyed} RSVPs; {removed} duplicate RSVPs merged into them.")
+        updated = prepare_search(db, 'wedding_rsvp')
+        print(f"Indexes created; search terms filled in for {updated} existing RSVPs.")
+        if removed and stats.stats_enabled():
+            stats.rebuild(db)
+            print("RSVP summary rebuilt.")
         print("MongoDB connection successful. 'wedding_rsvp' collection is ready.")
         return 0
     except Exception as e:
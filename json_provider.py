@@ -0,0 +1,69 @@
+"""
+orjson-backed JSON provider for the Flask (app.py) and Quart (asgi_app.py) apps.
+orjson encodes and decodes several times faster than the standard library,
+serializes datetime natively and ObjectId through default(); request bodies,
+jsonify() responses and the streamed list pages all use it once init_app()
+has installed it. Falls back to Flask's stdlib provider when
+orjson is not installed or RSVP_JSON=stdlib.
+"""
+
+import os
+
+from bson.objectid import ObjectId
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """DefaultJSONProvider with orjson doing the encoding and decoding.
+
+    Output matches the stdlib provider's contract (sorted keys, compact unless
+    debugging) except that non-ASCII text is written as UTF-8 rather than
+    escaped, and datetimes are RFC 3339 strings.
+    """
+
+    def default(self, o):
+        if isinstance(o, ObjectId):
+            return str(o)
+        return DefaultJSONProvider.default(o)
+
+    def _options(self, kwargs):
+        option = orjson.OPT_NON_STR_KEYS
+        if kwargs.get('sort_keys', self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get('indent'):
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=kwargs.get('default', self.default),
+                            option=self._options(kwargs)).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        body = orjson.dumps(obj, default=self.default,
+                            option=self._options({'indent': indent}) | orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def json_backend():
+    """'orjson' or 'stdlib', from RSVP_JSON (default orjson when it is installed)."""
+    backend = os.getenv('RSVP_JSON', 'orjson').lower()
+    if backend == 'orjson' and orjson is None:
+        return 'stdlib'
+    return backend
+
+
+def init_app(app):
+    """Install OrjsonProvider as app.json unless the stdlib backend was selected."""
+    if json_backend() == 'orjson':
+        app.json = OrjsonProvider(app)
+    return app
@@ -0,0 +1,196 @@
+"""
+Prometheus-style metrics for the RSVP API.
+A small in-process registry rendered in the Prometheus text exposition format:
+per-route request counts, status codes, latency histograms and in-flight
+gauges, plus MongoDB command durations from PyMongo's CommandListener.
+Values are per worker process.
+"""
+
+import threading
+import time
+
+from flask import g, request
+from pymongo import monitoring
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+MONGO_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def format_labels(labelnames, values):
+    if not labelnames:
+        return ''
+    pairs = []
+    for name, value in zip(labelnames, values):
+        escaped = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{escaped}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{format_labels(self.labelnames, labels)} {value}')
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, labels=(), amount=1):
+        self.inc(labels, -amount)
+
+    def set(self, labels=(), value=0):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, labels, value):
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                series = self._values[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for labels, (bucket_counts, total, count) in sorted(self._values.items()):
+                for bound, bucket_count in zip(self.buckets, bucket_counts):
+                    le = format_labels(self.labelnames + ('le',), labels + (repr(bound),))
+                    lines.append(f'{self.name}_bucket{le} {bucket_count}')
+                inf = format_labels(self.labelnames + ('le',), labels + ('+Inf',))
+                lines.append(f'{self.name}_bucket{inf} {count}')
+                lines.append(f'{self.name}_sum{format_labels(self.labelnames, labels)} {total}')
+                lines.append(f'{self.name}_count{format_labels(self.labelnames, labels)} {count}')
+        return lines
+
+
+http_requests_total = Counter(
+    'http_requests_total', 'HTTP requests by route, method and status code.', ('route', 'method', 'status'))
+http_request_duration_seconds = Histogram(
+    'http_request_duration_seconds', 'HTTP request latency, including streamed bodies.', ('route', 'method'))
+http_requests_in_flight = Gauge(
+    'http_requests_in_flight', 'HTTP requests currently being served.', ('route',))
+http_requests_rejected_total = Counter(
+    'http_requests_rejected_total', 'Requests turned away by rate limiting (429) or load shedding (503).',
+    ('route', 'reason'))
+mongodb_command_duration_seconds = Histogram(
+    'mongodb_command_duration_seconds', 'MongoDB command round-trip time.', ('command',), MONGO_BUCKETS)
+mongodb_command_failures_total = Counter(
+    'mongodb_command_failures_total', 'MongoDB commands that returned an error.', ('command',))
+
+REGISTRY = [
+    http_requests_total,
+    http_request_duration_seconds,
+    http_requests_in_flight,
+    http_requests_rejected_total,
+    mongodb_command_duration_seconds,
+    mongodb_command_failures_total,
+]
+
+
+class CommandMetrics(monitoring.CommandListener):
+    """Feeds MongoDB command durations into the registry."""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        mongodb_command_duration_seconds.observe((event.command_name,), event.duration_micros / 1e6)
+
+    def failed(self, event):
+        mongodb_command_duration_seconds.observe((event.command_name,), event.duration_micros / 1e6)
+        mongodb_command_failures_total.inc((event.command_name,))
+
+
+command_metrics = CommandMetrics()
+
+
+def render_pool_stats(snapshot):
+    """Render a database.PoolStats snapshot as gauges and counters."""
+    rows = [
+        ('mongodb_pool_connections_open', 'gauge', 'Open connections in the pool.', snapshot['connections_open']),
+        ('mongodb_pool_checked_out', 'gauge', 'Connections currently checked out.', snapshot['checked_out']),
+        ('mongodb_pool_checkouts_total', 'counter', 'Successful connection checkouts.', snapshot['checkouts']),
+        ('mongodb_pool_checkout_failures_total', 'counter', 'Failed connection checkouts.', snapshot['checkout_failures']),
+        ('mongodb_pool_checkout_wait_seconds_total', 'counter', 'Time spent waiting for a connection.',
+         snapshot['checkout_wait_ms']['total'] / 1000),
+    ]
+    lines = []
+    for name, kind, documentation, value in rows:
+        lines += [f'# HELP {name} {documentation}', f'# TYPE {name} {kind}', f'{name} {value}']
+    return lines
+
+
+def render(pool_snapshot=None):
+    lines = []
+    for metric in REGISTRY:
+        lines += metric.render()
+    if pool_snapshot is not None:
+        lines += render_pool_stats(pool_snapshot)
+    return '\n'.join(lines) + '\n'
+
+
+def instrument(app):
+    """Register request hooks on a Flask app that record the HTTP metrics."""
+
+    @app.before_request
+    def start_request_timer():
+        g.metrics_start = time.perf_counter()
+        g.metrics_route = request.endpoint or 'unmatched'
+        http_requests_in_flight.inc((g.metrics_route,))
+
+    @app.after_request
+    def record_request(response):
+        start = g.pop('metrics_start', None)
+        if start is None:
+            return response
+        route = g.pop('metrics_route')
+        method = request.method
+        status = str(response.status_code)
+
+        # Streamed bodies are still being sent here, so record once the
+        # server closes the response.
+        def finish():
+            http_request_duration_seconds.observe((route, method), time.perf_counter() - start)
+            http_requests_total.inc((route, method, status))
+            http_requests_in_flight.dec((route,))
+
+        response.call_on_close(finish)
+        return response
@@ -0,0 +1,237 @@
+"""
+Per-client rate limiting and admission control for the Flask app.
+Each limited route has a token bucket per client (IP address, or telegram
+handle with RSVP_RATE_LIMIT_KEY=telegram, plus a larger one per IP address)
+kept in process memory or in a Redis-compatible server shared by every
+worker. A client that runs out of
+tokens gets 429. Independently, RSVP_MAX_IN_FLIGHT caps the requests a worker
+serves at once; requests beyond it get 503 straight away instead of queueing
+for a MongoDB connection. Both responses carry Retry-After.
+"""
+
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from flask import g, jsonify, request
+
+import metrics
+from rsvp import normalize_telegram
+
+# Requests per period a client may make to each route (Flask endpoint name),
+# with bursts up to the same number. RSVP_RATE_LIMITS overrides or extends it.
+DEFAULT_LIMITS = {
+    'submit_rsvp': '30/minute',
+    'submit_wedding_rsvp': '30/minute',
+    'submit_event_rsvp': '30/minute',
+    'submit_event_wedding_rsvp': '30/minute',
+    'bulk_import_rsvps': '5/minute',
+    'bulk_import_wedding_rsvps': '5/minute',
+    'search_guests': '120/minute',
+    'search_event_guests': '120/minute',
+}
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600}
+
+# Never shed: probes, scraping, profiling, and the long-lived change feed
+UNCAPPED_ENDPOINTS = {
+    'health_check', 'pool_health', 'liveness_check', 'readiness_check', 'startup_report',
+    'prometheus_metrics', 'debug_profile', 'stream_changes'
+}
+
+# Seconds a 503 asks the client to wait
+BUSY_RETRY_AFTER = 1
+
+
+def parse_limit(spec):
+    """Parse 'N/period' (period second, minute or hour) into (tokens per second, burst).
+
+    'none' disables the limit and returns None. Raises ValueError on bad input.
+    """
+    spec = spec.strip().lower()
+    if spec == 'none':
+        return None
+    count, _, period = spec.partition('/')
+    if period not in PERIODS or not count.isdigit() or int(count) < 1:
+        raise ValueError(f'Rate limit must look like 30/minute or none, got: {spec}')
+    return int(count) / PERIODS[period], int(count)
+
+
+def parse_limits(value):
+    """Parse RSVP_RATE_LIMITS ('endpoint=N/period,...') over DEFAULT_LIMITS into {endpoint: (rate, burst)}."""
+    specs = dict(DEFAULT_LIMITS)
+    for item in (value or '').split(','):
+        if item.strip():
+            endpoint, _, spec = item.partition('=')
+            specs[endpoint.strip()] = spec
+    limits = {}
+    for endpoint, spec in specs.items():
+        limit = parse_limit(spec)
+        if limit is not None:
+            limits[endpoint] = limit
+    return limits
+
+
+class MemoryBuckets:
+    """Token buckets in process memory, one set per worker. Safe to share between threads.
+
+    At most maxsize buckets are kept; the least recently used is dropped,
+    which only ever refills that client's bucket early.
+    """
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, burst):
+        """Take a token from key's bucket. Returns (allowed, seconds until a token is available)."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        return allowed, 0.0 if allowed else (1 - tokens) / rate
+
+
+# Refill and take atomically on the server, using its clock so every worker
+# agrees. Returns {allowed, seconds to wait}; the float travels as a string.
+TAKE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or burst
+local updated = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local allowed = 0
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000))
+return {allowed, tostring(wait)}
+"""
+
+
+class RedisBuckets:
+    """Token buckets shared between worker processes through a Redis-compatible server."""
+
+    def __init__(self, url, prefix='rsvp-rate'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('RSVP_RATE_LIMIT_BACKEND=redis requires the redis package (pip install redis)')
+        self.prefix = prefix
+        self._redis = redis.Redis.from_url(url)
+        self._take = self._redis.register_script(TAKE_SCRIPT)
+
+    def take(self, key, rate, burst):
+        allowed, wait = self._take(keys=[f'{self.prefix}:{key}'], args=[rate, burst])
+        return bool(allowed), float(wait)
+
+
+def create_buckets():
+    """Build the token bucket store configured by RSVP_RATE_LIMIT_BACKEND, or None if disabled."""
+    backend = os.getenv('RSVP_RATE_LIMIT_BACKEND', 'memory').lower()
+    if backend == 'none':
+        return None
+    if backend == 'memory':
+        return MemoryBuckets()
+    if backend == 'redis':
+        return RedisBuckets(os.getenv('RSVP_RATE_LIMIT_URL', os.getenv('RSVP_CACHE_URL', 'redis://localhost:6379/0')))
+    raise ValueError(f'Unknown RSVP_RATE_LIMIT_BACKEND: {backend}')
+
+
+def client_ip(proxies):
+    """The client address, read from X-Forwarded-For when the app sits behind that many trusted proxies."""
+    if proxies:
+        forwarded = [part.strip() for part in request.headers.get('X-Forwarded-For', '').split(',') if part.strip()]
+        if len(forwarded) >= proxies:
+            return forwarded[-proxies]
+    return request.remote_addr or 'unknown'
+
+
+def client_key(key_by, proxies):
+    """Who a request counts against: its telegram handle if configured and present, else its IP.
+
+    Handles are free to make up, so protect() also counts a request keyed
+    by handle against its IP.
+    """
+    if key_by == 'telegram' and request.is_json:
+        data = request.get_json(silent=True)
+        if isinstance(data, dict):
+            handle = data.get('telegram_username') or data.get('telegram')
+            if isinstance(handle, str) and normalize_telegram(handle):
+                return f'telegram:{normalize_telegram(handle)}'
+    return f'ip:{client_ip(proxies)}'
+
+
+def rejected(status, error, retry_after, reason):
+    metrics.http_requests_rejected_total.inc((request.endpoint or 'unmatched', reason))
+    response = jsonify({'error': error})
+    response.status_code = status
+    response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
+def protect(app):
+    """Register request hooks on a Flask app that apply the RSVP_RATE_LIMIT_* and RSVP_MAX_IN_FLIGHT settings."""
+    buckets = create_buckets()
+    limits = parse_limits(os.getenv('RSVP_RATE_LIMITS'))
+    key_by = os.getenv('RSVP_RATE_LIMIT_KEY', 'ip').lower()
+    # With key_by=telegram, an address may make this many times a route's limit
+    ip_factor = int(os.getenv('RSVP_RATE_LIMIT_IP_FACTOR', 10))
+    proxies = int(os.getenv('RSVP_TRUSTED_PROXIES', 0))
+    max_in_flight = int(os.getenv('RSVP_MAX_IN_FLIGHT', 0))
+    slots = threading.BoundedSemaphore(max_in_flight) if max_in_flight > 0 else None
+
+    @app.before_request
+    def admit_request():
+        limit = limits.get(request.endpoint)
+        if buckets is not None and limit is not None:
+            try:
+                key = client_key(key_by, proxies)
+                allowed, retry_after = buckets.take(f'{request.endpoint}:{key}', *limit)
+                if allowed and not key.startswith('ip:'):
+                    # Rotating handles must not get a client past its address's bucket
+                    rate, burst = limit
+                    allowed, retry_after = buckets.take(
+                        f'{request.endpoint}:ip:{client_ip(proxies)}', rate * ip_factor, burst * ip_factor)
+            except Exception as e:
+                # Fail open: an unreachable store must not take the API down
+                app.logger.error(f'Error checking rate limit: {str(e)}')
+                allowed = True
+            if not allowed:
+                return rejected(429, 'Too many requests, please retry later', retry_after, 'rate_limit')
+        if slots is not None and request.endpoint not in UNCAPPED_ENDPOINTS:
+            if not slots.acquire(blocking=False):
+                return rejected(503, 'Server busy, please retry shortly', BUSY_RETRY_AFTER, 'in_flight')
+            g.ratelimit_slot = True
+
+    @app.after_request
+    def release_on_close(response):
+        # Streamed bodies are still being sent here, so the slot is freed
+        # once the server closes the response.
+        if g.pop('ratelimit_slot', False):
+            response.call_on_close(slots.release)
+        return response
+
+    @app.teardown_request
+    def release_on_error(exc):
+        # after_request does not run when the view raised
+        if g.pop('ratelimit_slot', False):
+            slots.release()
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+Rebuild script for the materialised RSVP summary (see stats.py).
+This script recounts 'wedding_rsvp' and 'afterparty' from scratch and replaces
+the summary document in 'rsvp_stats'. Run it once after setting RSVP_STATS=true,
+and whenever the summary may have drifted (e.g. after editing RSVPs by hand).
+"""
+
+from dotenv import load_dotenv
+
+from database import get_client, get_db
+from stats import rebuild
+
+# Load environment variables
+load_dotenv()
+
+client = get_client()
+db = get_db()
+
+def main():
+    print("Rebuilding the RSVP summary in 'rsvp_stats'...")
+    try:
+        client.admin.command('ping')
+        summary = rebuild(db)
+        print(f"Wedding RSVPs by type: {summary['wedding']}")
+        print(f"Yes with dietary restrictions: {summary['yes_with_dietary_restrictions']}")
+        print(f"Afterparty RSVPs: {summary['afterparty']}")
+        print("RSVP summary rebuilt.")
+        return 0
+    except Exception as e:
+        print(f"Rebuilding the RSVP summary failed: {e}")
+        return 1
+
+if __name__ == '__main__':
+    exit(main())
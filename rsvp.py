@@ -0,0 +1,393 @@
+"""
+RSVP validation, pagination and query helpers.
+Shared by the synchronous Flask app (app.py) and the async entry point
+(asgi_app.py) so both keep the same validation rules and JSON contract.
+Nothing in here performs I/O.
+"""
+
+import base64
+from datetime import datetime, timedelta
+
+from bson.errors import InvalidId
+from bson.objectid import ObjectId
+from pymongo import ASCENDING, DESCENDING
+
+from schemas import Schema, Str, TaggedSchema, compile_schema
+
+# Pagination defaults; the apps read RSVP_PAGE_SIZE and RSVP_MAX_PAGE_SIZE
+# when they are built, after .env is loaded
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+RESPONSE_TYPES = ('yes', 'no', 'maybe')
+
+AFTERPARTY_FIELDS = {'name', 'telegram', 'phone_number', 'created_at', 'updated_at'}
+WEDDING_RSVP_FIELDS = {
+    'response_type', 'full_name', 'telegram_username', 'phone_number',
+    'dietary_restrictions', 'message', 'note', 'created_at', 'updated_at'
+}
+
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
+
+# Deduplication and search bookkeeping kept out of API responses
+PRIVATE_FIELDS = ('guest_key', 'idempotency_key', 'search_terms')
+PRIVATE_FIELDS_PROJECTION = dict.fromkeys(PRIVATE_FIELDS, 0)
+
+# Summary endpoint: window for the submissions-per-hour histogram
+SUMMARY_DEFAULT_HOURS = 24
+SUMMARY_MAX_HOURS = 24 * 7
+
+PAGE_SORT = [('created_at', DESCENDING), ('_id', DESCENDING)]
+BY_TYPE_SORT = [('response_type', ASCENDING), ('created_at', DESCENDING), ('_id', DESCENDING)]
+
+# Unique only among documents that have the field, so RSVPs stored before
+# deduplication existed never conflict
+UNIQUE_IF_PRESENT = {
+    'guest_key': {'unique': True, 'partialFilterExpression': {'guest_key': {'$exists': True}}},
+    'idempotency_key': {'unique': True, 'partialFilterExpression': {'idempotency_key': {'$exists': True}}},
+}
+
+# (collection, keys, name, options) for every index the API relies on
+INDEXES = [
+    ('afterparty', PAGE_SORT, 'created_at_id', {}),
+    ('afterparty', [('guest_key', ASCENDING)], 'guest_key_unique', UNIQUE_IF_PRESENT['guest_key']),
+    ('afterparty', [('idempotency_key', ASCENDING)], 'idempotency_key_unique', UNIQUE_IF_PRESENT['idempotency_key']),
+    ('afterparty', [('search_terms', ASCENDING)], 'search_terms', {}),
+    ('wedding_rsvp', PAGE_SORT, 'created_at_id', {}),
+    ('wedding_rsvp', BY_TYPE_SORT, 'response_type_created_at_id', {}),
+    ('wedding_rsvp', [('guest_key', ASCENDING)], 'guest_key_unique', UNIQUE_IF_PRESENT['guest_key']),
+    ('wedding_rsvp', [('idempotency_key', ASCENDING)], 'idempotency_key_unique', UNIQUE_IF_PRESENT['idempotency_key']),
+    ('wedding_rsvp', [('search_terms', ASCENDING)], 'search_terms', {}),
+]
+
+
+def normalize_phone(phone):
+    """Canonical form of a phone number: its digits only."""
+    return ''.join(ch for ch in phone if ch.isdigit())
+
+
+def normalize_name(name):
+    """Canonical form of a name: case-folded with whitespace collapsed."""
+    return ' '.join(name.casefold().split())
+
+
+def normalize_telegram(handle):
+    """Canonical form of a telegram handle: case-folded, without the leading @."""
+    return handle.strip().lstrip('@').casefold()
+
+
+def afterparty_guest_key(doc):
+    """Identity of an afterparty guest: the phone number, else the telegram handle."""
+    digits = normalize_phone(doc['phone_number'])
+    if digits:
+        return f'phone:{digits}'
+    return f"telegram:{normalize_telegram(doc['telegram'])}"
+
+
+def wedding_guest_key(doc):
+    """Identity of a wedding guest: the phone number, else the telegram handle, else the full name.
+
+    A yes always carries contact details and a no or maybe may. An answer
+    with the name alone is kept apart from every RSVP with contact details,
+    so it can never replace another guest's yes that has the same name.
+    """
+    digits = normalize_phone(doc.get('phone_number') or '')
+    if digits:
+        return f'phone:{digits}'
+    handle = normalize_telegram(doc.get('telegram_username') or '')
+    if handle:
+        return f'telegram:{handle}'
+    return f"name:{normalize_name(doc['full_name'])}"
+
+
+def search_terms(doc):
+    """Terms a guest can be searched by (see search.py), for either collection.
+
+    Each word of the name, the telegram handle and the phone number's digits,
+    all normalised, so a prefix query on the indexed array is a range scan.
+    """
+    terms = set(normalize_name(doc.get('full_name') or doc.get('name') or '').split())
+    handle = normalize_telegram(doc.get('telegram_username') or doc.get('telegram') or '')
+    if handle:
+        terms.add(handle)
+    digits = normalize_phone(doc.get('phone_number') or '')
+    if digits:
+        terms.add(digits)
+    return sorted(terms)
+
+
+AFTERPARTY_SCHEMA = Schema({
+    'name': Str(error='Name must be a non-empty string'),
+    'telegram': Str(error='Telegram must be a non-empty string'),
+    'phone_number': Str(error='Phone number must be a non-empty string'),
+}, report_missing=True)
+
+WEDDING_SCHEMA = TaggedSchema('response_type', {
+    'yes': Schema({
+        'telegram_username': Str(error='Telegram username is required for yes responses'),
+        'phone_number': Str(error='Phone number is required for yes responses'),
+        'dietary_restrictions': Str(required=False),
+    }),
+    # Contact details are optional for no and maybe, but identify the guest
+    # (see wedding_guest_key) so a later answer updates the same RSVP
+    'no': Schema({
+        'telegram_username': Str(required=False),
+        'phone_number': Str(required=False),
+        'message': Str(required=False),
+    }),
+    'maybe': Schema({
+        'telegram_username': Str(required=False),
+        'phone_number': Str(required=False),
+        'note': Str(required=False),
+    }),
+}, error='response_type must be one of: yes, no, maybe',
+   common=Schema({'full_name': Str(error='Full name must be a non-empty string')}))
+
+validate_afterparty = compile_schema(AFTERPARTY_SCHEMA)
+validate_wedding = compile_schema(WEDDING_SCHEMA)
+
+
+def build_afterparty_rsvp(data):
+    """Validate an afterparty RSVP payload.
+
+    Returns (document, None) on success or (None, error message) on failure.
+    """
+    new_rsvp, error = validate_afterparty(data)
+    if error:
+        return None, error
+    new_rsvp['created_at'] = datetime.utcnow()
+    new_rsvp['guest_key'] = afterparty_guest_key(new_rsvp)
+    new_rsvp['search_terms'] = search_terms(new_rsvp)
+    return new_rsvp, None
+
+
+def build_wedding_rsvp(data):
+    """Validate a wedding RSVP payload.
+
+    Returns (document, None) on success or (None, error message) on failure.
+    """
+    new_rsvp, error = validate_wedding(data)
+    if error:
+        return None, error
+    new_rsvp['created_at'] = datetime.utcnow()
+    new_rsvp['guest_key'] = wedding_guest_key(new_rsvp)
+    new_rsvp['search_terms'] = search_terms(new_rsvp)
+    return new_rsvp, None
+
+
+def upsert_operation(doc, all_fields, idempotency_key=None):
+    """Return (filter, update) that inserts doc, or overwrites the RSVP with the same guest_key.
+
+    The original created_at and _id are kept on update; fields from all_fields
+    that doc does not carry (e.g. note after a maybe turns into a yes) are unset.
+    """
+    fields = {k: v for k, v in doc.items() if k not in ('_id', 'created_at')}
+    fields['updated_at'] = doc['created_at']
+    if idempotency_key:
+        fields['idempotency_key'] = idempotency_key
+    on_insert = {'created_at': doc['created_at']}
+    if '_id' in doc:
+        on_insert['_id'] = doc['_id']
+    update = {'$set': fields, '$setOnInsert': on_insert}
+    stale = all_fields - fields.keys() - {'created_at'}
+    if stale:
+        update['$unset'] = dict.fromkeys(sorted(stale), '')
+    return {'guest_key': doc['guest_key']}, update
+
+
+def stored_document(before, update):
+    """The RSVP as stored after applying an upsert_operation update to before (None if inserted)."""
+    doc = dict(before) if before is not None else dict(update['$setOnInsert'])
+    for field in update.get('$unset', {}):
+        doc.pop(field, None)
+    doc.update(update['$set'])
+    for field in PRIVATE_FIELDS:
+        doc.pop(field, None)
+    return doc
+
+
+def parse_idempotency_key(headers):
+    """Return the Idempotency-Key request header, or None if absent.
+
+    Raises ValueError with a client-facing message on bad input.
+    """
+    key = headers.get('Idempotency-Key')
+    if key is None:
+        return None
+    key = key.strip()
+    if not key or len(key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+        raise ValueError(f'Idempotency-Key must be 1-{MAX_IDEMPOTENCY_KEY_LENGTH} characters')
+    return key
+
+
+def reused_idempotency_key(error_details):
+    """Whether a duplicate key error (its details dict) came from the idempotency_key index."""
+    details = error_details or {}
+    return 'idempotency_key' in details.get('keyPattern', {}) or 'idempotency_key_unique' in details.get('errmsg', '')
+
+
+def response_type_query(args):
+    """Build the wedding RSVP filter for an optional response_type query arg.
+
+    Raises ValueError with a client-facing message on bad input.
+    """
+    response_type = args.get('response_type')
+    if not response_type:
+        return {}
+    if response_type not in ['yes', 'no', 'maybe']:
+        raise ValueError('response_type must be one of: yes, no, maybe')
+    return {'response_type': response_type}
+
+
+def encode_cursor(doc):
+    """Encode the (created_at, _id) sort key of a document as an opaque cursor."""
+    raw = f"{doc['created_at'].isoformat()}|{doc['_id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decode a cursor produced by encode_cursor, raising ValueError if malformed."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, _id = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+        return datetime.fromisoformat(created_at), ObjectId(_id)
+    except (ValueError, InvalidId, UnicodeDecodeError):
+        raise ValueError('Invalid cursor')
+
+
+def parse_page_args(args, allowed_fields, always_fields=frozenset(),
+                    page_size=DEFAULT_PAGE_SIZE, max_page_size=MAX_PAGE_SIZE):
+    """Parse limit/after/fields query args into (limit, keyset filter, projection).
+
+    always_fields are returned even when fields= does not ask for them.
+    limit defaults to page_size and may be at most max_page_size.
+
+    Raises ValueError with a client-facing message on bad input.
+    """
+    try:
+        limit = int(args.get('limit', page_size))
+    except ValueError:
+        limit = 0
+    if limit < 1 or limit > max_page_size:
+        raise ValueError(f'limit must be an integer between 1 and {max_page_size}')
+
+    keyset = {}
+    after = args.get('after')
+    if after:
+        created_at, _id = decode_cursor(after)
+        keyset = {'$or': [
+            {'created_at': {'$lt': created_at}},
+            {'created_at': created_at, '_id': {'$lt': _id}}
+        ]}
+
+    projection = dict(PRIVATE_FIELDS_PROJECTION)
+    fields = args.get('fields')
+    if fields:
+        requested = {f.strip() for f in fields.split(',') if f.strip()}
+        unknown = requested - allowed_fields
+        if unknown:
+            raise ValueError(f'Unknown fields: {", ".join(sorted(unknown))}')
+        # created_at and _id are always needed to build the next cursor
+        projection = dict.fromkeys(requested | {'created_at'} | always_fields, 1)
+    return limit, keyset, projection
+
+
+def page_query(query, keyset):
+    """Combine a filter with the keyset condition from parse_page_args."""
+    if not keyset:
+        return query
+    return {'$and': [query, keyset]} if query else keyset
+
+
+def page_range_query(query, newest, oldest):
+    """Restrict query to the rows between two (created_at, _id) keys, inclusive."""
+    return {'$and': [
+        query,
+        {'$or': [
+            {'created_at': {'$lt': newest['created_at']}},
+            {'created_at': newest['created_at'], '_id': {'$lte': newest['_id']}}
+        ]},
+        {'$or': [
+            {'created_at': {'$gt': oldest['created_at']}},
+            {'created_at': oldest['created_at'], '_id': {'$gte': oldest['_id']}}
+        ]}
+    ]}
+
+
+def format_rsvp(doc):
+    """Turn a raw RSVP document into its API shape (id instead of _id, ISO timestamps)."""
+    doc['id'] = str(doc.pop('_id'))
+    doc['created_at'] = doc['created_at'].isoformat() if doc.get('created_at') else None
+    if doc.get('updated_at'):
+        doc['updated_at'] = doc['updated_at'].isoformat()
+    return doc
+
+
+def parse_summary_hours(args):
+    """Return the start of the submissions-per-hour window from the hours query arg.
+
+    Raises ValueError with a client-facing message on bad input.
+    """
+    try:
+        hours = int(args.get('hours', SUMMARY_DEFAULT_HOURS))
+    except ValueError:
+        hours = 0
+    if hours < 1 or hours > SUMMARY_MAX_HOURS:
+        raise ValueError(f'hours must be an integer between 1 and {SUMMARY_MAX_HOURS}')
+    return datetime.utcnow().replace(minute=0, second=0, microsecond=0) - timedelta(hours=hours - 1)
+
+
+def summary_pipeline(since):
+    """Aggregation over wedding_rsvp producing the facets read by format_summary."""
+    return [
+        {'$project': {'_id': 0, 'response_type': 1, 'dietary_restrictions': 1, 'created_at': 1}},
+        {'$facet': {
+            'by_type': [
+                {'$group': {'_id': '$response_type', 'count': {'$sum': 1}}}
+            ],
+            'dietary': [
+                {'$match': {'response_type': 'yes', 'dietary_restrictions': {'$nin': [None, '']}}},
+                {'$group': {'_id': '$dietary_restrictions', 'count': {'$sum': 1}}}
+            ],
+            'per_hour': [
+                {'$match': {'created_at': {'$gte': since}}},
+                {'$group': {
+                    '_id': {'$dateToString': {'format': '%Y-%m-%dT%H:00:00', 'date': '$created_at'}},
+                    'count': {'$sum': 1}
+                }},
+                {'$sort': {'_id': 1}}
+            ]
+        }}
+    ]
+
+
+def dietary_key(dietary_restrictions):
+    """Normalise a dietary restriction for the tally (usable as a MongoDB field name)."""
+    key = normalize_name(dietary_restrictions).replace('.', '').lstrip('$')
+    return key[:100] or 'other'
+
+
+def format_summary(facets, afterparty_count):
+    """Shape the summary_pipeline result into the /api/summary response body."""
+    count_by_type = {'yes': 0, 'no': 0, 'maybe': 0}
+    for row in facets.get('by_type', []):
+        if row['_id'] in count_by_type:
+            count_by_type[row['_id']] = row['count']
+    dietary_tally = {}
+    for row in facets.get('dietary', []):
+        key = dietary_key(row['_id'])
+        dietary_tally[key] = dietary_tally.get(key, 0) + row['count']
+    return {
+        'wedding': {
+            'count': sum(count_by_type.values()),
+            'count_by_type': count_by_type,
+            'yes_with_dietary_restrictions': sum(dietary_tally.values()),
+            'dietary_restrictions': dietary_tally
+        },
+        'afterparty': {
+            'count': afterparty_count
+        },
+        'submissions_per_hour': [
+            {'hour': row['_id'], 'count': row['count']} for row in facets.get('per_hour', [])
+        ]
+    }
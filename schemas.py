@@ -0,0 +1,98 @@
+"""
+Declarative schemas for the RSVP payloads.
+Each payload is described once as a Schema of Str fields (a TaggedSchema picks
+a variant by a tag field, e.g. response_type). compile_schema() turns a schema
+into a single validating function at import time, with every field's key,
+checks and error message resolved up front, so a request only runs the
+checks themselves.
+"""
+
+
+class Str:
+    """A string field, stripped of surrounding whitespace.
+
+    Required fields must be non-empty after stripping, else validation fails
+    with error. Optional fields become None when missing or empty.
+    """
+
+    def __init__(self, required=True, error=None):
+        self.required = required
+        self.error = error
+
+
+class Schema:
+    """An object whose fields are all Str.
+
+    With report_missing, required fields that are absent or empty are first
+    reported together as "Missing required fields: ...".
+    """
+
+    def __init__(self, fields, report_missing=False):
+        self.fields = fields
+        self.report_missing = report_missing
+
+
+class TaggedSchema:
+    """An object validated by common, then by the variant named by its tag field."""
+
+    def __init__(self, tag, variants, error, common):
+        self.tag = tag
+        self.variants = variants
+        self.error = error
+        self.common = common
+
+
+def compile_fields(schema):
+    """Compile a Schema into check(data, out) -> error message or None, filling out in field order."""
+    required = tuple((name, field.error) for name, field in schema.fields.items() if field.required)
+    steps = tuple((name, field.required, field.error or f'{name} must be a string')
+                  for name, field in schema.fields.items())
+    missing_prefix = 'Missing required fields: ' if schema.report_missing else None
+
+    def check(data, out):
+        if missing_prefix is not None:
+            missing = [name for name, _ in required if not data.get(name)]
+            if missing:
+                return missing_prefix + ', '.join(missing)
+        for name, is_required, error in steps:
+            value = data.get(name)
+            if is_required:
+                if not isinstance(value, str) or not value.strip():
+                    return error
+                out[name] = value.strip()
+            elif not value:
+                out[name] = None
+            elif isinstance(value, str):
+                out[name] = value.strip()
+            else:
+                return error
+        return None
+    return check
+
+
+def compile_schema(schema):
+    """Return validate(data) -> (fields dict, None) or (None, error message)."""
+    if isinstance(schema, TaggedSchema):
+        tag = schema.tag
+        tag_error = schema.error
+        check_common = compile_fields(schema.common)
+        variants = {value: compile_fields(variant) for value, variant in schema.variants.items()}
+
+        def check(data, out):
+            variant = variants.get(data.get(tag)) if isinstance(data.get(tag), str) else None
+            if variant is None:
+                return tag_error
+            out[tag] = data[tag]
+            return check_common(data, out) or variant(data, out)
+    else:
+        check = compile_fields(schema)
+
+    def validate(data):
+        if not isinstance(data, dict) or not data:
+            return None, 'No data provided'
+        out = {}
+        error = check(data, out)
+        if error:
+            return None, error
+        return out, None
+    return validate
@@ -0,0 +1,138 @@
+"""
+Guest search across the RSVP collections.
+Every RSVP stores its normalised name words, telegram handle and phone digits
+in search_terms (see rsvp.search_terms), indexed in both collections. Each
+word of the query must prefix-match one of a guest's terms, which MongoDB
+answers with a range scan of that index, so type-ahead stays fast at tens of
+thousands of guests. Each collection returns the RSVPs with every query word
+as a whole term first, then the newest prefix matches, so exact matches and
+recent guests survive the SEARCH_MAX_RESULTS cap when a common prefix
+matches thousands of guests. Matches are ranked here, exact before prefix
+before word matches. init_db.py and init_wedding_db.py create the index and fill in
+search_terms for RSVPs stored before search existed.
+"""
+
+import re
+
+from pymongo import UpdateOne
+
+from rsvp import INDEXES, normalize_name, normalize_phone, normalize_telegram, search_terms
+
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_LIMIT = 50
+# Matches fetched per collection and ranked; results past this many are not
+# served. The apps read RSVP_SEARCH_MAX_RESULTS when they are built.
+SEARCH_MAX_RESULTS = 200
+MAX_QUERY_LENGTH = 100
+MAX_QUERY_WORDS = 5
+
+SEARCHABLE_COLLECTIONS = ('wedding_rsvp', 'afterparty')
+
+# A query made only of these characters is looked up as a phone number
+PHONE_QUERY = re.compile(r'[\d\s+\-().]*\d[\d\s+\-().]*')
+
+EXACT_MATCH = 3
+PREFIX_MATCH = 2
+WORD_MATCH = 1
+
+
+def parse_search_args(args, max_results=SEARCH_MAX_RESULTS):
+    """Parse q/limit/offset/collections query args into (terms, limit, offset, collections).
+
+    terms is a list of normalised prefixes: the phone digits for a phone
+    number query, else the query's words.
+
+    Raises ValueError with a client-facing message on bad input.
+    """
+    q = args.get('q', '').strip()
+    if not q or len(q) > MAX_QUERY_LENGTH:
+        raise ValueError(f'q must be between 1 and {MAX_QUERY_LENGTH} characters')
+    if PHONE_QUERY.fullmatch(q):
+        terms = [normalize_phone(q)]
+    else:
+        terms = [normalize_telegram(word) for word in normalize_name(q).split()]
+        terms = [term for term in terms if term][:MAX_QUERY_WORDS]
+        if not terms:
+            raise ValueError('q must contain a letter or digit')
+
+    try:
+        limit = int(args.get('limit', SEARCH_DEFAULT_LIMIT))
+    except ValueError:
+        limit = 0
+    if limit < 1 or limit > SEARCH_MAX_LIMIT:
+        raise ValueError(f'limit must be an integer between 1 and {SEARCH_MAX_LIMIT}')
+    try:
+        offset = int(args.get('offset', 0))
+    except ValueError:
+        offset = -1
+    if offset < 0 or offset >= max_results:
+        raise ValueError(f'offset must be an integer between 0 and {max_results - 1}')
+
+    collections = args.get('collections')
+    if collections:
+        collections = [c.strip() for c in collections.split(',') if c.strip()]
+        unknown = set(collections) - set(SEARCHABLE_COLLECTIONS)
+        if unknown:
+            raise ValueError(f'Unknown collections: {", ".join(sorted(unknown))}')
+    else:
+        collections = list(SEARCHABLE_COLLECTIONS)
+    return terms, limit, offset, collections
+
+
+def search_query(terms):
+    """Filter matching RSVPs with a term starting with each of terms."""
+    clauses = [{'search_terms': re.compile('^' + re.escape(term))} for term in terms]
+    return clauses[0] if len(clauses) == 1 else {'$and': clauses}
+
+
+def exact_search_query(terms):
+    """Filter matching RSVPs with a term equal to each of terms; every exact match is among them."""
+    return {'search_terms': terms[0]} if len(terms) == 1 else {'search_terms': {'$all': terms}}
+
+
+def search_rank(doc, terms):
+    """How well an RSVP matched: EXACT_MATCH, PREFIX_MATCH or WORD_MATCH.
+
+    The whole query equal to the guest's full name, handle or phone number is
+    an exact match; any of them starting with it is a prefix match.
+    """
+    query = ' '.join(terms)
+    keys = [
+        normalize_name(doc.get('full_name') or doc.get('name') or ''),
+        normalize_telegram(doc.get('telegram_username') or doc.get('telegram') or ''),
+        normalize_phone(doc.get('phone_number') or '')
+    ]
+    if query in keys:
+        return EXACT_MATCH
+    if any(key.startswith(query) for key in keys if key):
+        return PREFIX_MATCH
+    return WORD_MATCH
+
+
+def rank_results(matches, terms, max_results=SEARCH_MAX_RESULTS):
+    """Sort (collection name, doc) matches by rank, then newest first.
+
+    Returns a list of (rank, collection name, doc), at most max_results long.
+    """
+    ranked = [(search_rank(doc, terms), collection_name, doc) for collection_name, doc in matches]
+    ranked.sort(key=lambda r: (r[2]['created_at'], r[2]['_id']), reverse=True)
+    ranked.sort(key=lambda r: r[0], reverse=True)
+    return ranked[:max_results]
+
+
+def prepare_search(db, collection_name, batch_size=500):
+    """Create collection_name's indexes and fill in missing search_terms. Returns the number of RSVPs updated."""
+    collection = db[collection_name]
+    for index_collection, keys, name, options in INDEXES:
+        if index_collection == collection_name:
+            collection.create_index(keys, name=name, **options)
+    updated = 0
+    batch = []
+    for doc in collection.find({'search_terms': {'$exists': False}}):
+        batch.append(UpdateOne({'_id': doc['_id']}, {'$set': {'search_terms': search_terms(doc)}}))
+        if len(batch) >= batch_size:
+            updated += collection.bulk_write(batch, ordered=False).modified_count
+            batch = []
+    if batch:
+        updated += collection.bulk_write(batch, ordered=False).modified_count
+    return updated
@@ -0,0 +1,76 @@
+"""
+Cold-start timings for a worker process.
+app.py records how long importing it and create_app() took; instrument()
+adds the first request (which pays for connecting to MongoDB and creating
+indexes), the optional warmup and the first successful readiness check.
+The report is served at GET /health/startup and logged after the first
+request, so the cost of a cold start can be measured per deployment.
+"""
+
+import logging
+import os
+import threading
+import time
+
+from flask import after_this_request, request
+
+logger = logging.getLogger(__name__)
+
+
+class StartupTimer:
+    """Durations and milestones since started (a time.perf_counter() value). Safe to share between threads.
+
+    Only the first recording of each name is kept, so a later warmup or
+    readiness check never overwrites the cold-start value.
+    """
+
+    def __init__(self, started):
+        self.started = started
+        self._timings = {}
+        self._first_request_path = None
+        self._lock = threading.Lock()
+
+    def elapsed(self):
+        """Seconds since started."""
+        return time.perf_counter() - self.started
+
+    def record(self, name, seconds):
+        with self._lock:
+            if name in self._timings:
+                return False
+            self._timings[name] = seconds
+            return True
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'pid': os.getpid(),
+                'first_request_path': self._first_request_path,
+                'timings_ms': {name: round(seconds * 1000, 2) for name, seconds in self._timings.items()}
+            }
+
+    def instrument(self, app):
+        """Register request hooks on a Flask app that time its first request."""
+        claimed = threading.Event()
+
+        @app.before_request
+        def time_first_request():
+            if claimed.is_set():
+                return
+            with self._lock:
+                if claimed.is_set():
+                    return
+                claimed.set()
+                self._first_request_path = request.path
+            started = time.perf_counter()
+
+            @after_this_request
+            def record_first_request(response):
+                # Measured until the body has been sent, as in metrics.py
+                def finish():
+                    self.record('first_request', time.perf_counter() - started)
+                    self.record('first_request_completed', self.elapsed())
+                    logger.info(f'Startup timings: {self.snapshot()}')
+
+                response.call_on_close(finish)
+                return response
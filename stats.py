@@ -0,0 +1,112 @@
+"""
+Materialised RSVP summary for the dashboard.
+A single document in the rsvp_stats collection holds the headcounts served by
+GET /api/summary. Each synchronous submission applies its difference with one
+atomic $inc, so reading the summary is a fetch by _id instead of an
+aggregation over wedding_rsvp. rebuild_stats.py recomputes it from scratch.
+"""
+
+import os
+from datetime import datetime
+
+from rsvp import RESPONSE_TYPES, dietary_key, summary_pipeline
+
+STATS_COLLECTION = 'rsvp_stats'
+SUMMARY_ID = 'summary'
+
+HOUR_FORMAT = '%Y-%m-%dT%H:00:00'
+
+
+def stats_enabled():
+    return os.getenv('RSVP_STATS', 'False').lower() == 'true'
+
+
+def wedding_tally(doc):
+    """The summary counters a wedding RSVP contributes to, as dotted field paths."""
+    fields = [f"wedding.{doc['response_type']}"]
+    if doc['response_type'] == 'yes' and doc.get('dietary_restrictions'):
+        fields.append('yes_with_dietary_restrictions')
+        fields.append(f"dietary_restrictions.{dietary_key(doc['dietary_restrictions'])}")
+    return fields
+
+
+def summary_increment(collection_name, before, after):
+    """Return the $inc that moves the summary from before to after, or None if nothing changed.
+
+    before is the stored RSVP prior to the upsert (None for a new guest) and
+    after the RSVP as stored by it.
+    """
+    inc = {}
+    if collection_name == 'afterparty':
+        if before is None:
+            inc['afterparty'] = 1
+    else:
+        if before is None:
+            inc[f"per_hour.{after['created_at'].strftime(HOUR_FORMAT)}"] = 1
+        for field in wedding_tally(before) if before is not None else []:
+            inc[field] = inc.get(field, 0) - 1
+        for field in wedding_tally(after):
+            inc[field] = inc.get(field, 0) + 1
+    inc = {field: amount for field, amount in inc.items() if amount}
+    if not inc:
+        return None
+    return {'$inc': inc, '$set': {'updated_at': datetime.utcnow()}}
+
+
+def rebuild_pipeline():
+    """summary_pipeline over all time, so every hour is counted."""
+    return summary_pipeline(datetime(1970, 1, 1))
+
+
+def stats_document(facets, afterparty_count):
+    """Build the summary document from a rebuild_pipeline result and the afterparty total."""
+    now = datetime.utcnow()
+    doc = {
+        '_id': SUMMARY_ID,
+        'wedding': dict.fromkeys(RESPONSE_TYPES, 0),
+        'yes_with_dietary_restrictions': 0,
+        'dietary_restrictions': {},
+        'afterparty': afterparty_count,
+        'per_hour': {},
+        'rebuilt_at': now,
+        'updated_at': now
+    }
+    for row in facets.get('by_type', []):
+        if row['_id'] in doc['wedding']:
+            doc['wedding'][row['_id']] = row['count']
+    for row in facets.get('dietary', []):
+        key = dietary_key(row['_id'])
+        doc['dietary_restrictions'][key] = doc['dietary_restrictions'].get(key, 0) + row['count']
+        doc['yes_with_dietary_restrictions'] += row['count']
+    for row in facets.get('per_hour', []):
+        doc['per_hour'][row['_id']] = row['count']
+    return doc
+
+
+def rebuild(db):
+    """Recompute the summary document from the RSVP collections and store it. Returns it."""
+    facets = next(db['wedding_rsvp'].aggregate(rebuild_pipeline()), {})
+    doc = stats_document(facets, db['afterparty'].count_documents({}))
+    db[STATS_COLLECTION].replace_one({'_id': SUMMARY_ID}, doc, upsert=True)
+    return doc
+
+
+def format_stats_summary(doc, since):
+    """Shape a summary document into the /api/summary response body (see rsvp.format_summary)."""
+    count_by_type = {response_type: doc.get('wedding', {}).get(response_type, 0) for response_type in RESPONSE_TYPES}
+    since_hour = since.strftime(HOUR_FORMAT)
+    return {
+        'wedding': {
+            'count': sum(count_by_type.values()),
+            'count_by_type': count_by_type,
+            'yes_with_dietary_restrictions': doc.get('yes_with_dietary_restrictions', 0),
+            'dietary_restrictions': {k: v for k, v in doc.get('dietary_restrictions', {}).items() if v > 0}
+        },
+        'afterparty': {
+            'count': doc.get('afterparty', 0)
+        },
+        'submissions_per_hour': [
+            {'hour': hour, 'count': count}
+            for hour, count in sorted(doc.get('per_hour', {}).items()) if hour >= since_hour and count > 0
+        ]
+    }
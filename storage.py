@@ -0,0 +1,402 @@
+"""
+Storage backends for the Flask app.
+app.py reads and writes RSVPs only through a storage object. rsvps(name)
+returns the store for one RSVP collection ('wedding_rsvp', 'afterparty' or
+an event's copy of them) with the operations the views need; the storage
+itself covers index creation, health pings, the event registry and the
+materialised summary. MongoStorage runs them on PyMongo and is the default.
+MemoryStorage keeps everything in process memory, with RSVPs indexed by
+(created_at, _id) and by response_type, so the handlers can be tested and
+profiled in-process without a database (RSVP_STORAGE=memory). Its data
+lives as long as the process.
+"""
+
+import bisect
+import copy
+import os
+import threading
+from collections import Counter
+from datetime import datetime
+
+from bson.objectid import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+import stats
+from events import EVENTS_COLLECTION, ensure_event_indexes
+from rsvp import (
+    BY_TYPE_SORT, INDEXES, PAGE_SORT, PRIVATE_FIELDS_PROJECTION, page_query, page_range_query, summary_pipeline
+)
+from search import exact_search_query, search_query
+
+DUPLICATE_KEY = 11000
+
+
+class MongoRSVPs:
+    """One RSVP collection on PyMongo."""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.name = collection.name
+
+    def upsert(self, filter, update):
+        """Apply an rsvp.upsert_operation. Returns the RSVP it replaced (without private fields), or None.
+
+        Raises DuplicateKeyError when the Idempotency-Key belongs to another
+        guest, or when two first submissions from one guest raced.
+        """
+        return self.collection.find_one_and_update(
+            filter, update, projection=dict(PRIVATE_FIELDS_PROJECTION), upsert=True,
+            return_document=ReturnDocument.BEFORE)
+
+    def bulk_upsert(self, operations):
+        """Apply (filter, update) upserts in any order. Returns (inserted, matched).
+
+        Raises BulkWriteError, whose details say which operations failed.
+        """
+        result = self.collection.bulk_write(
+            [UpdateOne(filter, update, upsert=True) for filter, update in operations], ordered=False)
+        return result.upserted_count, result.matched_count
+
+    def find_page(self, query, limit, keyset, projection):
+        """Cursor over one page in (created_at, _id) descending order.
+
+        query is a dict of field equality conditions. One extra document is
+        returned so the serializer can tell whether another page follows
+        without a separate count.
+        """
+        return self.collection.find(page_query(query, keyset), projection).sort(PAGE_SORT).limit(limit + 1)
+
+    def find_range_by_type(self, query, newest, oldest, projection):
+        """Cursor over the rows between two (created_at, _id) keys, inclusive, sorted by response_type."""
+        return self.collection.find(page_range_query(query, newest, oldest), projection).sort(BY_TYPE_SORT)
+
+    def search(self, terms, limit):
+        """Up to limit RSVPs matching terms, unranked.
+
+        RSVPs with a term equal to each of terms come first, then those with
+        a term starting with each fill the rest, both newest first.
+        """
+        projection = dict(PRIVATE_FIELDS_PROJECTION)
+        docs = list(self.collection.find(exact_search_query(terms), projection).sort(PAGE_SORT).limit(limit))
+        if len(docs) < limit:
+            query = {'$and': [search_query(terms), {'_id': {'$nin': [doc['_id'] for doc in docs]}}]}
+            docs.extend(self.collection.find(query, projection).sort(PAGE_SORT).limit(limit - len(docs)))
+        return docs
+
+    def export(self, query):
+        """Cursor over every matching RSVP, newest first."""
+        return self.collection.find(query, dict(PRIVATE_FIELDS_PROJECTION)).sort(PAGE_SORT)
+
+    def summary_facets(self, since):
+        """The rsvp.summary_pipeline result for this collection."""
+        return next(self.collection.aggregate(summary_pipeline(since)), {})
+
+    def count(self):
+        return self.collection.estimated_document_count()
+
+    def touch(self):
+        """Read one document, so the connection and collection are warm."""
+        self.collection.find_one({}, {'_id': 1})
+
+
+class MongoStorage:
+    """RSVPs, events and the summary in MongoDB (see database.py)."""
+
+    def __init__(self, get_client, get_db):
+        self._get_client = get_client
+        self._get_db = get_db
+
+    def rsvps(self, collection_name):
+        return MongoRSVPs(self._get_db()[collection_name])
+
+    def ping(self):
+        self._get_client().admin.command('ping')
+
+    def create_indexes(self):
+        """Create the indexes listed in rsvp.INDEXES (idempotent)."""
+        for collection_name, keys, name, options in INDEXES:
+            self._get_db()[collection_name].create_index(keys, name=name, **options)
+
+    def find_event(self, event_id):
+        return self._get_db()[EVENTS_COLLECTION].find_one({'_id': event_id})
+
+    def ensure_event_indexes(self, event_id):
+        ensure_event_indexes(self._get_db(), event_id)
+
+    def stats_summary(self):
+        return self._get_db()[stats.STATS_COLLECTION].find_one({'_id': stats.SUMMARY_ID})
+
+    def increment_summary(self, increment):
+        """Apply a stats.summary_increment. Returns False if there is no summary yet."""
+        result = self._get_db()[stats.STATS_COLLECTION].update_one({'_id': stats.SUMMARY_ID}, increment)
+        return result.matched_count > 0
+
+    def rebuild_summary(self):
+        return stats.rebuild(self._get_db())
+
+
+def project(doc, projection):
+    """Copy doc with a PyMongo-style inclusion or exclusion projection applied."""
+    if any(projection.values()):
+        projected = {field: value for field, value in doc.items() if projection.get(field)}
+        if projection.get('_id', 1):
+            projected['_id'] = doc['_id']
+        return projected
+    return {field: value for field, value in doc.items() if field not in projection}
+
+
+def matches(doc, query):
+    return all(doc.get(field) == value for field, value in query.items())
+
+
+class MemoryCursor:
+    """The part of a PyMongo cursor the views use: iteration and close()."""
+
+    def __init__(self, docs):
+        self._docs = iter(docs)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._docs)
+
+    def close(self):
+        pass
+
+
+class MemoryRSVPs:
+    """One RSVP collection in process memory, with the same operations as MongoRSVPs.
+
+    RSVPs are kept in a dict by _id. Sorted lists of (created_at, _id) keys,
+    one over every RSVP and one per response_type, serve the pages and the
+    summary, and a sorted list of (search term, _id) serves search prefixes;
+    guest_key and idempotency_key are unique as in MongoDB. Safe to share
+    between threads.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._docs = {}
+        self._keys = []
+        self._by_type = {}
+        self._terms = []
+        self._guest_keys = {}
+        self._idempotency_keys = {}
+        self._lock = threading.Lock()
+
+    def upsert(self, filter, update):
+        with self._lock:
+            return self._upsert(filter, update)
+
+    def bulk_upsert(self, operations):
+        inserted = matched = 0
+        errors = []
+        with self._lock:
+            for index, (filter, update) in enumerate(operations):
+                try:
+                    if self._upsert(filter, update) is None:
+                        inserted += 1
+                    else:
+                        matched += 1
+                except DuplicateKeyError as e:
+                    errors.append(dict(e.details, index=index))
+        if errors:
+            raise BulkWriteError({'writeErrors': errors, 'nUpserted': inserted, 'nMatched': matched})
+        return inserted, matched
+
+    def find_page(self, query, limit, keyset, projection):
+        docs = []
+        with self._lock:
+            keys = self._by_type.get(query['response_type'], []) if 'response_type' in query else self._keys
+            end = len(keys)
+            if keyset:
+                # parse_page_args' condition: strictly before (created_at, _id)
+                bound = keyset['$or'][1]
+                end = bisect.bisect_left(keys, (bound['created_at'], bound['_id']['$lt']))
+            for i in range(end - 1, -1, -1):
+                doc = self._docs[keys[i][1]]
+                if matches(doc, query):
+                    docs.append(project(doc, projection))
+                    if len(docs) > limit:
+                        break
+        return MemoryCursor(docs)
+
+    def find_range_by_type(self, query, newest, oldest, projection):
+        low = (oldest['created_at'], oldest['_id'])
+        high = (newest['created_at'], newest['_id'])
+        docs = []
+        with self._lock:
+            types = [query['response_type']] if 'response_type' in query else sorted(self._by_type)
+            for response_type in types:
+                keys = self._by_type.get(response_type, [])
+                start, end = bisect.bisect_left(keys, low), bisect.bisect_right(keys, high)
+                for created_at, _id in reversed(keys[start:end]):
+                    doc = self._docs[_id]
+                    if matches(doc, query):
+                        docs.append(project(doc, projection))
+        return MemoryCursor(docs)
+
+    def search(self, terms, limit):
+        with self._lock:
+            # Every term equal to t sorts before t + U+0000, and every term
+            # starting with t before t + U+FFFF
+            exact = self._newest(self._term_matches(terms, '\x00'), limit)
+            prefix = self._newest(self._term_matches(terms, '\uffff') - set(exact), limit - len(exact))
+            docs = [project(self._docs[_id], PRIVATE_FIELDS_PROJECTION) for _id in exact + prefix]
+        return MemoryCursor(docs)
+
+    def _term_matches(self, terms, bound):
+        matched = None
+        for term in terms:
+            start = bisect.bisect_left(self._terms, (term,))
+            end = bisect.bisect_left(self._terms, (term + bound,))
+            ids = {_id for _, _id in self._terms[start:end]}
+            matched = ids if matched is None else matched & ids
+        return matched
+
+    def _newest(self, ids, limit):
+        return sorted(ids, key=lambda _id: (self._docs[_id]['created_at'], _id), reverse=True)[:limit]
+
+    def export(self, query):
+        with self._lock:
+            docs = [project(self._docs[_id], PRIVATE_FIELDS_PROJECTION)
+                    for _, _id in reversed(self._keys) if matches(self._docs[_id], query)]
+        return MemoryCursor(docs)
+
+    def summary_facets(self, since):
+        with self._lock:
+            by_type = [{'_id': t, 'count': len(keys)} for t, keys in self._by_type.items() if keys]
+            dietary = Counter(
+                self._docs[_id]['dietary_restrictions'] for _, _id in self._by_type.get('yes', [])
+                if self._docs[_id].get('dietary_restrictions') not in (None, ''))
+            start = bisect.bisect_left(self._keys, (since,))
+            per_hour = Counter(created_at.strftime(stats.HOUR_FORMAT) for created_at, _ in self._keys[start:])
+        return {
+            'by_type': by_type,
+            'dietary': [{'_id': value, 'count': count} for value, count in dietary.items()],
+            'per_hour': [{'_id': hour, 'count': per_hour[hour]} for hour in sorted(per_hour)]
+        }
+
+    def count(self):
+        return len(self._docs)
+
+    def touch(self):
+        pass
+
+    def _upsert(self, filter, update):
+        # Called with self._lock held
+        fields = update['$set']
+        _id = self._guest_keys.get(filter['guest_key'])
+        idempotency_key = fields.get('idempotency_key')
+        if idempotency_key is not None and self._idempotency_keys.get(idempotency_key, _id) != _id:
+            message = 'E11000 duplicate key error index: idempotency_key_unique'
+            raise DuplicateKeyError(message, DUPLICATE_KEY, {
+                'code': DUPLICATE_KEY, 'errmsg': message, 'keyPattern': {'idempotency_key': 1}})
+        if _id is None:
+            doc = dict(update['$setOnInsert'])
+            doc.setdefault('_id', ObjectId())
+            doc.update(fields)
+            self._index(doc)
+            return None
+        doc = self._docs[_id]
+        before = project(doc, PRIVATE_FIELDS_PROJECTION)
+        self._unindex(doc)
+        for field in update.get('$unset', {}):
+            doc.pop(field, None)
+        doc.update(fields)
+        self._index(doc)
+        return before
+
+    def _index(self, doc):
+        key = (doc['created_at'], doc['_id'])
+        self._docs[doc['_id']] = doc
+        bisect.insort(self._keys, key)
+        if doc.get('response_type') is not None:
+            bisect.insort(self._by_type.setdefault(doc['response_type'], []), key)
+        for term in doc.get('search_terms', ()):
+            bisect.insort(self._terms, (term, doc['_id']))
+        self._guest_keys[doc['guest_key']] = doc['_id']
+        if doc.get('idempotency_key') is not None:
+            self._idempotency_keys[doc['idempotency_key']] = doc['_id']
+
+    def _unindex(self, doc):
+        key = (doc['created_at'], doc['_id'])
+        self._keys.pop(bisect.bisect_left(self._keys, key))
+        if doc.get('response_type') is not None:
+            keys = self._by_type[doc['response_type']]
+            keys.pop(bisect.bisect_left(keys, key))
+        for term in doc.get('search_terms', ()):
+            self._terms.pop(bisect.bisect_left(self._terms, (term, doc['_id'])))
+        self._idempotency_keys.pop(doc.get('idempotency_key'), None)
+
+
+class MemoryStorage:
+    """RSVPs, events and the summary in process memory, for tests and profiling."""
+
+    def __init__(self):
+        self._collections = {}
+        self._events = {}
+        self._summary = None
+        self._lock = threading.Lock()
+
+    def rsvps(self, collection_name):
+        with self._lock:
+            if collection_name not in self._collections:
+                self._collections[collection_name] = MemoryRSVPs(collection_name)
+            return self._collections[collection_name]
+
+    def ping(self):
+        pass
+
+    def create_indexes(self):
+        # MemoryRSVPs maintains its indexes on every write
+        pass
+
+    def add_event(self, event):
+        """Register an event (see events.event_document); create_event.py does this in MongoDB."""
+        with self._lock:
+            self._events[event['_id']] = dict(event)
+
+    def find_event(self, event_id):
+        with self._lock:
+            event = self._events.get(event_id)
+            return dict(event) if event is not None else None
+
+    def ensure_event_indexes(self, event_id):
+        pass
+
+    def stats_summary(self):
+        with self._lock:
+            return copy.deepcopy(self._summary)
+
+    def increment_summary(self, increment):
+        with self._lock:
+            if self._summary is None:
+                return False
+            for path, amount in increment['$inc'].items():
+                *parents, field = path.split('.')
+                target = self._summary
+                for parent in parents:
+                    target = target.setdefault(parent, {})
+                target[field] = target.get(field, 0) + amount
+            self._summary.update(increment.get('$set', {}))
+            return True
+
+    def rebuild_summary(self):
+        facets = self.rsvps('wedding_rsvp').summary_facets(datetime(1970, 1, 1))
+        summary = stats.stats_document(facets, self.rsvps('afterparty').count())
+        with self._lock:
+            self._summary = summary
+            return copy.deepcopy(summary)
+
+
+def create_storage(get_client, get_db):
+    """Build the storage configured by RSVP_STORAGE (mongodb or memory)."""
+    backend = os.getenv('RSVP_STORAGE', 'mongodb').lower()
+    if backend == 'mongodb':
+        return MongoStorage(get_client, get_db)
+    if backend == 'memory':
+        return MemoryStorage()
+    raise ValueError(f'Unknown RSVP_STORAGE: {backend}')
@@ -46,7 +46,8 @@ def test_rsvp_submission():
         )
         print(f"Status Code: {response.status_code}")
         print(f"Response: {response.json()}")
-        return response.status_code == 201
+        # 200 when an earlier run already stored this guest
+        return response.status_code in (200, 201)
     except Exception as e:
         print(f"Error: {e}")
         return False
@@ -134,7 +135,7 @@ def test_multiple_rsvps():
                 json=rsvp_data,
                 headers={"Content-Type": "application/json"}
             )
-            if response.status_code == 201:
+            if response.status_code in (200, 201):
                 success_count += 1
                 print(f"✓ RSVP {i} submitted successfully")
             else:
@@ -166,7 +167,8 @@ def test_wedding_rsvp_yes_submission():
         )
         print(f"Status Code: {response.status_code}")
         print(f"Response: {response.json()}")
-        return response.status_code == 201
+        # 200 when an earlier run already stored this guest
+        return response.status_code in (200, 201)
     except Exception as e:
         print(f"Error: {e}")
         return False
@@ -190,7 +192,8 @@ def test_wedding_rsvp_no_submission():
         )
         print(f"Status Code: {response.status_code}")
         print(f"Response: {response.json()}")
-        return response.status_code == 201
+        # 200 when an earlier run already stored this guest
+        return response.status_code in (200, 201)
     except Exception as e:
         print(f"Error: {e}")
         return False
@@ -214,7 +217,8 @@ def test_wedding_rsvp_maybe_submission():
         )
         print(f"Status Code: {response.status_code}")
         print(f"Response: {response.json()}")
-        return response.status_code == 201
+        # 200 when an earlier run already stored this guest
+        return response.status_code in (200, 201)
     except Exception as e:
         print(f"Error: {e}")
         return False
@@ -251,7 +255,8 @@ def test_wedding_rsvp_without_dietary():
         )
         print(f"Status Code: {response.status_code}")
         print(f"Response: {response.json()}")
-        return response.status_code == 201
+        # 200 when an earlier run already stored this guest
+        return response.status_code in (200, 201)
     except Exception as e:
         print(f"Error: {e}")
         return False
@@ -303,6 +308,91 @@ def test_invalid_wedding_rsvp_yes():
         print(f"Error: {e}")
         return False
 
+def test_wedding_rsvp_resubmission():
+    """Test that resubmitting a Wedding RSVP updates it instead of adding another"""
+    print("\nTesting Wedding RSVP resubmission...")
+    
+    first = {"response_type": "maybe", "full_name": "Grace  Ong", "note": "Checking flights"}
+    second = {"response_type": "no", "full_name": "grace ong", "message": "Can't make it after all"}
+    
+    try:
+        first_response = requests.post(f"{BASE_URL}/api/wedding-rsvp", json=first)
+        second_response = requests.post(
+            f"{BASE_URL}/api/wedding-rsvp",
+            json=second,
+            headers={"Idempotency-Key": f"resubmission-{time.time()}"}
+        )
+        print(f"Status Codes: {first_response.status_code}, {second_response.status_code}")
+        print(f"Response: {second_response.json()}")
+        return (first_response.status_code in (200, 201) and second_response.status_code == 200
+                and second_response.json()['rsvp_id'] == first_response.json()['rsvp_id'])
+    except Exception as e:
+        print(f"Error: {e}")
+        return False
+
+def test_change_feed():
+    """Test that the change feed opens as an event stream"""
+    print("\nTesting change feed...")
+    try:
+        with requests.get(f"{BASE_URL}/api/changes", stream=True, timeout=10) as response:
+            print(f"Status Code: {response.status_code}")
+            first_line = next(response.iter_lines(decode_unicode=True))
+            print(f"First line: {first_line}")
+            return (response.status_code == 200
+                    and response.headers['Content-Type'].startswith('text/event-stream')
+                    and first_line.startswith('retry:'))
+    except Exception as e:
+        print(f"Error: {e}")
+        return False
+
+def test_rsvp_summary():
+    """Test RSVP summary endpoint"""
+    print("\nTesting RSVP summary...")
+    try:
+        response = requests.get(f"{BASE_URL}/api/summary")
+        print(f"Status Code: {response.status_code}")
+        print(f"Response: {response.json()}")
+        return response.status_code == 200 and 'count_by_type' in response.json()['wedding']
+    except Exception as e:
+        print(f"Error: {e}")
+        return False
+
+def test_bulk_wedding_rsvp_import():
+    """Test bulk Wedding RSVP import with one invalid row"""
+    print("\nTesting bulk Wedding RSVP import...")
+    
+    rows = [
+        {"response_type": "yes", "full_name": "Dana Lee", "telegram_username": "@danalee", "phone_number": "+6591234567"},
+        {"response_type": "no", "full_name": "Evan Tan", "message": "Overseas that week"},
+        {"response_type": "yes", "full_name": "Missing Fields"}
+    ]
+    
+    try:
+        response = requests.post(
+            f"{BASE_URL}/api/wedding-rsvp/bulk",
+            data="\n".join(json.dumps(row) for row in rows),
+            headers={"Content-Type": "application/x-ndjson"}
+        )
+        print(f"Status Code: {response.status_code}")
+        print(f"Response: {response.json()}")
+        result = response.json()
+        return response.status_code == 200 and result['inserted'] + result['updated'] == 2 and result['errors'][0]['row'] == 3
+    except Exception as e:
+        print(f"Error: {e}")
+        return False
+
+def test_wedding_rsvp_export():
+    """Test Wedding RSVP CSV export"""
+    print("\nTesting Wedding RSVP export...")
+    try:
+        response = requests.get(f"{BASE_URL}/api/wedding-rsvp/export", params={"format": "csv"})
+        print(f"Status Code: {response.status_code}")
+        print(f"First line: {response.text.splitlines()[0]}")
+        return response.status_code == 200 and response.text.startswith("id,response_type,full_name")
+    except Exception as e:
+        print(f"Error: {e}")
+        return False
+
 def main():
     """Run all tests"""
     print("Afterparty RSVP API Test Suite")
@@ -325,7 +415,12 @@ def main():
         ("Wedding RSVP Retrieval", test_wedding_rsvp_retrieval),
         ("Wedding RSVP without Dietary", test_wedding_rsvp_without_dietary),
         ("Invalid Wedding RSVP", test_invalid_wedding_rsvp),
-        ("Invalid Wedding RSVP Yes", test_invalid_wedding_rsvp_yes)
+        ("Invalid Wedding RSVP Yes", test_invalid_wedding_rsvp_yes),
+        ("Wedding RSVP Resubmission", test_wedding_rsvp_resubmission),
+        ("Change Feed", test_change_feed),
+        ("RSVP Summary", test_rsvp_summary),
+        ("Bulk Wedding RSVP Import", test_bulk_wedding_rsvp_import),
+        ("Wedding RSVP Export", test_wedding_rsvp_export)
     ]
     
     passed = 0
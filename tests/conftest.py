@@ -0,0 +1,57 @@
+"""
+Fixtures for the in-process test suite.
+Each test gets a fresh app on the in-memory storage backend (see storage.py),
+driven through Flask's test client, so no MongoDB server is needed.
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import app as wedding_app  # noqa: E402
+
+
+@pytest.fixture
+def make_app(monkeypatch):
+    """Build an app on RSVP_STORAGE=memory; keyword arguments set further environment variables."""
+    def make(**env):
+        monkeypatch.setenv('RSVP_STORAGE', 'memory')
+        # Every test request comes from one address
+        monkeypatch.setenv('RSVP_RATE_LIMIT_BACKEND', 'none')
+        for name, value in env.items():
+            monkeypatch.setenv(name, value)
+        return wedding_app.create_app()
+    return make
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def storage(app):
+    return wedding_app.storage
+
+
+def afterparty_rsvp(i):
+    return {'name': f'Guest {i}', 'telegram': f'@guest{i}', 'phone_number': f'+65{i:08d}'}
+
+
+def wedding_rsvp(i, response_type='yes', **fields):
+    rsvp = {
+        'response_type': response_type,
+        'full_name': f'Guest Number {i}',
+        'telegram_username': f'@guest{i}',
+        'phone_number': f'+65{i:08d}',
+    }
+    rsvp.update(fields)
+    return rsvp
@@ -0,0 +1,44 @@
+import importlib.util
+import os
+
+import pytest
+from bson.objectid import ObjectId
+
+import archive
+from events import EVENTS_COLLECTION, event_collection_name, event_document
+from rsvp import AFTERPARTY_FIELDS, build_afterparty_rsvp, upsert_operation
+
+from conftest import afterparty_rsvp
+
+
+@pytest.fixture
+def db():
+    mongomock = pytest.importorskip('mongomock')
+    db = mongomock.MongoClient()['wedding_test']
+    db[EVENTS_COLLECTION].insert_one(event_document('old-party', 'Old Party'))
+    doc, _ = build_afterparty_rsvp(afterparty_rsvp(1))
+    doc['_id'] = ObjectId()
+    db[event_collection_name('old-party', 'afterparty')].update_one(
+        *upsert_operation(doc, AFTERPARTY_FIELDS), upsert=True)
+    return db
+
+
+@pytest.mark.skipif(importlib.util.find_spec('pyarrow') is not None, reason='pyarrow is installed')
+def test_parquet_without_pyarrow_leaves_the_event_open(db, tmp_path):
+    with pytest.raises(RuntimeError):
+        archive.archive_event(db, 'old-party', str(tmp_path), 'parquet')
+    assert 'archived_at' not in db[EVENTS_COLLECTION].find_one({'_id': 'old-party'})
+    assert os.listdir(tmp_path) == []
+
+
+def test_failed_export_leaves_the_event_open(db, tmp_path, monkeypatch):
+    def write_ndjson(path, docs):
+        open(path, 'wb').close()
+        raise OSError('No space left on device')
+    monkeypatch.setattr(archive, 'write_ndjson', write_ndjson)
+
+    with pytest.raises(OSError):
+        archive.archive_event(db, 'old-party', str(tmp_path))
+    assert 'archived_at' not in db[EVENTS_COLLECTION].find_one({'_id': 'old-party'})
+    assert os.listdir(tmp_path) == []
+    assert db[event_collection_name('old-party', 'afterparty')].count_documents({}) == 1
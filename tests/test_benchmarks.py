@@ -0,0 +1,15 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks'))
+
+import bench_handlers  # noqa: E402
+
+
+def test_handler_benchmark_runs(monkeypatch):
+    # bench_handlers sets these itself; monkeypatch restores them afterwards
+    for name in ('RSVP_STORAGE', 'RSVP_CACHE_BACKEND', 'RSVP_RATE_LIMIT_BACKEND', 'RSVP_STATS'):
+        monkeypatch.setenv(name, '')
+    results = bench_handlers.run(rows=300, number=2)
+    assert ('GET page (100)', False) in results and ('GET summary', True) in results
+    assert all(ms > 0 for ms in results.values())
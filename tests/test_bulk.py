@@ -0,0 +1,48 @@
+import csv
+import io
+import json
+
+from conftest import afterparty_rsvp, wedding_rsvp
+
+
+def ndjson(rows):
+    return ''.join(json.dumps(row) + '\n' for row in rows)
+
+
+def test_ndjson_import_deduplicates_by_guest(client):
+    client.post('/api/rsvp', json=afterparty_rsvp(1))
+    body = ndjson([afterparty_rsvp(1), afterparty_rsvp(2), afterparty_rsvp(3), afterparty_rsvp(2)])
+    response = client.post('/api/rsvp/bulk', data=body, content_type='application/x-ndjson')
+    assert response.status_code == 200
+    assert response.json == {'inserted': 2, 'updated': 2, 'failed': 0, 'errors': []}
+    assert client.get('/api/rsvp').json['count'] == 3
+
+
+def test_csv_import_reports_bad_rows(client):
+    body = 'response_type,full_name,telegram_username,phone_number\n' \
+           'yes,Jane Doe,@jane,+6512345678\n' \
+           'yes,John Doe,,\n' \
+           'no,Jim Doe,,\n'
+    response = client.post('/api/wedding-rsvp/bulk', data=body, content_type='text/csv')
+    assert response.json['inserted'] == 2
+    assert response.json['failed'] == 1
+    assert response.json['errors'][0]['row'] == 2
+
+
+def test_import_needs_a_supported_content_type(client):
+    response = client.post('/api/rsvp/bulk', data='{}', content_type='application/json')
+    assert response.status_code == 415
+
+
+def test_export_csv_newest_first(client):
+    for i in range(3):
+        client.post('/api/wedding-rsvp', json=wedding_rsvp(i, 'yes' if i % 2 else 'no'))
+    response = client.get('/api/wedding-rsvp/export?format=csv')
+    assert response.status_code == 200
+    assert response.headers['Content-Disposition'] == 'attachment; filename=wedding_rsvp.csv'
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert [row['full_name'] for row in rows] == ['Guest Number 2', 'Guest Number 1', 'Guest Number 0']
+
+    only_yes = client.get('/api/wedding-rsvp/export?response_type=yes').get_data(as_text=True)
+    assert [json.loads(line)['full_name'] for line in only_yes.splitlines()] == ['Guest Number 1']
+    assert client.get('/api/rsvp/export?format=xml').status_code == 400
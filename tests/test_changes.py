@@ -0,0 +1,49 @@
+import json
+import time
+
+from bson.objectid import ObjectId
+from pymongo.errors import ServerSelectionTimeoutError
+
+from app import format_change_event
+from changes import ChangeEvent, ChangeFeed, change_stream_pipeline
+from rsvp import PRIVATE_FIELDS
+
+
+def test_change_stream_pipeline_hides_private_fields():
+    projection = change_stream_pipeline()[-1]['$project']
+    assert projection == {f'fullDocument.{field}': 0 for field in PRIVATE_FIELDS}
+
+
+def test_change_events_carry_no_private_fields():
+    document = {'_id': ObjectId('65a4f1e2c3b4a5d6e7f80910'), 'full_name': 'Jane Doe',
+                'guest_key': 'phone:6512345678', 'idempotency_key': 'abc-123', 'search_terms': ['jane', 'doe']}
+    message = format_change_event(ChangeEvent('1-1', 'wedding_rsvp', 'insert', document), json.dumps)
+    data = json.loads(message.split('data: ', 1)[1])
+    assert data['rsvp']['full_name'] == 'Jane Doe'
+    assert not set(PRIVATE_FIELDS) & data['rsvp'].keys()
+    assert 'search_terms' in document
+
+
+def test_publishing_never_waits_on_detection():
+    def unreachable():
+        raise AssertionError('publish asked the server')
+    feed = ChangeFeed(unreachable)
+    feed.publish('wedding_rsvp', 'upsert', {'full_name': 'Jane Doe'})
+    _, (event,) = feed.hub.subscribe(f'{feed.hub.epoch}-0')
+    assert event.document == {'full_name': 'Jane Doe'}
+
+
+def test_failed_detection_is_retried_later(monkeypatch):
+    calls = []
+
+    def unreachable():
+        calls.append(1)
+        raise ServerSelectionTimeoutError('No servers found')
+    feed = ChangeFeed(unreachable, retry_interval=30)
+    assert not feed.uses_change_streams()
+    assert not feed.uses_change_streams()
+    assert len(calls) == 1
+    later = time.monotonic() + 31
+    monkeypatch.setattr(time, 'monotonic', lambda: later)
+    assert not feed.uses_change_streams()
+    assert len(calls) == 2
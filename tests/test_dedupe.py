@@ -0,0 +1,54 @@
+from datetime import datetime, timedelta
+
+import pytest
+from bson.objectid import ObjectId
+
+from dedupe import prepare_guest_keys
+
+START = datetime(2024, 1, 15, 10, 30)
+
+
+@pytest.fixture
+def db():
+    mongomock = pytest.importorskip('mongomock')
+    return mongomock.MongoClient()['wedding_test']
+
+
+def legacy(minutes, **fields):
+    return dict(fields, _id=ObjectId(), created_at=START + timedelta(minutes=minutes))
+
+
+def test_merges_rsvps_from_before_deduplication(db):
+    maybe = legacy(0, response_type='maybe', full_name='Jane Doe', note='Flights',
+                   telegram_username='@jane', phone_number='+65 1234 5678')
+    yes = legacy(5, response_type='yes', full_name='Jane Doe', telegram_username='@jane',
+                 phone_number='6512345678', dietary_restrictions='Vegan')
+    other = legacy(7, response_type='no', full_name='Jane Doe')
+    db['wedding_rsvp'].insert_many([maybe, yes, other])
+
+    assert prepare_guest_keys(db, 'wedding_rsvp') == (2, 1)
+    merged = db['wedding_rsvp'].find_one({'_id': maybe['_id']})
+    assert merged['guest_key'] == 'phone:6512345678'
+    assert merged['response_type'] == 'yes'
+    assert merged['dietary_restrictions'] == 'Vegan'
+    assert 'note' not in merged
+    assert merged['created_at'] == maybe['created_at']
+    assert merged['updated_at'] == yes['created_at']
+    assert db['wedding_rsvp'].find_one({'_id': other['_id']})['guest_key'] == 'name:jane doe'
+    # Running it again changes nothing
+    assert prepare_guest_keys(db, 'wedding_rsvp') == (0, 0)
+
+
+def test_rekeys_rsvps_keyed_by_name(db):
+    # Keyed by name under the old rule, then resubmitted under the current one
+    old = legacy(0, response_type='yes', full_name='Jane Doe', telegram_username='@jane',
+                 phone_number='6512345678', guest_key='name:jane doe')
+    new = legacy(9, response_type='no', full_name='Jane Doe', phone_number='6512345678',
+                 guest_key='phone:6512345678')
+    db['wedding_rsvp'].insert_many([old, new])
+
+    assert prepare_guest_keys(db, 'wedding_rsvp') == (1, 1)
+    kept, = db['wedding_rsvp'].find()
+    assert kept['_id'] == new['_id']
+    assert kept['response_type'] == 'no'
+    assert kept['created_at'] == old['created_at']
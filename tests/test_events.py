@@ -0,0 +1,48 @@
+from datetime import datetime
+
+import pytest
+
+from conftest import afterparty_rsvp, wedding_rsvp
+from events import event_document
+
+
+@pytest.fixture
+def event(storage):
+    storage.add_event(event_document('smith-jones', 'Smith & Jones'))
+    return 'smith-jones'
+
+
+def test_event_rsvps_are_kept_apart(client, event):
+    response = client.post(f'/api/events/{event}/wedding-rsvp', json=wedding_rsvp(1))
+    assert response.status_code == 201
+    client.post('/api/wedding-rsvp', json=wedding_rsvp(2))
+
+    page = client.get(f'/api/events/{event}/wedding-rsvp').json
+    assert [rsvp['full_name'] for rsvp in page['rsvps']] == ['Guest Number 1']
+    assert client.get('/api/wedding-rsvp').json['count'] == 1
+    assert client.get(f'/api/events/{event}/search?q=guest').json['count'] == 1
+    assert client.get(f'/api/events/{event}/summary').json['wedding']['count'] == 1
+
+
+def test_describe_event(client, event):
+    response = client.get(f'/api/events/{event}')
+    assert response.status_code == 200
+    assert response.json['name'] == 'Smith & Jones'
+
+
+def test_unknown_event(client):
+    assert client.get('/api/events/nobody/rsvp').status_code == 404
+    assert client.post('/api/events/nobody/rsvp', json=afterparty_rsvp(1)).status_code == 404
+    assert client.get('/api/events/Not_An_Id').status_code == 404
+
+
+def test_archived_event(client, storage):
+    archived = event_document('old-party', 'Old Party')
+    archived['archived_at'] = datetime.utcnow()
+    archived['summary'] = {'afterparty': {'count': 3}}
+    storage.add_event(archived)
+
+    assert client.get('/api/events/old-party/rsvp').status_code == 410
+    assert client.post('/api/events/old-party/rsvp', json=afterparty_rsvp(1)).status_code == 410
+    described = client.get('/api/events/old-party').json
+    assert described['summary'] == {'afterparty': {'count': 3}}
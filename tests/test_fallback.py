@@ -0,0 +1,82 @@
+from datetime import datetime
+
+import pytest
+from bson.objectid import ObjectId
+from pymongo.errors import ServerSelectionTimeoutError
+
+import app as wedding_app
+import fallback
+from rsvp import WEDDING_RSVP_FIELDS, build_wedding_rsvp, upsert_operation
+from storage import MongoRSVPs
+
+from conftest import wedding_rsvp
+
+
+@pytest.fixture
+def degraded(make_app, monkeypatch, tmp_path):
+    """(mongomock database, test client) of an app with RSVP_FALLBACK on that database."""
+    mongomock = pytest.importorskip('mongomock')
+    db = mongomock.MongoClient()['wedding_test']
+    monkeypatch.setattr(wedding_app, 'get_client', lambda: db.client)
+    monkeypatch.setattr(wedding_app, 'get_db', lambda: db)
+    # The tests replay the log rather than the background thread
+    monkeypatch.setattr(fallback.FallbackLog, '_ensure_started', lambda self: None)
+    app = make_app(RSVP_STORAGE='mongodb', MONGODB_URI='mongodb://localhost:27017/wedding_test',
+                   RSVP_FALLBACK='true', RSVP_FALLBACK_PATH=str(tmp_path / 'fallback.sqlite3'))
+    wedding_app.storage.create_indexes()
+    return db, app.test_client()
+
+
+@pytest.fixture
+def unreachable(monkeypatch):
+    """MongoDB can't be reached for submissions."""
+    def upsert(self, filter, update):
+        raise ServerSelectionTimeoutError('No servers found')
+    monkeypatch.setattr(MongoRSVPs, 'upsert', upsert)
+
+
+def logged(i, response_type, created_at):
+    doc, _ = build_wedding_rsvp(wedding_rsvp(i, response_type))
+    doc['_id'] = ObjectId()
+    doc['created_at'] = created_at
+    return upsert_operation(doc, WEDDING_RSVP_FIELDS)
+
+
+def test_submission_is_logged_and_replayed_once(degraded, unreachable):
+    db, client = degraded
+    response = client.post('/api/wedding-rsvp', json=wedding_rsvp(1))
+    assert response.status_code == 202
+    assert wedding_app.fallback_log.pending() == 1
+    assert wedding_app.fallback_log.degraded
+    assert db['wedding_rsvp'].count_documents({}) == 0
+
+    assert wedding_app.fallback_log.replay() == 1
+    assert wedding_app.fallback_log.pending() == 0
+    assert not wedding_app.fallback_log.degraded
+    stored, = db['wedding_rsvp'].find()
+    assert str(stored['_id']) == response.json['rsvp_id']
+    # Nothing is left to replay
+    assert wedding_app.fallback_log.replay() == 0
+
+
+def test_entry_replayed_twice_is_dropped(degraded):
+    db, _ = degraded
+    log = wedding_app.fallback_log
+    filter, update = logged(1, 'yes', datetime(2025, 6, 1))
+    log.append('wedding_rsvp', filter, update)
+    assert log.replay() == 1
+    # The same entry logged again, e.g. by a retry, applies nothing
+    log.append('wedding_rsvp', filter, update)
+    assert log.replay() == 1
+    assert log.pending() == 0
+    assert db['wedding_rsvp'].count_documents({}) == 1
+
+
+def test_older_entry_never_overwrites_a_newer_answer(degraded):
+    db, client = degraded
+    assert client.post('/api/wedding-rsvp', json=wedding_rsvp(1, 'no')).status_code == 201
+    # Logged before the 'no' was saved
+    wedding_app.fallback_log.append('wedding_rsvp', *logged(1, 'yes', datetime(2020, 1, 1)))
+    assert wedding_app.fallback_log.replay() == 1
+    stored, = db['wedding_rsvp'].find()
+    assert stored['response_type'] == 'no'
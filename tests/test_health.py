@@ -0,0 +1,47 @@
+import pytest
+
+import app as wedding_app
+
+
+def test_health_checks(client):
+    assert client.get('/health').json == {'status': 'healthy', 'database': 'connected'}
+    assert client.get('/health/live').status_code == 200
+    assert client.get('/health/ready').status_code == 200
+    assert 'create_app' in client.get('/health/startup').json['timings_ms']
+
+
+def test_warm_up(make_app):
+    client = make_app(RSVP_WARMUP='true').test_client()
+    assert client.get('/health/ready').json['status'] == 'ready'
+
+
+def test_unknown_routes(client):
+    response = client.get('/api/nothing-here')
+    assert response.status_code == 404
+    assert response.json == {'error': 'Endpoint not found'}
+    response = client.delete('/api/rsvp')
+    assert response.status_code == 405
+    assert response.json == {'error': 'Method not allowed'}
+
+
+def test_metrics(client):
+    client.get('/health/live')
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert b'http_requests_total' in response.data
+
+
+def test_profiler_needs_the_token(make_app):
+    client = make_app(RSVP_PROFILER_TOKEN='secret').test_client()
+    assert client.get('/debug/profile').status_code == 401
+    assert client.get('/debug/profile', headers={'Authorization': 'Bearer sécret'}).status_code == 401
+    response = client.get('/debug/profile?seconds=0.05', headers={'Authorization': 'Bearer secret'})
+    assert response.status_code == 200
+
+
+def test_mongodb_uri_is_required(make_app, monkeypatch):
+    monkeypatch.delenv('MONGODB_URI', raising=False)
+    # Not from a developer's .env either
+    monkeypatch.setattr(wedding_app, 'load_dotenv', lambda: None)
+    with pytest.raises(RuntimeError, match='MONGODB_URI'):
+        make_app(RSVP_STORAGE='mongodb')
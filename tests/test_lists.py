@@ -0,0 +1,132 @@
+import time
+
+import app as wedding_app
+from search import SEARCH_MAX_RESULTS
+
+from conftest import afterparty_rsvp, wedding_rsvp
+
+RESPONSE_TYPES = ['yes', 'no', 'maybe']
+
+
+def submit_wedding_rsvps(client, count):
+    return [
+        client.post('/api/wedding-rsvp', json=wedding_rsvp(i, RESPONSE_TYPES[i % 3])).json['rsvp_id']
+        for i in range(count)
+    ]
+
+
+def test_pages_follow_the_cursor_newest_first(client):
+    ids = [client.post('/api/rsvp', json=afterparty_rsvp(i)).json['rsvp_id'] for i in range(7)]
+    seen = []
+    url = '/api/rsvp?limit=3'
+    while url:
+        page = client.get(url).json
+        seen.extend(rsvp['id'] for rsvp in page['rsvps'])
+        assert page['count'] == len(page['rsvps'])
+        url = f"/api/rsvp?limit=3&after={page['next_cursor']}" if page['next_cursor'] else None
+    assert seen == ids[::-1]
+
+
+def test_fields_selects_columns(client):
+    client.post('/api/rsvp', json=afterparty_rsvp(1))
+    rsvp = client.get('/api/rsvp?fields=name').json['rsvps'][0]
+    assert set(rsvp) == {'id', 'name', 'created_at'}
+
+
+def test_bad_page_args(client):
+    assert client.get('/api/rsvp?after=not-a-cursor').status_code == 400
+    assert client.get('/api/rsvp?fields=guest_key').status_code == 400
+    assert client.get('/api/rsvp?limit=0').status_code == 400
+
+
+def test_wedding_page_is_grouped_by_type(client):
+    ids = submit_wedding_rsvps(client, 7)
+    page = client.get('/api/wedding-rsvp?limit=5').json
+    assert [rsvp['id'] for rsvp in page['rsvps']] == ids[:1:-1]
+    assert list(page['rsvps_by_type']) == ['maybe', 'no', 'yes']
+    for response_type, rsvps in page['rsvps_by_type'].items():
+        expected = [rsvp['id'] for rsvp in page['rsvps'] if rsvp['response_type'] == response_type]
+        assert [rsvp['id'] for rsvp in rsvps] == expected
+
+    rest = client.get(f"/api/wedding-rsvp?limit=5&after={page['next_cursor']}").json
+    assert [rsvp['id'] for rsvp in rest['rsvps']] == ids[1::-1]
+    assert rest['next_cursor'] is None
+
+
+def test_wedding_page_filtered_by_response_type(client):
+    ids = submit_wedding_rsvps(client, 9)
+    page = client.get('/api/wedding-rsvp?response_type=no&limit=2').json
+    assert [rsvp['id'] for rsvp in page['rsvps']] == [ids[7], ids[4]]
+    assert page['rsvps_by_type']['yes'] == []
+    rest = client.get(f"/api/wedding-rsvp?response_type=no&after={page['next_cursor']}").json
+    assert [rsvp['id'] for rsvp in rest['rsvps']] == [ids[1]]
+    assert client.get('/api/wedding-rsvp?response_type=perhaps').status_code == 400
+
+
+def test_empty_wedding_page(client):
+    page = client.get('/api/wedding-rsvp').json
+    assert page == {'rsvps': [], 'rsvps_by_type': {'yes': [], 'no': [], 'maybe': []}, 'count': 0, 'next_cursor': None}
+
+
+def test_list_is_served_from_cache_until_a_submission(client):
+    client.post('/api/rsvp', json=afterparty_rsvp(1))
+    first = client.get('/api/rsvp')
+    # A streamed list is cached once it has been read
+    first.get_data()
+    first.close()
+    assert client.get('/api/rsvp', headers={'If-None-Match': first.get_etag()[0]}).status_code == 304
+    client.post('/api/rsvp', json=afterparty_rsvp(2))
+    response = client.get('/api/rsvp', headers={'If-None-Match': first.get_etag()[0]})
+    assert response.status_code == 200
+    assert response.json['count'] == 2
+
+
+def test_etag_is_not_revalidated_after_the_ttl(make_app, monkeypatch):
+    client = make_app(RSVP_CACHE_TTL='60').test_client()
+    client.post('/api/rsvp', json=afterparty_rsvp(1))
+    first = client.get('/api/rsvp')
+    # A streamed list is cached once it has been read
+    first.get_data()
+    first.close()
+    later = time.monotonic() + 61
+    monkeypatch.setattr(time, 'monotonic', lambda: later)
+    response = client.get('/api/rsvp', headers={'If-None-Match': first.get_etag()[0]})
+    assert response.status_code == 200
+    assert response.json['count'] == 1
+
+
+def test_settings_in_dotenv_apply(make_app, monkeypatch):
+    # create_app() loads .env after rsvp.py and search.py were imported
+    def load_dotenv():
+        monkeypatch.setenv('RSVP_MAX_PAGE_SIZE', '5')
+        monkeypatch.setenv('RSVP_SEARCH_MAX_RESULTS', '10')
+    monkeypatch.setattr(wedding_app, 'load_dotenv', load_dotenv)
+    client = make_app().test_client()
+    assert client.get('/api/rsvp?limit=50').status_code == 400
+    assert client.get('/api/rsvp?limit=5').status_code == 200
+    assert client.get('/api/search?q=guest&offset=10').status_code == 400
+
+
+def test_search_keeps_exact_and_newest_matches_past_the_cap(client):
+    client.post('/api/wedding-rsvp', json=wedding_rsvp(0, full_name='Ann'))
+    for i in range(1, SEARCH_MAX_RESULTS + 51):
+        client.post('/api/wedding-rsvp', json=wedding_rsvp(i, full_name=f'Anna Guest{i}'))
+    results = client.get('/api/search?q=ann').json['results']
+    assert [r['rsvp']['full_name'] for r in results[:2]] == ['Ann', f'Anna Guest{SEARCH_MAX_RESULTS + 50}']
+
+
+def test_search_ranks_exact_matches_first(client):
+    client.post('/api/wedding-rsvp', json=wedding_rsvp(1, full_name='Jane Doe'))
+    client.post('/api/wedding-rsvp', json=wedding_rsvp(2, full_name='Janet Smith'))
+    client.post('/api/rsvp', json=dict(afterparty_rsvp(3), name='Jane'))
+    response = client.get('/api/search?q=jane')
+    assert response.status_code == 200
+    results = response.json['results']
+    assert (results[0]['collection'], results[0]['rsvp']['name']) == ('afterparty', 'Jane')
+    assert {r['rsvp']['full_name'] for r in results[1:]} == {'Jane Doe', 'Janet Smith'}
+
+    query = {'q': '+65 0000 0002', 'collections': 'wedding_rsvp'}
+    phone = client.get('/api/search', query_string=query).json['results']
+    assert [r['rsvp']['full_name'] for r in phone] == ['Janet Smith']
+    assert client.get('/api/search', query_string={'q': 'jane doe'}).json['count'] == 1
+    assert client.get('/api/search').status_code == 400
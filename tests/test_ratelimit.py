@@ -0,0 +1,12 @@
+from conftest import afterparty_rsvp
+
+
+def test_telegram_key_keeps_an_ip_bucket(make_app):
+    client = make_app(RSVP_RATE_LIMIT_BACKEND='memory', RSVP_RATE_LIMIT_KEY='telegram',
+                      RSVP_RATE_LIMITS='submit_rsvp=2/minute', RSVP_RATE_LIMIT_IP_FACTOR='2').test_client()
+    # One handle gets the route's limit
+    statuses = [client.post('/api/rsvp', json=afterparty_rsvp(1)).status_code for _ in range(3)]
+    assert statuses == [201, 200, 429]
+    # Rotating handles from one address stops at the address's limit
+    statuses = [client.post('/api/rsvp', json=afterparty_rsvp(i)).status_code for i in range(2, 5)]
+    assert statuses == [201, 201, 429]
@@ -0,0 +1,120 @@
+from datetime import datetime, timedelta
+
+import pytest
+from bson.objectid import ObjectId
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from rsvp import WEDDING_RSVP_FIELDS, build_wedding_rsvp, encode_cursor, parse_page_args, upsert_operation
+from storage import MemoryRSVPs, MemoryStorage, MongoStorage
+
+from conftest import wedding_rsvp
+
+START = datetime(2025, 6, 1, 12, 0)
+RESPONSE_TYPES = ['yes', 'no', 'maybe']
+
+
+def wedding_operations(count):
+    operations = []
+    for i in range(count):
+        doc, _ = build_wedding_rsvp(wedding_rsvp(i, RESPONSE_TYPES[i % 3], **(
+            {'dietary_restrictions': 'Vegan'} if i % 6 == 0 else {})))
+        # Several RSVPs share a created_at, so _id breaks the ties
+        doc['created_at'] = START - timedelta(minutes=37 * (i // 2))
+        doc['_id'] = ObjectId()
+        operations.append(upsert_operation(doc, WEDDING_RSVP_FIELDS))
+    return operations
+
+
+@pytest.fixture
+def stores():
+    """The same RSVPs in a MemoryRSVPs and, on mongomock, a MongoRSVPs."""
+    mongomock = pytest.importorskip('mongomock')
+    db = mongomock.MongoClient()['wedding_test']
+    operations = wedding_operations(20)
+    result = []
+    for storage in (MemoryStorage(), MongoStorage(lambda: db.client, lambda: db)):
+        store = storage.rsvps('wedding_rsvp')
+        assert store.bulk_upsert(operations) == (20, 0)
+        result.append(store)
+    return result
+
+
+def keys(cursor):
+    return [(doc['created_at'], doc['_id']) for doc in cursor]
+
+
+def test_pages_match_mongodb(stores):
+    memory, mongo = stores
+    for query in ({}, {'response_type': 'no'}):
+        assert keys(memory.find_page(query, 5, None, {})) == keys(mongo.find_page(query, 5, None, {}))
+        page = keys(mongo.find_page(query, 5, None, {}))
+        newest = {'created_at': page[0][0], '_id': page[0][1]}
+        oldest = {'created_at': page[4][0], '_id': page[4][1]}
+        _, keyset, _ = parse_page_args({'after': encode_cursor(oldest)}, WEDDING_RSVP_FIELDS)
+        assert keys(memory.find_page(query, 5, keyset, {})) == keys(mongo.find_page(query, 5, keyset, {}))
+        assert keys(memory.find_range_by_type(query, newest, oldest, {})) == \
+            keys(mongo.find_range_by_type(query, newest, oldest, {}))
+    assert keys(memory.export({'response_type': 'yes'})) == keys(mongo.export({'response_type': 'yes'}))
+
+
+def test_projection_matches_mongodb(stores):
+    memory, mongo = stores
+    projection = {'full_name': 1, 'created_at': 1}
+    assert list(memory.find_page({}, 3, None, projection)) == list(mongo.find_page({}, 3, None, projection))
+    assert list(memory.export({})) == list(mongo.export({}))
+
+
+def test_summary_facets_match_mongodb(stores):
+    memory, mongo = stores
+    since = START - timedelta(hours=2)
+    memory_facets, mongo_facets = memory.summary_facets(since), mongo.summary_facets(since)
+    for facet in ('by_type', 'dietary'):
+        assert sorted(memory_facets[facet], key=str) == sorted(mongo_facets[facet], key=str)
+    assert memory_facets['per_hour'] == mongo_facets['per_hour']
+
+
+def test_resubmission_moves_between_type_indexes():
+    store = MemoryRSVPs('wedding_rsvp')
+    (filter, update), = wedding_operations(1)
+    store.upsert(filter, update)
+    update['$set']['response_type'] = 'no'
+    before = store.upsert(filter, update)
+    assert before['response_type'] == 'yes'
+    assert list(store.find_page({'response_type': 'yes'}, 10, None, {})) == []
+    assert len(list(store.find_page({'response_type': 'no'}, 10, None, {}))) == 1
+
+
+def test_idempotency_key_is_unique():
+    store = MemoryRSVPs('wedding_rsvp')
+    first, second = wedding_operations(2)
+    for _, update in (first, second):
+        update['$set']['idempotency_key'] = 'abc-123'
+    store.upsert(*first)
+    with pytest.raises(DuplicateKeyError):
+        store.upsert(*second)
+    with pytest.raises(BulkWriteError) as raised:
+        store.bulk_upsert([first, second])
+    assert raised.value.details['nMatched'] == 1
+    assert [error['index'] for error in raised.value.details['writeErrors']] == [1]
+
+
+def test_search_matches_mongodb(stores):
+    memory, mongo = stores
+    for terms in (['guest'], ['guest', '1'], ['@guest1'], ['6500000012'], ['nobody']):
+        found = {doc['_id'] for doc in memory.search(terms, 50)}
+        assert found == {doc['_id'] for doc in mongo.search(terms, 50)}
+    assert len(list(memory.search(['guest'], 5))) == 5
+
+
+def test_search_keeps_exact_and_newest_matches_past_the_limit():
+    mongomock = pytest.importorskip('mongomock')
+    db = mongomock.MongoClient()['wedding_test']
+    operations = wedding_operations(30)
+    stores = [storage.rsvps('wedding_rsvp') for storage in (MemoryStorage(), MongoStorage(lambda: db.client, lambda: db))]
+    for store in stores:
+        # Oldest first, so an unsorted scan would return the oldest matches
+        store.bulk_upsert(operations[::-1])
+    # Guest 2 matches '2' exactly, guests 20-29 by prefix; pairs share a created_at
+    memory, mongo = ([doc['full_name'] for doc in store.search(['2'], 5)] for store in stores)
+    assert memory == mongo == ['Guest Number 2', 'Guest Number 21', 'Guest Number 20',
+                               'Guest Number 23', 'Guest Number 22']
@@ -0,0 +1,94 @@
+from conftest import afterparty_rsvp, wedding_rsvp
+
+
+def test_submit_afterparty_rsvp(client):
+    response = client.post('/api/rsvp', json=afterparty_rsvp(1))
+    assert response.status_code == 201
+    assert response.json['message'] == 'RSVP received'
+    assert response.json['rsvp_id']
+
+
+def test_resubmission_updates_the_same_rsvp(client):
+    first = client.post('/api/rsvp', json=afterparty_rsvp(1))
+    # Same guest: the phone number is normalised into the guest key
+    again = dict(afterparty_rsvp(1), phone_number='+65 0000 0001', telegram='@renamed')
+    second = client.post('/api/rsvp', json=again)
+    assert second.status_code == 200
+    assert second.json['message'] == 'RSVP updated'
+    assert second.json['rsvp_id'] == first.json['rsvp_id']
+
+    rsvps = client.get('/api/rsvp').json['rsvps']
+    assert len(rsvps) == 1
+    assert rsvps[0]['telegram'] == '@renamed'
+
+
+def test_resubmission_unsets_fields_of_the_old_response_type(client):
+    client.post('/api/wedding-rsvp', json=wedding_rsvp(1, 'maybe', note='Checking flights'))
+    response = client.post('/api/wedding-rsvp', json=wedding_rsvp(1, 'yes', dietary_restrictions='Vegan'))
+    assert response.status_code == 200
+    assert response.json['message'] == 'Wedding RSVP (yes) updated'
+
+    rsvp = client.get('/api/wedding-rsvp').json['rsvps'][0]
+    assert rsvp['response_type'] == 'yes'
+    assert rsvp['dietary_restrictions'] == 'Vegan'
+    assert 'note' not in rsvp
+
+
+def test_name_only_answer_does_not_replace_a_yes(client):
+    yes = client.post('/api/wedding-rsvp', json=wedding_rsvp(1, 'yes', dietary_restrictions='Vegan'))
+    response = client.post('/api/wedding-rsvp', json={'response_type': 'no', 'full_name': 'guest  number 1'})
+    assert response.status_code == 201
+    assert response.json['rsvp_id'] != yes.json['rsvp_id']
+
+    rsvps = {rsvp['id']: rsvp for rsvp in client.get('/api/wedding-rsvp').json['rsvps']}
+    assert rsvps[yes.json['rsvp_id']]['response_type'] == 'yes'
+    assert rsvps[yes.json['rsvp_id']]['dietary_restrictions'] == 'Vegan'
+
+
+def test_guests_sharing_a_name_are_kept_apart(client):
+    first = client.post('/api/wedding-rsvp', json=wedding_rsvp(1, full_name='Jane Doe'))
+    second = client.post('/api/wedding-rsvp', json=wedding_rsvp(2, full_name='Jane Doe'))
+    assert (first.status_code, second.status_code) == (201, 201)
+
+
+def test_contact_details_identify_a_no(client):
+    first = client.post('/api/wedding-rsvp', json=wedding_rsvp(1, 'yes'))
+    # Same phone number, formatted differently
+    response = client.post('/api/wedding-rsvp', json={
+        'response_type': 'no', 'full_name': 'Guest Number 1', 'phone_number': '+65 0000 0001'})
+    assert response.status_code == 200
+    assert response.json['rsvp_id'] == first.json['rsvp_id']
+
+
+def test_validation_errors(client):
+    assert client.post('/api/rsvp', json={}).status_code == 400
+    response = client.post('/api/rsvp', json={'name': 'Jane Doe', 'telegram': '@jane'})
+    assert response.status_code == 400
+    assert 'error' in response.json
+    response = client.post('/api/wedding-rsvp', json=wedding_rsvp(1, 'perhaps'))
+    assert response.status_code == 400
+    assert response.json['error'] == 'response_type must be one of: yes, no, maybe'
+
+
+def test_idempotency_key_replay_and_reuse(client):
+    headers = {'Idempotency-Key': 'abc-123'}
+    first = client.post('/api/rsvp', json=afterparty_rsvp(1), headers=headers)
+    retry = client.post('/api/rsvp', json=afterparty_rsvp(1), headers=headers)
+    assert first.status_code == 201
+    assert retry.status_code == 200
+    assert retry.json['rsvp_id'] == first.json['rsvp_id']
+
+    reused = client.post('/api/rsvp', json=afterparty_rsvp(2), headers=headers)
+    assert reused.status_code == 422
+    assert len(client.get('/api/rsvp').json['rsvps']) == 1
+
+
+def test_private_fields_are_not_returned(client):
+    client.post('/api/rsvp', json=afterparty_rsvp(1), headers={'Idempotency-Key': 'abc-123'})
+    rsvp = client.get('/api/rsvp').json['rsvps'][0]
+    assert not {'guest_key', 'idempotency_key', 'search_terms', '_id'} & rsvp.keys()
+
+
+def test_write_behind_and_fallback_are_ignored_in_memory(make_app):
+    client = make_app(RSVP_WRITE_BEHIND='true', RSVP_FALLBACK='true').test_client()
+    assert client.post('/api/rsvp', json=afterparty_rsvp(1)).status_code == 201
@@ -0,0 +1,43 @@
+import pytest
+
+import app as wedding_app
+from conftest import afterparty_rsvp, wedding_rsvp
+
+
+def submit_guests(client):
+    client.post('/api/wedding-rsvp', json=wedding_rsvp(1, 'yes', dietary_restrictions='Vegetarian'))
+    client.post('/api/wedding-rsvp', json=wedding_rsvp(2, 'yes', dietary_restrictions='vegetarian '))
+    client.post('/api/wedding-rsvp', json=wedding_rsvp(3, 'no'))
+    client.post('/api/wedding-rsvp', json=wedding_rsvp(4, 'maybe'))
+    client.post('/api/rsvp', json=afterparty_rsvp(1))
+
+
+@pytest.mark.parametrize('use_stats', ['false', 'true'])
+def test_summary(make_app, use_stats):
+    client = make_app(RSVP_STATS=use_stats).test_client()
+    submit_guests(client)
+    # Guest 3 changes their mind
+    client.post('/api/wedding-rsvp', json=wedding_rsvp(3, 'yes', dietary_restrictions='Halal'))
+
+    summary = client.get('/api/summary').json
+    assert summary['wedding'] == {
+        'count': 4,
+        'count_by_type': {'yes': 3, 'no': 0, 'maybe': 1},
+        'yes_with_dietary_restrictions': 3,
+        'dietary_restrictions': {'vegetarian': 2, 'halal': 1}
+    }
+    assert summary['afterparty'] == {'count': 1}
+    assert sum(row['count'] for row in summary['submissions_per_hour']) == 4
+
+
+def test_stats_summary_matches_a_rebuild(make_app):
+    client = make_app(RSVP_STATS='true').test_client()
+    submit_guests(client)
+    incremental = client.get('/api/summary').json
+    wedding_app.storage.rebuild_summary()
+    assert client.get('/api/summary').json == incremental
+
+
+def test_summary_hours(client):
+    assert client.get('/api/summary?hours=0').status_code == 400
+    assert client.get('/api/summary?hours=24').status_code == 200
@@ -0,0 +1,39 @@
+import os
+from datetime import datetime
+
+import pytest
+from bson.objectid import ObjectId
+
+from rsvp import WEDDING_RSVP_FIELDS, build_wedding_rsvp, upsert_operation
+from write_behind import WriteBehindWriter
+
+from conftest import wedding_rsvp
+
+
+def operation(i, response_type='yes', created_at=None):
+    doc, _ = build_wedding_rsvp(wedding_rsvp(i, response_type))
+    doc['_id'] = ObjectId()
+    if created_at is not None:
+        doc['created_at'] = created_at
+    return upsert_operation(doc, WEDDING_RSVP_FIELDS)
+
+
+def test_spilled_upserts_are_replayed(tmp_path):
+    mongomock = pytest.importorskip('mongomock')
+    db = mongomock.MongoClient()['wedding_test']
+    db['wedding_rsvp'].create_index('guest_key', unique=True)
+    flushed = []
+    writer = WriteBehindWriter(lambda: db, spill_path=str(tmp_path / 'spill.ndjson'), on_flush=flushed.append)
+    writer._spill(db['wedding_rsvp'], [operation(1), operation(2)])
+    # A later answer from guest 1 spilled after the first one
+    writer._spill(db['wedding_rsvp'], [operation(1, 'no')])
+
+    assert writer.replay_spill() == 3
+    assert flushed == ['wedding_rsvp']
+    assert not os.path.exists(writer.spill_path + '.replaying')
+    assert sorted(doc['response_type'] for doc in db['wedding_rsvp'].find()) == ['no', 'yes']
+    # Replaying again finds nothing; an older answer never overwrites a newer one
+    assert writer.replay_spill() == 0
+    writer._spill(db['wedding_rsvp'], [operation(1, created_at=datetime(2020, 1, 1))])
+    assert writer.replay_spill() == 1
+    assert db['wedding_rsvp'].find_one({'guest_key': 'phone:6500000001'})['response_type'] == 'no'
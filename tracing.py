@@ -0,0 +1,282 @@
+"""
+Opt-in request tracing and profiling for the Flask app.
+With RSVP_TRACING=true each request gets a trace: the time spent in the
+phases of its view (parsing, validation, the MongoDB round trip,
+serialization) and every MongoDB command it issued, from PyMongo's
+CommandListener. Spans are returned in a Server-Timing header. A request
+slower than RSVP_SLOW_REQUEST_MS is logged with its spans and the shape of
+its queries, and the slowest find of a slow list request is run through
+explain() to show the plan MongoDB chose. With RSVP_PROFILER_TOKEN set,
+GET /debug/profile samples the stacks of every thread in the worker.
+"""
+
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+
+from flask import request
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+# Slow requests to these endpoints have their slowest find explained
+EXPLAIN_ENDPOINTS = {'get_rsvps', 'get_wedding_rsvps', 'get_event_rsvps', 'get_event_wedding_rsvps'}
+
+# Commands kept per trace; a bulk import issues many more
+MAX_TRACED_COMMANDS = 100
+
+# Command fields whose shape is logged (values replaced by their type)
+SHAPE_FIELDS = ('filter', 'query', 'sort', 'projection', 'pipeline', 'updates', 'deletes')
+
+FIND_FIELDS = ('find', 'filter', 'sort', 'projection', 'skip', 'limit', 'hint')
+
+REQUEST_ID = re.compile(r'[\w.:-]{1,128}')
+
+_local = threading.local()
+
+
+def current_trace():
+    """The trace of the request this thread is serving, or None when tracing is off."""
+    return getattr(_local, 'trace', None)
+
+
+class Trace:
+    """Spans and MongoDB commands of one request."""
+
+    def __init__(self, request_id):
+        self.request_id = request_id
+        self.started = time.perf_counter()
+        self.spans = {}
+        self.commands = []
+        self.dropped_commands = 0
+
+    def add_span(self, name, seconds):
+        # Repeated spans (e.g. one per streamed row) are summed
+        total, count = self.spans.get(name, (0.0, 0))
+        self.spans[name] = (total + seconds, count + 1)
+
+    def add_command(self, command):
+        if len(self.commands) < MAX_TRACED_COMMANDS:
+            self.commands.append(command)
+        else:
+            self.dropped_commands += 1
+
+    def server_timing(self):
+        entries = [f'{name};dur={total * 1000:.2f}' for name, (total, _) in self.spans.items()]
+        if self.commands:
+            entries.append(f"mongodb;dur={sum(c['ms'] for c in self.commands):.2f}")
+        return ', '.join(entries)
+
+
+@contextmanager
+def span(name):
+    """Time a block as a span of the current trace; does nothing without one."""
+    trace = current_trace()
+    if trace is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add_span(name, time.perf_counter() - started)
+
+
+def query_shape(value):
+    """value with every literal replaced by its type name, so queries differing only in values match."""
+    if isinstance(value, dict):
+        return {key: query_shape(v) for key, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        shapes = []
+        for item in value:
+            shape = query_shape(item)
+            if shape not in shapes:
+                shapes.append(shape)
+        return shapes
+    if isinstance(value, int) and not isinstance(value, bool) and value in (1, -1):
+        # Sort directions and projections are part of the shape
+        return value
+    return type(value).__name__
+
+
+class CommandTracer(monitoring.CommandListener):
+    """Adds the MongoDB commands a request issues to its trace."""
+
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        trace = current_trace()
+        if trace is None:
+            return
+        command = {'command': event.command_name, 'database': event.database_name}
+        target = event.command.get(event.command_name)
+        if isinstance(target, str):
+            command['collection'] = target
+        for field in SHAPE_FIELDS:
+            if field in event.command:
+                command[field] = query_shape(event.command[field])
+        if event.command_name == 'find':
+            # Kept with its values so a slow find can be explained
+            command['find'] = {field: event.command[field] for field in FIND_FIELDS if field in event.command}
+        with self._lock:
+            self._pending[event.request_id] = (trace, command)
+
+    def succeeded(self, event):
+        self._finish(event, False)
+
+    def failed(self, event):
+        self._finish(event, True)
+
+    def _finish(self, event, failed):
+        with self._lock:
+            pending = self._pending.pop(event.request_id, None)
+        if pending is None:
+            return
+        trace, command = pending
+        command['ms'] = event.duration_micros / 1000
+        if failed:
+            command['failed'] = True
+        trace.add_command(command)
+
+
+command_tracer = CommandTracer()
+
+
+def plan_summary(explained):
+    """The stages and indexes of the winning plan in an explain() result, outermost first."""
+    stages = []
+
+    def walk(node):
+        if isinstance(node, dict):
+            if 'stage' in node:
+                stages.append(f"{node['stage']}({node['indexName']})" if 'indexName' in node else node['stage'])
+            for key, value in node.items():
+                if key != 'rejectedPlans':
+                    walk(value)
+        elif isinstance(node, list):
+            for item in node:
+                walk(item)
+
+    walk(explained.get('queryPlanner', {}).get('winningPlan', {}))
+    return stages
+
+
+class SlowRequestLog:
+    """Logs slow requests, explaining at most one find per endpoint every explain_interval seconds."""
+
+    def __init__(self, get_client, threshold, explain_interval=60):
+        self._get_client = get_client
+        self.threshold = threshold
+        self.explain_interval = explain_interval
+        self._explained_at = {}
+        self._lock = threading.Lock()
+
+    def finish(self, trace, endpoint, method, path, status):
+        duration = time.perf_counter() - trace.started
+        if duration < self.threshold:
+            return
+        details = {
+            'request_id': trace.request_id,
+            'status': status,
+            'spans_ms': {name: round(total * 1000, 2) for name, (total, _) in trace.spans.items()},
+            'mongodb': [{k: v for k, v in c.items() if k != 'find'} for c in trace.commands],
+        }
+        if trace.dropped_commands:
+            details['mongodb_dropped'] = trace.dropped_commands
+        finds = [c for c in trace.commands if 'find' in c]
+        if endpoint in EXPLAIN_ENDPOINTS and finds and self._explain_due(endpoint):
+            slowest = max(finds, key=lambda c: c['ms'])
+            details['explain'] = self._explain(slowest)
+        logger.warning(f'Slow request {method} {path} took {duration * 1000:.0f} ms: '
+                       f'{json.dumps(details, default=str)}')
+
+    def _explain_due(self, endpoint):
+        now = time.monotonic()
+        with self._lock:
+            if now - self._explained_at.get(endpoint, float('-inf')) < self.explain_interval:
+                return False
+            self._explained_at[endpoint] = now
+            return True
+
+    def _explain(self, command):
+        try:
+            explained = self._get_client()[command['database']].command(
+                'explain', command['find'], verbosity='queryPlanner')
+            return {'collection': command.get('collection'), 'plan': plan_summary(explained)}
+        except Exception as e:
+            return {'error': str(e)}
+
+
+def instrument(app, get_client):
+    """Register request hooks on a Flask app that trace requests, if RSVP_TRACING is on."""
+    if os.getenv('RSVP_TRACING', 'False').lower() != 'true':
+        return
+    slow_log = SlowRequestLog(
+        get_client,
+        threshold=float(os.getenv('RSVP_SLOW_REQUEST_MS', 500)) / 1000,
+        explain_interval=float(os.getenv('RSVP_EXPLAIN_INTERVAL', 60))
+    )
+
+    @app.before_request
+    def start_trace():
+        request_id = request.headers.get('X-Request-ID', '')
+        if not REQUEST_ID.fullmatch(request_id):
+            request_id = uuid.uuid4().hex
+        _local.trace = Trace(request_id)
+
+    @app.after_request
+    def finish_trace(response):
+        trace = current_trace()
+        if trace is None:
+            return response
+        response.headers['X-Request-ID'] = trace.request_id
+        # Streamed bodies add their serialization span after this header is sent
+        timing = trace.server_timing()
+        if timing:
+            response.headers['Server-Timing'] = timing
+        endpoint, method, path, status = request.endpoint, request.method, request.path, response.status_code
+
+        def finish():
+            _local.trace = None
+            slow_log.finish(trace, endpoint, method, path, status)
+
+        response.call_on_close(finish)
+        return response
+
+
+def sample_stacks(seconds, interval):
+    """Sample the stack of every other thread every interval seconds for seconds.
+
+    Returns a Counter of folded stacks ('thread;outer (file:line);...;inner')
+    to sample counts, the input format of flamegraph.pl and speedscope.
+    """
+    me = threading.get_ident()
+    names = {thread.ident: thread.name for thread in threading.enumerate()}
+    samples = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == me:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            stack.append(names.get(thread_id, str(thread_id)))
+            samples[';'.join(reversed(stack))] += 1
+        time.sleep(interval)
+    return samples
+
+
+def format_folded(samples):
+    return ''.join(f'{stack} {count}\n' for stack, count in samples.most_common())
@@ -0,0 +1,227 @@
+"""
+Write-behind pipeline for RSVP submissions.
+Submissions are given a pre-generated ObjectId and their upsert is put on a
+bounded in-process queue. A background thread coalesces them into
+bulk_write(ordered=False) batches, flushing when a batch is full or the time
+window elapses. Batches that can't be written are spilled to a file, which
+the flusher replays into MongoDB once it takes writes again.
+"""
+
+import fcntl
+import logging
+import os
+import queue
+import threading
+import time
+
+from bson import json_util
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from fallback import replay_in_order
+from rsvp import reused_idempotency_key
+
+DUPLICATE_KEY = 11000
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindWriter:
+    """Batches upserts on a background thread.
+
+    Batches that keep failing are retried with exponential backoff; after
+    max_retries attempts they are appended to spill_path as extended-JSON
+    lines, fsynced, so that no accepted RSVP is lost. Every operation is an
+    upsert keyed by guest_key, so retrying a partially applied batch is
+    idempotent.
+
+    Every replay_interval seconds the flusher replays the spill file, oldest
+    first, the way fallback.py replays its log: an upsert only applies while
+    the stored RSVP is older than it. Every worker spills to the same file; a
+    lock file makes sure only one of them replays it at a time.
+    """
+
+    def __init__(self, get_db, max_queue=10000, batch_size=100, flush_interval=0.05,
+                 max_retries=5, spill_path='write_behind_spill.ndjson', replay_interval=30.0, on_flush=None):
+        self._get_db = get_db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.spill_path = spill_path
+        self.replay_interval = replay_interval
+        self.on_flush = on_flush
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def submit(self, collection, filter, update):
+        """Queue an upsert (see rsvp.upsert_operation). Raises queue.Full when saturated."""
+        self._ensure_started()
+        self._queue.put_nowait((collection, (filter, update)))
+
+    def drain(self, timeout=10):
+        """Flush everything still queued and stop the flusher thread."""
+        self._stopping.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout)
+        leftover = []
+        while True:
+            try:
+                leftover.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        for collection, operations in self._group(leftover):
+            self._spill(collection, operations)
+
+    def _ensure_started(self):
+        # The thread is started lazily so that it lives in the worker process
+        # rather than in a gunicorn master that forks afterwards.
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._stopping.clear()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        # A spill file left by an earlier process is replayed straight away
+        next_replay = time.monotonic()
+        while not (self._stopping.is_set() and self._queue.empty()):
+            if time.monotonic() >= next_replay and not self._stopping.is_set():
+                try:
+                    self.replay_spill()
+                except Exception as e:
+                    logger.error(f'Replaying {self.spill_path} failed: {str(e)}')
+                next_replay = time.monotonic() + self.replay_interval
+            batch = self._next_batch()
+            for collection, operations in self._group(batch):
+                self._write_with_retry(collection, operations)
+                if self.on_flush is not None:
+                    self.on_flush(collection.name)
+
+    def _next_batch(self):
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    @staticmethod
+    def _group(batch):
+        by_collection = {}
+        for collection, operation in batch:
+            by_collection.setdefault(collection.full_name, (collection, []))[1].append(operation)
+        return by_collection.values()
+
+    def _write_with_retry(self, collection, operations):
+        delay = 0.1
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                collection.bulk_write(
+                    [UpdateOne(filter, update, upsert=True) for filter, update in operations], ordered=False)
+                return
+            except BulkWriteError as e:
+                # Operations that succeeded are not retried, and neither are
+                # reused idempotency keys, which can never succeed
+                failed = []
+                for err in e.details.get('writeErrors', []):
+                    if err.get('code') == DUPLICATE_KEY and reused_idempotency_key(err):
+                        logger.warning(f'Dropped {collection.name} upsert with a reused Idempotency-Key')
+                    else:
+                        failed.append(err['index'])
+                operations = [operations[i] for i in failed]
+                if not operations:
+                    return
+                logger.error(f'Write-behind batch to {collection.name} partially failed '
+                             f'(attempt {attempt}): {len(operations)} operations left')
+            except Exception as e:
+                logger.error(f'Write-behind batch to {collection.name} failed (attempt {attempt}): {str(e)}')
+            time.sleep(delay)
+            delay = min(delay * 2, 5)
+        self._spill(collection, operations)
+
+    def replay_spill(self):
+        """Replay the spill file into MongoDB. Returns the number of upserts removed from it.
+
+        The file is first renamed to spill_path + '.replaying', so batches
+        spilled meanwhile start a new one. Upserts MongoDB doesn't take stay
+        in the renamed file for the next replay.
+        """
+        replaying = self.spill_path + '.replaying'
+        with open(self.spill_path + '.replay.lock', 'a') as replay_lock:
+            try:
+                fcntl.flock(replay_lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                # Another worker is replaying
+                return 0
+            if not os.path.exists(replaying):
+                with open(self.spill_path + '.lock', 'a') as spill_lock:
+                    fcntl.flock(spill_lock, fcntl.LOCK_EX)
+                    if not os.path.exists(self.spill_path):
+                        return 0
+                    os.rename(self.spill_path, replaying)
+            with open(replaying) as f:
+                lines = [line for line in f if line.strip()]
+            entries = []
+            for line in lines:
+                spilled = json_util.loads(line)
+                entries.append((spilled['collection'], spilled['filter'], spilled['update']))
+            done = replay_in_order(self._get_db(), entries)
+            if done < len(lines):
+                self._write_synced(replaying + '.tmp', lines[done:], 'w')
+                os.replace(replaying + '.tmp', replaying)
+            else:
+                os.remove(replaying)
+        if done:
+            logger.info(f'Replayed {done} spilled upserts from {self.spill_path}')
+            if self.on_flush is not None:
+                for collection_name in sorted({entry[0] for entry in entries[:done]}):
+                    self.on_flush(collection_name)
+        return done
+
+    def _spill(self, collection, operations):
+        if not operations:
+            return
+        lines = [json_util.dumps({'collection': collection.name, 'filter': filter, 'update': update}) + '\n'
+                 for filter, update in operations]
+        with self._lock, open(self.spill_path + '.lock', 'a') as lock_file:
+            # Never appends to a file a replay has just renamed
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            self._write_synced(self.spill_path, lines, 'a')
+        logger.error(f'Spilled {len(operations)} {collection.name} upserts to {self.spill_path}')
+
+    @staticmethod
+    def _write_synced(path, lines, mode):
+        with open(path, mode) as f:
+            f.writelines(lines)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def create_writer(get_db, on_flush=None):
+    """Build the writer configured by RSVP_WRITE_BEHIND* environment variables, or None if disabled."""
+    if os.getenv('RSVP_WRITE_BEHIND', 'False').lower() != 'true':
+        return None
+    return WriteBehindWriter(
+        get_db,
+        max_queue=int(os.getenv('RSVP_WRITE_BEHIND_QUEUE', 10000)),
+        batch_size=int(os.getenv('RSVP_WRITE_BEHIND_BATCH', 100)),
+        flush_interval=float(os.getenv('RSVP_WRITE_BEHIND_INTERVAL_MS', 50)) / 1000,
+        spill_path=os.getenv('RSVP_WRITE_BEHIND_SPILL', 'write_behind_spill.ndjson'),
+        replay_interval=float(os.getenv('RSVP_WRITE_BEHIND_REPLAY_INTERVAL', 30)),
+        on_flush=on_flush
+    )